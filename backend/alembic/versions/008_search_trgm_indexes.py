@@ -0,0 +1,52 @@
+"""add trigram search indexes for devices and users
+
+Revision ID: 008_search_trgm_indexes
+Revises: 007_password_reset_tokens
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '008_search_trgm_indexes'
+down_revision = '007_password_reset_tokens'
+branch_labels = None
+depends_on = None
+
+
+TRGM_INDEXES = [
+    ('ix_devices_serial_number_trgm', 'devices', 'serial_number'),
+    ('ix_devices_brand_trgm', 'devices', 'brand'),
+    ('ix_devices_model_trgm', 'devices', 'model'),
+    ('ix_devices_name_trgm', 'devices', 'name'),
+    ('ix_users_full_name_trgm', 'users', 'full_name'),
+    ('ix_users_student_id_trgm', 'users', 'student_id'),
+    ('ix_users_email_trgm', 'users', 'email'),
+]
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # GIN trigram indexes serve ILIKE '%term%' lookups
+    for name, table, column in TRGM_INDEXES:
+        op.create_index(
+            name,
+            table,
+            [column],
+            postgresql_using='gin',
+            postgresql_ops={column: 'gin_trgm_ops'},
+        )
+
+    # Keyset pagination walks (created_at, id) newest first
+    op.create_index('ix_devices_created_at_id', 'devices', ['created_at', 'id'])
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_users_created_at_id', table_name='users')
+    op.drop_index('ix_devices_created_at_id', table_name='devices')
+
+    for name, table, _ in reversed(TRGM_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,44 @@
+"""add webhook outbox table
+
+Revision ID: 009_webhook_outbox
+Revises: 008_search_trgm_indexes
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSON
+
+
+# revision identifiers, used by Alembic.
+revision = '009_webhook_outbox'
+down_revision = '008_search_trgm_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'webhook_outbox',
+        sa.Column('id', sa.BigInteger, primary_key=True, autoincrement=True),
+        sa.Column('event', sa.String(100), nullable=False),
+        sa.Column('payload', JSON, nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('attempts', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('dispatched_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    # Partial index keeps the pending scan small no matter how much history is retained
+    op.create_index(
+        'ix_webhook_outbox_pending',
+        'webhook_outbox',
+        ['id'],
+        postgresql_where=sa.text('dispatched_at IS NULL'),
+    )
+    op.create_index('ix_webhook_outbox_dispatched_at', 'webhook_outbox', ['dispatched_at'])
+
+
+def downgrade():
+    op.drop_index('ix_webhook_outbox_dispatched_at', table_name='webhook_outbox')
+    op.drop_index('ix_webhook_outbox_pending', table_name='webhook_outbox')
+    op.drop_table('webhook_outbox')
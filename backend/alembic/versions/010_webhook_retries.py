@@ -0,0 +1,58 @@
+"""add webhook retry state and dead-letter tables
+
+Revision ID: 010_webhook_retries
+Revises: 009_webhook_outbox
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSON, UUID
+
+
+# revision identifiers, used by Alembic.
+revision = '010_webhook_retries'
+down_revision = '009_webhook_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'webhook_deliveries',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True),
+        sa.Column('webhook_id', UUID(as_uuid=True), sa.ForeignKey('webhooks.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('event', sa.String(100), nullable=False),
+        sa.Column('payload', JSON, nullable=False),
+        sa.Column('attempts', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_error', sa.String(500), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('ix_webhook_deliveries_next_attempt_at', 'webhook_deliveries', ['next_attempt_at'])
+    op.create_index('ix_webhook_deliveries_webhook_id', 'webhook_deliveries', ['webhook_id'])
+
+    op.create_table(
+        'webhook_dead_letters',
+        sa.Column('id', UUID(as_uuid=True), primary_key=True),
+        sa.Column('webhook_id', UUID(as_uuid=True), sa.ForeignKey('webhooks.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('event', sa.String(100), nullable=False),
+        sa.Column('payload', JSON, nullable=False),
+        sa.Column('attempts', sa.Integer, nullable=False),
+        sa.Column('last_error', sa.String(500), nullable=True),
+        sa.Column('first_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('dead_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('replayed_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_webhook_dead_letters_webhook_id_dead_at', 'webhook_dead_letters', ['webhook_id', 'dead_at'])
+    op.create_index('ix_webhook_dead_letters_dead_at', 'webhook_dead_letters', ['dead_at'])
+
+
+def downgrade():
+    op.drop_index('ix_webhook_dead_letters_dead_at', table_name='webhook_dead_letters')
+    op.drop_index('ix_webhook_dead_letters_webhook_id_dead_at', table_name='webhook_dead_letters')
+    op.drop_table('webhook_dead_letters')
+
+    op.drop_index('ix_webhook_deliveries_webhook_id', table_name='webhook_deliveries')
+    op.drop_index('ix_webhook_deliveries_next_attempt_at', table_name='webhook_deliveries')
+    op.drop_table('webhook_deliveries')
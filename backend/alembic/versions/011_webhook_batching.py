@@ -0,0 +1,30 @@
+"""add batched delivery settings to webhooks
+
+Revision ID: 011_webhook_batching
+Revises: 010_webhook_retries
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011_webhook_batching'
+down_revision = '010_webhook_retries'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('webhooks', sa.Column('batch_enabled', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+    op.add_column('webhooks', sa.Column('batch_max_events', sa.Integer(), server_default=sa.text('100'), nullable=False))
+    op.add_column('webhooks', sa.Column('batch_max_bytes', sa.Integer(), server_default=sa.text('262144'), nullable=False))
+    op.add_column('webhooks', sa.Column('batch_linger_ms', sa.Integer(), server_default=sa.text('1000'), nullable=False))
+
+
+def downgrade():
+    op.drop_column('webhooks', 'batch_linger_ms')
+    op.drop_column('webhooks', 'batch_max_bytes')
+    op.drop_column('webhooks', 'batch_max_events')
+    op.drop_column('webhooks', 'batch_enabled')
@@ -0,0 +1,67 @@
+"""add webhook log latency, composite index and hourly stats
+
+Revision ID: 012_webhook_log_stats
+Revises: 011_webhook_batching
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = '012_webhook_log_stats'
+down_revision = '011_webhook_batching'
+branch_labels = None
+depends_on = None
+
+
+LATENCY_COLUMNS = [
+    'latency_le_50',
+    'latency_le_100',
+    'latency_le_250',
+    'latency_le_500',
+    'latency_le_1000',
+    'latency_le_2500',
+    'latency_le_5000',
+    'latency_le_10000',
+    'latency_gt_10000',
+]
+
+
+def upgrade():
+    op.add_column('webhook_logs', sa.Column('latency_ms', sa.Float(), nullable=True))
+
+    # The composite index also covers lookups by webhook_id alone
+    op.create_index(
+        'ix_webhook_logs_webhook_id_created_at',
+        'webhook_logs',
+        ['webhook_id', 'created_at'],
+    )
+    op.drop_index('ix_webhook_logs_webhook_id', table_name='webhook_logs')
+
+    op.create_table(
+        'webhook_stats_hourly',
+        sa.Column('webhook_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('deliveries', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('successes', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('latency_total_ms', sa.Float(), server_default='0', nullable=False),
+        *[
+            sa.Column(name, sa.Integer(), server_default='0', nullable=False)
+            for name in LATENCY_COLUMNS
+        ],
+        sa.PrimaryKeyConstraint('webhook_id', 'bucket_start'),
+    )
+    op.create_index('ix_webhook_stats_hourly_bucket_start', 'webhook_stats_hourly', ['bucket_start'])
+
+
+def downgrade():
+    op.drop_index('ix_webhook_stats_hourly_bucket_start', table_name='webhook_stats_hourly')
+    op.drop_table('webhook_stats_hourly')
+
+    op.create_index('ix_webhook_logs_webhook_id', 'webhook_logs', ['webhook_id'])
+    op.drop_index('ix_webhook_logs_webhook_id_created_at', table_name='webhook_logs')
+
+    op.drop_column('webhook_logs', 'latency_ms')
@@ -0,0 +1,43 @@
+"""store webhook log payloads once, compressed and content-addressed
+
+Revision ID: 013_webhook_payloads
+Revises: 012_webhook_log_stats
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSON
+
+
+# revision identifiers, used by Alembic.
+revision = '013_webhook_payloads'
+down_revision = '012_webhook_log_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'webhook_payloads',
+        sa.Column('hash', sa.String(64), nullable=False),
+        sa.Column('encoding', sa.String(10), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('last_used_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('hash'),
+    )
+    op.create_index('ix_webhook_payloads_last_used_at', 'webhook_payloads', ['last_used_at'])
+
+    # Existing rows keep their inline payload; new rows only reference one
+    op.add_column('webhook_logs', sa.Column('payload_hash', sa.String(64), nullable=True))
+    op.alter_column('webhook_logs', 'payload', existing_type=JSON(), nullable=True)
+
+
+def downgrade():
+    op.execute("DELETE FROM webhook_logs WHERE payload IS NULL")
+    op.alter_column('webhook_logs', 'payload', existing_type=JSON(), nullable=False)
+    op.drop_column('webhook_logs', 'payload_hash')
+
+    op.drop_index('ix_webhook_payloads_last_used_at', table_name='webhook_payloads')
+    op.drop_table('webhook_payloads')
@@ -0,0 +1,44 @@
+"""add owner access notification preferences and pending notifications
+
+Revision ID: 014_access_notifications
+Revises: 013_webhook_payloads
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = '014_access_notifications'
+down_revision = '013_webhook_payloads'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'users',
+        sa.Column('notification_frequency', sa.String(20), nullable=False, server_default='off'),
+    )
+
+    op.create_table(
+        'access_notifications',
+        sa.Column('id', sa.BigInteger, primary_key=True, autoincrement=True),
+        sa.Column('user_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('access_record_id', UUID(as_uuid=True), nullable=False),
+        sa.Column('due_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['access_record_id'], ['access_records.id'], ondelete='CASCADE'),
+    )
+    op.create_index(
+        'ix_access_notifications_due_at_user_id', 'access_notifications', ['due_at', 'user_id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_access_notifications_due_at_user_id', table_name='access_notifications')
+    op.drop_table('access_notifications')
+    op.drop_column('users', 'notification_frequency')
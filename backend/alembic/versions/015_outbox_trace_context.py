@@ -0,0 +1,24 @@
+"""store the producing request's trace context on outbox rows
+
+Revision ID: 015_outbox_trace_context
+Revises: 014_access_notifications
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '015_outbox_trace_context'
+down_revision = '014_access_notifications'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('webhook_outbox', sa.Column('trace_context', sa.String(55), nullable=True))
+
+
+def downgrade():
+    op.drop_column('webhook_outbox', 'trace_context')
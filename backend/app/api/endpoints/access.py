@@ -47,7 +47,9 @@ async def get_access_history(
     db: Session = Depends(get_db)
 ):
     """Get access history for current user"""
-    records = AccessService.get_user_access_history(db, current_user, limit)
+    records = await AccessService.get_cached_access_history(
+        db, AccessService.history_scope(current_user), limit
+    )
     return [AccessRecordResponse.model_validate(record) for record in records]
 
 
@@ -0,0 +1,57 @@
+"""
+Admin diagnostics endpoints
+"""
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import FileResponse
+from typing import List
+
+from app.core.authorization import require_admin
+from app.core.exceptions import NotFoundException
+from app.core.profiling import PROFILE_HEADER, create_profile_token, profile_store
+from app.models.user import User
+from app.schemas.profile import ProfileInfo, ProfileTokenRequest, ProfileTokenResponse
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.post("/profile/token", response_model=ProfileTokenResponse)
+async def create_profile_token_endpoint(
+    token_request: ProfileTokenRequest = ProfileTokenRequest(),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Get a short-lived token that profiles requests sending it (Admin only)
+    
+    Send it in the X-Profile-Token header on the slow request; the response
+    carries X-Profile-Id, the id to download the profile with.
+    """
+    token, expires_at = create_profile_token(current_user.id, token_request.ttl_seconds)
+    return ProfileTokenResponse(token=token, header=PROFILE_HEADER, expires_at=expires_at)
+
+
+@router.get("/profiles", response_model=List[ProfileInfo])
+async def list_profiles(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(require_admin)
+):
+    """List recent request profiles, newest first (Admin only)"""
+    return profile_store.list(limit)
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query("speedscope", pattern="^(speedscope|html)$"),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Download a profile (Admin only)
+    
+    `speedscope` opens as a flamegraph at https://www.speedscope.app;
+    `html` is pyinstrument's call tree view.
+    """
+    path = profile_store.path(profile_id, format)
+    if path is None:
+        raise NotFoundException("Profile")
+    media_type = "text/html" if format == "html" else "application/json"
+    return FileResponse(path, media_type=media_type, filename=path.name)
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
 from sqlalchemy.orm import Session
+from typing import Optional
 
 from app.core.database import get_db
-from app.schemas import DeviceCreate, DeviceResponse, DeviceWithQR, DeviceUpdate
+from app.core.authorization import require_admin
+from app.core.search import search_term
+from app.schemas import DeviceCreate, DeviceResponse, DeviceWithQR, DeviceUpdate, DeviceSearchResponse
 from app.services.device_service import DeviceService
 from app.services.qr_service import generate_qr_code
 from app.utils.dependencies import get_current_user
@@ -37,8 +40,23 @@ async def get_devices(
     db: Session = Depends(get_db)
 ):
     """Get all devices for current user"""
-    devices = DeviceService.get_user_devices(db, current_user.id)
-    return [DeviceResponse.model_validate(device) for device in devices]
+    return await DeviceService.get_cached_user_devices(db, current_user.id)
+
+
+@router.get("/search", response_model=DeviceSearchResponse)
+async def search_devices(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Search devices by partial serial, brand, model or name (Admin only)"""
+    devices, next_cursor = DeviceService.search_devices(db, search_term(q), limit, cursor)
+    return {
+        "items": [DeviceResponse.model_validate(device) for device in devices],
+        "next_cursor": next_cursor,
+    }
 
 
 @router.get("/{device_id}", response_model=DeviceResponse)
@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, Header, Query, status, HTTPException
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 from app.core.database import get_db
+from app.core.authorization import require_admin
 from app.core.security import hash_password, verify_password
 from app.core.config import settings
-from app.schemas import UserResponse, PasswordChange, PasswordResetRequest, PasswordReset, ProfileUpdate
+from app.core.cache_invalidation import invalidate_on_commit
+from app.core.redis_cache import user_cache_tag
+from app.core.search import search_term
+from app.core.email_templates import email_templates
+from app.schemas import UserResponse, UserSearchResponse, PasswordChange, PasswordResetRequest, PasswordReset, ProfileUpdate
 from app.utils.dependencies import get_current_user
 from app.models.user import User
 from app.models.password_reset_token import PasswordResetToken
 from app.services.email_service import EmailService
+from app.services.user_service import UserService
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -22,15 +29,33 @@ async def get_profile(
     return UserResponse.model_validate(current_user)
 
 
+@router.get("/search", response_model=UserSearchResponse)
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Search users by partial name, student ID or email (Admin only)"""
+    users, next_cursor = UserService.search_users(db, search_term(q), limit, cursor)
+    return {
+        "items": [UserResponse.model_validate(user) for user in users],
+        "next_cursor": next_cursor,
+    }
+
+
 @router.put("/me", response_model=UserResponse)
 async def update_profile(
     profile_data: ProfileUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Update current user profile (photo, name, dark mode)"""
-    if profile_data.full_name is not None:
+    """Update current user profile (photo, name, dark mode, scan notifications)"""
+    if profile_data.full_name is not None and profile_data.full_name != current_user.full_name:
         current_user.full_name = profile_data.full_name
+        # Names appear in cached access history pages
+        invalidate_on_commit(db, user_cache_tag(current_user.id))
     
     if profile_data.profile_photo is not None:
         current_user.profile_photo = profile_data.profile_photo
@@ -38,6 +63,9 @@ async def update_profile(
     if profile_data.dark_mode is not None:
         current_user.dark_mode = profile_data.dark_mode
     
+    if profile_data.notification_frequency is not None:
+        current_user.notification_frequency = profile_data.notification_frequency
+    
     db.commit()
     db.refresh(current_user)
     
@@ -68,6 +96,7 @@ async def change_password(
 @router.post("/password/reset-request")
 async def request_password_reset(
     reset_data: PasswordResetRequest,
+    accept_language: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     """Request password reset email"""
@@ -100,7 +129,8 @@ async def request_password_reset(
         EmailService.send_password_reset_email(
             to_email=user.email,
             reset_token=token,
-            full_name=user.full_name
+            full_name=user.full_name,
+            locale=email_templates.negotiate_locale(accept_language)
         )
     
     return {
@@ -1,26 +1,49 @@
 """
 Webhook management endpoints
 """
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
+from app.core.circuit_breaker import webhook_circuits
 from app.core.database import get_db
 from app.core.authorization import require_admin
-from app.models.webhook import Webhook, WebhookLog
+from app.models.webhook import Webhook, WebhookLog, WebhookDeadLetter
 from app.models.user import User
 from app.schemas.webhook import (
     WebhookCreate,
     WebhookResponse,
     WebhookUpdate,
-    WebhookLogResponse
+    WebhookLogResponse,
+    WebhookStatsResponse,
+    WebhookDeadLetterResponse,
+    DeadLetterReplayRequest,
+    DeadLetterReplayResponse
 )
 from app.services.webhook_service import WebhookService
+from app.services.webhook_registry import webhook_subscriptions
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 
 
+async def _webhook_responses(webhooks: List[Webhook]) -> List[WebhookResponse]:
+    """Build webhook responses including their receivers' circuit states (one Redis round trip)"""
+    states = await webhook_circuits.states(webhook.url for webhook in webhooks)
+    responses = []
+    for webhook in webhooks:
+        response = WebhookResponse.model_validate(webhook)
+        response.circuit_state = states[webhook.url].value
+        responses.append(response)
+    return responses
+
+
+async def _webhook_response(webhook: Webhook) -> WebhookResponse:
+    """Build a webhook response including its receiver's circuit state"""
+    [response] = await _webhook_responses([webhook])
+    return response
+
+
 @router.post("/", response_model=WebhookResponse, status_code=status.HTTP_201_CREATED)
 async def create_webhook(
     webhook_data: WebhookCreate,
@@ -34,10 +57,15 @@ async def create_webhook(
         url=webhook_data.url,
         events=webhook_data.events,
         created_by=str(current_user.id),
-        secret=webhook_data.secret
+        secret=webhook_data.secret,
+        batch_enabled=webhook_data.batch_enabled,
+        batch_max_events=webhook_data.batch_max_events,
+        batch_max_bytes=webhook_data.batch_max_bytes,
+        batch_linger_ms=webhook_data.batch_linger_ms
     )
+    await webhook_subscriptions.invalidate()
     
-    return WebhookResponse.model_validate(webhook)
+    return await _webhook_response(webhook)
 
 
 @router.get("/", response_model=List[WebhookResponse])
@@ -47,7 +75,43 @@ async def list_webhooks(
 ):
     """List all webhooks (Admin only)"""
     webhooks = db.query(Webhook).all()
-    return [WebhookResponse.model_validate(w) for w in webhooks]
+    return await _webhook_responses(webhooks)
+
+
+@router.get("/dead-letters", response_model=List[WebhookDeadLetterResponse])
+async def list_dead_letters(
+    webhook_id: Optional[UUID] = None,
+    include_replayed: bool = False,
+    limit: int = Query(100, ge=1, le=500),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """List deliveries that exhausted their retries (Admin only)"""
+    query = db.query(WebhookDeadLetter)
+    if webhook_id:
+        query = query.filter(WebhookDeadLetter.webhook_id == webhook_id)
+    if not include_replayed:
+        query = query.filter(WebhookDeadLetter.replayed_at.is_(None))
+    
+    dead_letters = query.order_by(WebhookDeadLetter.dead_at.desc()).limit(limit).all()
+    return [WebhookDeadLetterResponse.model_validate(d) for d in dead_letters]
+
+
+@router.post("/dead-letters/replay", response_model=DeadLetterReplayResponse)
+async def replay_dead_letters(
+    replay_data: DeadLetterReplayRequest,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Requeue dead-lettered deliveries in throttled batches (Admin only)"""
+    return WebhookService.replay_dead_letters(
+        db=db,
+        webhook_id=replay_data.webhook_id,
+        event=replay_data.event,
+        limit=replay_data.limit,
+        batch_size=replay_data.batch_size,
+        batch_interval_seconds=replay_data.batch_interval_seconds
+    )
 
 
 @router.get("/{webhook_id}", response_model=WebhookResponse)
@@ -63,7 +127,7 @@ async def get_webhook(
     if not webhook:
         raise NotFoundException("Webhook")
     
-    return WebhookResponse.model_validate(webhook)
+    return await _webhook_response(webhook)
 
 
 @router.put("/{webhook_id}", response_model=WebhookResponse)
@@ -88,11 +152,20 @@ async def update_webhook(
         webhook.events = webhook_data.events
     if webhook_data.is_active is not None:
         webhook.is_active = webhook_data.is_active
+    if webhook_data.batch_enabled is not None:
+        webhook.batch_enabled = webhook_data.batch_enabled
+    if webhook_data.batch_max_events is not None:
+        webhook.batch_max_events = webhook_data.batch_max_events
+    if webhook_data.batch_max_bytes is not None:
+        webhook.batch_max_bytes = webhook_data.batch_max_bytes
+    if webhook_data.batch_linger_ms is not None:
+        webhook.batch_linger_ms = webhook_data.batch_linger_ms
     
     db.commit()
     db.refresh(webhook)
+    await webhook_subscriptions.invalidate()
     
-    return WebhookResponse.model_validate(webhook)
+    return await _webhook_response(webhook)
 
 
 @router.delete("/{webhook_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -110,6 +183,7 @@ async def delete_webhook(
     
     db.delete(webhook)
     db.commit()
+    await webhook_subscriptions.invalidate()
     
     return None
 
@@ -125,5 +199,25 @@ async def get_webhook_logs(
     logs = db.query(WebhookLog).filter(
         WebhookLog.webhook_id == webhook_id
     ).order_by(WebhookLog.created_at.desc()).limit(limit).all()
+    payloads = WebhookService.get_log_payloads(db, logs)
+    
+    return [
+        WebhookLogResponse.model_validate(log).model_copy(update={"payload": payload})
+        for log, payload in zip(logs, payloads)
+    ]
+
+
+@router.get("/{webhook_id}/stats", response_model=WebhookStatsResponse)
+async def get_webhook_stats(
+    webhook_id: UUID,
+    hours: int = Query(24, ge=1, le=720),
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Get success rate and latency percentiles of a webhook (Admin only)"""
+    from app.core.exceptions import NotFoundException
+    
+    if not db.query(Webhook.id).filter(Webhook.id == webhook_id).first():
+        raise NotFoundException("Webhook")
     
-    return [WebhookLogResponse.model_validate(log) for log in logs]
+    return WebhookService.get_stats(db, webhook_id, hours)
@@ -0,0 +1,93 @@
+"""
+Base class for in-process background workers
+"""
+import abc
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PollingWorker(abc.ABC):
+    """
+    Asyncio loop that repeatedly calls `run_once`
+
+    When a pass handles a full batch the next one starts immediately;
+    otherwise the worker sleeps for `poll_interval` or until `wake()` is
+    called. Subclasses implement `run_once` and may override `on_idle`.
+    """
+
+    name = "worker"
+
+    def __init__(self, batch_size: int, poll_interval: float):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        """Start the background loop"""
+        if self._task:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("%s started", self.name)
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Stop the loop, letting the current pass finish"""
+        if not self._task:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
+        logger.info("%s stopped", self.name)
+
+    def wake(self) -> None:
+        """Request an immediate pass (thread-safe)"""
+        if self._loop and self._wakeup and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    @abc.abstractmethod
+    async def run_once(self) -> int:
+        """
+        Process one batch of work
+
+        Returns:
+            Number of items processed
+        """
+
+    async def on_idle(self) -> None:
+        """Hook called after every pass (housekeeping)"""
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                processed = await self.run_once()
+            except Exception as e:
+                logger.error("%s error: %s", self.name, e)
+                processed = 0
+
+            try:
+                await self.on_idle()
+            except Exception as e:
+                logger.error("%s housekeeping error: %s", self.name, e)
+
+            if processed < self.batch_size and not self._stopping:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
@@ -0,0 +1,247 @@
+"""
+Codecs for cached values
+
+Every value is stored as a small frame: one byte naming the codec, one byte
+naming the compression, then the payload. The header lets values written by
+another codec (e.g. during a rolling deploy) still be read; values without a
+header are plain JSON written before frames existed.
+"""
+import abc
+import base64
+import enum
+import importlib
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, Optional, Set
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.serialization import compress, decompress, dumps_bytes, loads
+
+TYPE_KEY = "__type__"
+
+_COMPRESSION_IDS = {"none": 0, "zstd": 1, "zlib": 2}
+_COMPRESSION_NAMES = {value: name for name, value in _COMPRESSION_IDS.items()}
+
+
+# Modules whose enums and models may be rebuilt from a cached class path
+TRUSTED_MODULE_PREFIX = "app."
+
+# Classes outside the app package allowed explicitly (see `register_class`)
+_registered_classes: Set[str] = set()
+
+
+class CacheCodec(abc.ABC):
+    """Turns values into bytes and back"""
+
+    id: int
+    name: str
+
+    @abc.abstractmethod
+    def encode(self, value: Any) -> bytes:
+        """Serialize a value"""
+
+    @abc.abstractmethod
+    def decode(self, data: bytes) -> Any:
+        """Rebuild a value written by `encode`"""
+
+
+class JsonCodec(CacheCodec):
+    """
+    Plain JSON (the original format)
+
+    UUIDs, datetimes and models come back as strings or dicts.
+    """
+
+    id = 1
+    name = "json"
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, default=str).encode()
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+def _class_path(cls: type) -> str:
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def _allowed(path: str) -> bool:
+    return path.startswith(TRUSTED_MODULE_PREFIX) or path in _registered_classes
+
+
+def _allowed_class_path(cls: type) -> str:
+    path = _class_path(cls)
+    if not _allowed(path):
+        raise TypeError(f"Cannot cache {path}: register it with register_class")
+    return path
+
+
+def register_class(cls: type) -> type:
+    """Allow an enum or model defined outside the app package to be cached (usable as a decorator)"""
+    _registered_classes.add(_class_path(cls))
+    return cls
+
+
+def _resolve_class(path: str, base: type) -> type:
+    # Never import a module named by cached data unless it is ours
+    if not _allowed(path):
+        raise ValueError(f"{path} is not allowed in cached values")
+    module_name, _, qualname = path.partition(":")
+    target: Any = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    if not (isinstance(target, type) and issubclass(target, base)):
+        raise ValueError(f"{path} is not a {base.__name__}")
+    return target
+
+
+class TypedCodec(CacheCodec):
+    """
+    JSON with type tags (orjson when installed)
+
+    UUID, datetime, date, time, Decimal, bytes, tuples, sets, enums and
+    pydantic models are written as `{"__type__": ..., "value": ...}` and
+    rebuilt on decode, so a cached value compares equal to the original.
+    Enum and model classes are looked up by import path and must still
+    exist when the value is read; only classes in the app package (or
+    passed to `register_class`) are rebuilt.
+    """
+
+    id = 2
+    name = "typed"
+
+    def encode(self, value: Any) -> bytes:
+        return dumps_bytes(self._tag(value))
+
+    def decode(self, data: bytes) -> Any:
+        return self._untag(loads(data))
+
+    def _tag(self, value: Any) -> Any:
+        # Exact type checks first: the common cases stay cheap
+        kind = type(value)
+        if kind in (str, int, float, bool) or value is None:
+            return value
+        if kind is list:
+            return [self._tag(item) for item in value]
+        if kind is dict:
+            if TYPE_KEY in value or not all(type(key) is str for key in value):
+                # Keys JSON cannot hold as-is: store the items instead
+                return {
+                    TYPE_KEY: "dict",
+                    "value": [[self._tag(key), self._tag(item)] for key, item in value.items()],
+                }
+            return {key: self._tag(item) for key, item in value.items()}
+        if isinstance(value, enum.Enum):
+            return {TYPE_KEY: "enum", "class": _allowed_class_path(kind), "value": self._tag(value.value)}
+        if isinstance(value, BaseModel):
+            return {
+                TYPE_KEY: "model",
+                "class": _allowed_class_path(kind),
+                "value": self._tag(dict(value)),
+            }
+        if isinstance(value, uuid.UUID):
+            return {TYPE_KEY: "uuid", "value": str(value)}
+        if isinstance(value, datetime):
+            return {TYPE_KEY: "datetime", "value": value.isoformat()}
+        if isinstance(value, date):
+            return {TYPE_KEY: "date", "value": value.isoformat()}
+        if isinstance(value, time):
+            return {TYPE_KEY: "time", "value": value.isoformat()}
+        if isinstance(value, Decimal):
+            return {TYPE_KEY: "decimal", "value": str(value)}
+        if isinstance(value, bytes):
+            return {TYPE_KEY: "bytes", "value": base64.b64encode(value).decode()}
+        if isinstance(value, tuple):
+            return {TYPE_KEY: "tuple", "value": [self._tag(item) for item in value]}
+        if isinstance(value, (set, frozenset)):
+            return {TYPE_KEY: "set", "value": [self._tag(item) for item in value]}
+        if isinstance(value, dict):
+            return self._tag(dict(value))
+        if isinstance(value, list):
+            return self._tag(list(value))
+        raise TypeError(f"Cannot cache values of type {kind.__name__}")
+
+    def _untag(self, value: Any) -> Any:
+        if type(value) is list:
+            return [self._untag(item) for item in value]
+        if type(value) is not dict:
+            return value
+        kind = value.get(TYPE_KEY)
+        if kind is None:
+            return {key: self._untag(item) for key, item in value.items()}
+
+        data = value["value"]
+        if kind == "uuid":
+            return uuid.UUID(data)
+        if kind == "datetime":
+            return datetime.fromisoformat(data)
+        if kind == "date":
+            return date.fromisoformat(data)
+        if kind == "time":
+            return time.fromisoformat(data)
+        if kind == "decimal":
+            return Decimal(data)
+        if kind == "bytes":
+            return base64.b64decode(data)
+        if kind == "tuple":
+            return tuple(self._untag(item) for item in data)
+        if kind == "set":
+            return {self._untag(item) for item in data}
+        if kind == "dict":
+            return {self._untag(key): self._untag(item) for key, item in data}
+        if kind == "enum":
+            return _resolve_class(value["class"], enum.Enum)(self._untag(data))
+        if kind == "model":
+            return _resolve_class(value["class"], BaseModel).model_validate(self._untag(data))
+        raise ValueError(f"Unknown cached type: {kind}")
+
+
+CODECS: Dict[str, CacheCodec] = {codec.name: codec for codec in (JsonCodec(), TypedCodec())}
+_CODECS_BY_ID = {codec.id: codec for codec in CODECS.values()}
+
+
+def encode(value: Any, codec: Optional[str] = None) -> bytes:
+    """
+    Encode a value into a cache frame
+
+    Payloads larger than CACHE_COMPRESS_THRESHOLD bytes are compressed.
+
+    Args:
+        value: Value to cache
+        codec: Codec name (default CACHE_CODEC)
+
+    Returns:
+        Frame bytes
+    """
+    chosen = CODECS[codec or settings.CACHE_CODEC]
+    payload = chosen.encode(value)
+    compression = "none"
+    if len(payload) > settings.CACHE_COMPRESS_THRESHOLD:
+        compression, payload = compress(payload)
+    return bytes((chosen.id, _COMPRESSION_IDS[compression])) + payload
+
+
+def decode(data: bytes) -> Any:
+    """
+    Decode a cache frame written by `encode` (or a legacy JSON value)
+
+    Args:
+        data: Frame bytes
+
+    Returns:
+        Cached value
+    """
+    codec = _CODECS_BY_ID.get(data[0])
+    if codec is None:
+        # Written before frames existed (or a raw counter)
+        return json.loads(data)
+    payload = data[2:]
+    compression = _COMPRESSION_NAMES[data[1]]
+    if compression != "none":
+        payload = decompress(compression, payload)
+    return codec.decode(payload)
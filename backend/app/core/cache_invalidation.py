@@ -0,0 +1,126 @@
+"""
+Cache invalidation tied to database commits
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_cache import cache, sync_cache
+
+logger = logging.getLogger(__name__)
+
+_PENDING_TAGS = "cache_invalidation_tags"
+
+# Event loop serving the current request and the invalidations it started
+_request_invalidations: ContextVar[Optional[Tuple[asyncio.AbstractEventLoop, List]]] = ContextVar(
+    "request_invalidations", default=None
+)
+
+# Invalidations started outside a request (referenced so they are not garbage collected)
+_background: set = set()
+
+
+def invalidate_on_commit(db: Session, *tags: str) -> None:
+    """
+    Invalidate cache tags once the session's transaction commits
+
+    Services call this next to their writes. Invalidating after the commit
+    means a reader missing right after it reads the committed rows, and
+    nothing is invalidated if the transaction rolls back.
+
+    Args:
+        db: Session holding the write
+        *tags: Cache tags the write makes stale
+    """
+    db.info.setdefault(_PENDING_TAGS, set()).update(tags)
+
+
+def invalidate_now(tags: Iterable[str]) -> None:
+    """
+    Drop tagged entries from Redis and from every process's in-process tier
+
+    Blocks on the synchronous client; for scripts and threads that are not
+    serving a request. This process's copies are evicted before returning;
+    other processes follow the invalidation channel.
+    """
+    keys = sync_cache.invalidate_tags(*tags)
+    if keys is None or not cache.enabled:
+        cache.invalidate_locally(tags)
+    elif keys:
+        cache.local.delete(*keys)
+        logger.debug("Invalidated %d cached entries", len(keys))
+
+
+def _schedule(tags: List[str]) -> bool:
+    """
+    Run the invalidation on the event loop instead of blocking the caller
+
+    Returns:
+        False if there is no loop to run it on
+    """
+    request = _request_invalidations.get()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is not None:
+        pending = running.create_task(cache.invalidate_tags(*tags))
+    elif request is not None:
+        # Committed in the request's worker thread
+        pending = asyncio.run_coroutine_threadsafe(cache.invalidate_tags(*tags), request[0])
+    else:
+        return False
+    if request is not None:
+        request[1].append(pending)
+    else:
+        _background.add(pending)
+        pending.add_done_callback(_background.discard)
+    return True
+
+
+@asynccontextmanager
+async def invalidations_settled() -> AsyncIterator[None]:
+    """
+    Wait, on leaving the block, for the invalidations its commits started
+
+    Wraps request handling so the response goes out only once the writes
+    it made are invalidated everywhere (read-your-writes), without the
+    Redis round trip blocking the thread that committed.
+    """
+    pending: List = []
+    token = _request_invalidations.set((asyncio.get_running_loop(), pending))
+    try:
+        yield
+    finally:
+        _request_invalidations.reset(token)
+        if pending:
+            waiting = [
+                task if isinstance(task, asyncio.Future) else asyncio.wrap_future(task)
+                for task in pending
+            ]
+            await asyncio.wait(waiting, timeout=settings.REDIS_SOCKET_TIMEOUT)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    tags = session.info.pop(_PENDING_TAGS, None)
+    if not tags or (cache.enabled and _schedule(list(tags))):
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        invalidate_now(tags)
+    else:
+        # Never block the event loop; Redis gets it on reconnect
+        cache.invalidate_locally(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING_TAGS, None)
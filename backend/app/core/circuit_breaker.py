@@ -0,0 +1,262 @@
+"""
+Circuit breaker shared across workers through Redis
+"""
+import enum
+import hashlib
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.redis_cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Each transition reads and writes the circuit hash in one script, so
+# concurrent callers in different workers cannot overwrite each other.
+# KEYS[1] is the circuit hash and KEYS[2] the probe lock.
+
+# ARGV: now, cooldown seconds, probe TTL. Returns 1 if the call may go through.
+_ALLOW_LUA = """
+local state = redis.call('HGET', KEYS[1], 'state')
+if not state or state == 'closed' then
+    return 1
+end
+local opened_at = tonumber(redis.call('HGET', KEYS[1], 'opened_at') or '0')
+if tonumber(ARGV[1]) - opened_at < tonumber(ARGV[2]) then
+    return 0
+end
+if not redis.call('SET', KEYS[2], 1, 'NX', 'EX', ARGV[3]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'state', 'half_open')
+return 1
+"""
+
+# Returns 1 if a half-open circuit was closed. Successes that finish while
+# the circuit is open were started before it opened and leave it open.
+_SUCCESS_LUA = """
+local state = redis.call('HGET', KEYS[1], 'state')
+if state == 'open' then
+    return 0
+end
+redis.call('DEL', KEYS[1], KEYS[2])
+if state == 'half_open' then
+    return 1
+end
+return 0
+"""
+
+# ARGV: now, failure threshold. Returns the failure count if the circuit opened.
+_FAILURE_LUA = """
+local state = redis.call('HGET', KEYS[1], 'state')
+if state == 'open' then
+    return 0
+end
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if state ~= 'half_open' and failures < tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', ARGV[1])
+redis.call('DEL', KEYS[2])
+return failures
+"""
+
+
+class CircuitState(str, enum.Enum):
+    """Circuit breaker states"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class _Circuit:
+    state: str = CircuitState.CLOSED.value
+    failures: int = 0
+    opened_at: float = 0.0
+
+
+class _LocalCircuitStore:
+    """In-process store used when Redis is unavailable (same transitions as the scripts)"""
+
+    def __init__(self):
+        self._circuits: Dict[str, _Circuit] = {}
+        self._probes: Dict[str, float] = {}
+
+    def load(self, key: str) -> _Circuit:
+        circuit = self._circuits.get(key)
+        return _Circuit(**vars(circuit)) if circuit else _Circuit()
+
+    def load_many(self, keys: List[str]) -> List[_Circuit]:
+        return [self.load(key) for key in keys]
+
+    def allow(self, key: str, now: float, cooldown: float, probe_ttl: int) -> bool:
+        circuit = self._circuits.get(key)
+        if circuit is None or circuit.state == CircuitState.CLOSED.value:
+            return True
+        if now - circuit.opened_at < cooldown:
+            return False
+        if self._probes.get(key, 0.0) > time.monotonic():
+            return False
+        self._probes[key] = time.monotonic() + probe_ttl
+        circuit.state = CircuitState.HALF_OPEN.value
+        return True
+
+    def succeed(self, key: str) -> bool:
+        circuit = self._circuits.get(key)
+        if circuit is not None and circuit.state == CircuitState.OPEN.value:
+            return False
+        self._circuits.pop(key, None)
+        self._probes.pop(key, None)
+        return circuit is not None and circuit.state == CircuitState.HALF_OPEN.value
+
+    def fail(self, key: str, now: float, threshold: int) -> int:
+        circuit = self._circuits.setdefault(key, _Circuit())
+        if circuit.state == CircuitState.OPEN.value:
+            return 0
+        circuit.failures += 1
+        if circuit.state != CircuitState.HALF_OPEN.value and circuit.failures < threshold:
+            return 0
+        circuit.state = CircuitState.OPEN.value
+        circuit.opened_at = now
+        self._probes.pop(key, None)
+        return circuit.failures
+
+
+class _RedisCircuitStore:
+    """Circuit state kept in a Redis hash so every worker sees it"""
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def _parse(raw: dict) -> _Circuit:
+        data = {field.decode(): value.decode() for field, value in raw.items()}
+        if not data:
+            return _Circuit()
+        return _Circuit(
+            state=data.get("state", CircuitState.CLOSED.value),
+            failures=int(data.get("failures", 0)),
+            opened_at=float(data.get("opened_at", 0.0)),
+        )
+
+    async def load(self, key: str) -> _Circuit:
+        return self._parse(await self.client.hgetall(key))
+
+    async def load_many(self, keys: List[str]) -> List[_Circuit]:
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        return [self._parse(raw) for raw in await pipe.execute()]
+
+    async def allow(self, key: str, now: float, cooldown: float, probe_ttl: int) -> bool:
+        script = self.client.register_script(_ALLOW_LUA)
+        return bool(await script(keys=[key, f"{key}:probe"], args=[repr(now), cooldown, probe_ttl]))
+
+    async def succeed(self, key: str) -> bool:
+        script = self.client.register_script(_SUCCESS_LUA)
+        return bool(await script(keys=[key, f"{key}:probe"]))
+
+    async def fail(self, key: str, now: float, threshold: int) -> int:
+        script = self.client.register_script(_FAILURE_LUA)
+        return int(await script(keys=[key, f"{key}:probe"], args=[repr(now), threshold]))
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker keyed by an arbitrary name
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    callers are refused without touching the remote side. Once
+    `cooldown_seconds` have passed a single caller is let through as a probe
+    (half-open): success closes the circuit, failure opens it for another
+    cooldown. State lives in Redis (through the async client, one script per
+    transition) when it is connected and in process memory otherwise.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        failure_threshold: Optional[int] = None,
+        cooldown_seconds: Optional[float] = None,
+    ):
+        self.prefix = prefix
+        self.failure_threshold = failure_threshold or settings.WEBHOOK_CIRCUIT_FAILURE_THRESHOLD
+        self.cooldown_seconds = cooldown_seconds or settings.WEBHOOK_CIRCUIT_COOLDOWN_SECONDS
+        # A probe that never reports back (crashed worker) must not block others forever
+        self.probe_ttl = math.ceil(settings.WEBHOOK_TIMEOUT) + 5
+        self._local = _LocalCircuitStore()
+
+    def _key(self, name: str) -> str:
+        return self.prefix + hashlib.sha1(name.encode()).hexdigest()[:16]
+
+    async def _run(self, operation: str, *args):
+        """Run a store operation, falling back to local state on Redis errors"""
+        if cache.enabled and cache.redis_client is not None:
+            try:
+                return await getattr(_RedisCircuitStore(cache.redis_client), operation)(*args)
+            except Exception as e:
+                logger.error("Circuit breaker Redis error: %s", e)
+        return getattr(self._local, operation)(*args)
+
+    def _effective_state(self, circuit: _Circuit) -> CircuitState:
+        # An open circuit past its cooldown lets the next call through as a probe
+        if (
+            circuit.state == CircuitState.OPEN.value
+            and time.time() - circuit.opened_at >= self.cooldown_seconds
+        ):
+            return CircuitState.HALF_OPEN
+        return CircuitState(circuit.state)
+
+    async def state(self, name: str) -> CircuitState:
+        """
+        Current state of a circuit
+
+        An open circuit whose cooldown has elapsed reports half-open, since
+        the next call will be let through as a probe.
+        """
+        return self._effective_state(await self._run("load", self._key(name)))
+
+    async def states(self, names: Iterable[str]) -> Dict[str, CircuitState]:
+        """Current state of several circuits in one round trip"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        circuits = await self._run("load_many", [self._key(name) for name in names])
+        return {name: self._effective_state(circuit) for name, circuit in zip(names, circuits)}
+
+    async def allow(self, name: str) -> bool:
+        """
+        Whether a call may go through now
+
+        Returns:
+            True when closed, or for the single probe of a cooled-down circuit
+        """
+        return await self._run(
+            "allow", self._key(name), time.time(), self.cooldown_seconds, self.probe_ttl
+        )
+
+    async def retry_after(self, name: str) -> float:
+        """Seconds until an open circuit accepts a probe (0 if it already does)"""
+        circuit = await self._run("load", self._key(name))
+        if circuit.state == CircuitState.CLOSED.value:
+            return 0.0
+        return max(0.0, circuit.opened_at + self.cooldown_seconds - time.time())
+
+    async def record_success(self, name: str) -> None:
+        """Close a half-open circuit (or reset the failure count) after a successful call"""
+        if await self._run("succeed", self._key(name)):
+            logger.info("Circuit %s%s closed", self.prefix, name)
+
+    async def record_failure(self, name: str) -> None:
+        """Count a failed call, opening the circuit at the threshold"""
+        failures = await self._run("fail", self._key(name), time.time(), self.failure_threshold)
+        if failures:
+            logger.warning("Circuit %s%s opened after %d failures", self.prefix, name, failures)
+
+
+# Global breaker for webhook receivers, keyed by URL
+webhook_circuits = CircuitBreaker(prefix="webhooks:circuit:")
@@ -14,6 +14,26 @@ class Settings(BaseSettings):
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_MAX_CONNECTIONS: int = 50  # per process and client (async and sync pools)
+    REDIS_SOCKET_TIMEOUT: float = 0.5  # seconds per command before the cache gives up
+    REDIS_CONNECT_TIMEOUT: float = 1.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # seconds idle before a pooled connection is pinged
+    CACHE_L1_MAX_ENTRIES: int = 1024  # in-process entries per worker
+    CACHE_L1_TTL: float = 30.0  # max seconds a value stays in the in-process tier
+    CACHE_INVALIDATION_CHANNEL: str = "cache:invalidate"
+    CACHE_INVALIDATION_GRACE: int = 60  # seconds a tag remembers its last invalidation; longer loads are not cached
+    CACHE_SCAN_BATCH_SIZE: int = 500  # keys per SCAN/UNLINK step in pattern purges
+    CACHE_LOCK_TTL: float = 10.0  # seconds a cache fill lock is held at most
+    CACHE_LOCK_WAIT: float = 2.0  # seconds other processes wait for a fill before computing
+    CACHE_XFETCH_BETA: float = 1.0  # early refresh eagerness (0 disables)
+    CACHE_CODEC: str = "typed"  # "typed" (keeps UUID/datetime/enum/model types) or "json"
+    CACHE_COMPRESS_THRESHOLD: int = 1024  # bytes; larger cached values are compressed
+    CACHE_FALLBACK_MAX_ENTRIES: int = 10000  # in-process entries while Redis is down
+    CACHE_FALLBACK_TTL: float = 60.0  # max seconds a fallback entry lives (other workers cannot invalidate it)
+    CACHE_FAILOVER_ERRORS: int = 3  # consecutive Redis errors before switching to the fallback
+    CACHE_RECONNECT_INTERVAL: float = 1.0  # first reconnect delay; doubles up to 30s
+    CACHE_DEVICES_TTL: int = 300  # seconds; device lists are invalidated on every write
+    CACHE_ACCESS_HISTORY_TTL: int = 60
 
     # API
     API_TITLE: str = "ECCI Control System API"
@@ -21,12 +41,36 @@ class Settings(BaseSettings):
     API_DESCRIPTION: str = "Sistema de Control de Acceso y Registro de Dispositivos"
     DEBUG: bool = False
 
+    # Metrics
+    METRICS_ENABLED: bool = True  # expose Prometheus metrics at /metrics
+    SERVER_TIMING_ENABLED: bool = True  # Server-Timing header with DB time and query count
+    SQL_REPEAT_THRESHOLD: int = 10  # runs of one statement shape per request before it is flagged
+    SQL_REPEAT_MODE: str = "warn"  # off, warn (log) or raise (fail the request; for tests)
+
+    # Request profiling (admins send a profile token in X-Profile-Token)
+    PROFILE_DIR: str = "logs/profiles"
+    PROFILE_MAX_STORED: int = 50  # oldest profiles are deleted beyond this
+    PROFILE_TOKEN_TTL: int = 600  # seconds
+    PROFILE_INTERVAL: float = 0.001  # sampling interval in seconds
+
+    # Tracing
+    TRACE_EXPORTER: str = "none"  # none (off), file (JSON lines in TRACE_FILE) or otlp (OTLP/HTTP JSON)
+    TRACE_SAMPLE_RATE: float = 0.1  # fraction of new traces recorded; a caller's traceparent decision is kept
+    TRACE_FILE: str = "logs/traces.jsonl"
+    TRACE_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACE_SERVICE_NAME: str = "ecci-control-api"
+    TRACE_EXPORT_BATCH_SIZE: int = 512  # spans per export
+    TRACE_EXPORT_INTERVAL: float = 2.0  # max seconds a finished span waits to be exported
+    TRACE_QUEUE_SIZE: int = 2048  # finished spans buffered before new ones are dropped
+
     # CORS
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:5173,http://localhost:8081,http://localhost:8082"
 
     # Application
     ENVIRONMENT: str = "development"
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json (one object per line) or text
+    LOG_SAMPLE_RATES: str = ""  # "<path glob>=<rate>,..." e.g. "/api/access/scan=0.1"; INFO lines only
     
     # Email Configuration
     SMTP_HOST: str = "smtp.gmail.com"
@@ -35,7 +79,52 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: Optional[str] = None
     SMTP_FROM_EMAIL: str = "noreply@ecci-control.com"
     SMTP_FROM_NAME: str = "ECCI Control System"
+    SMTP_STARTTLS: bool = True
+    SMTP_TIMEOUT: float = 10.0
+    SMTP_POOL_SIZE: int = 4  # persistent connections (and concurrent sends)
+    SMTP_IDLE_TIMEOUT: float = 60.0  # seconds before an idle connection is dropped
+    EMAIL_QUEUE_ENABLED: bool = True
+    EMAIL_QUEUE_BATCH_SIZE: int = 50
+    EMAIL_QUEUE_POLL_INTERVAL: float = 1.0
+    EMAIL_MAX_ATTEMPTS: int = 5
+    EMAIL_RETRY_BASE_SECONDS: float = 5.0
+    EMAIL_RETRY_MAX_SECONDS: float = 300.0
+    EMAIL_DEFAULT_LOCALE: str = "es"  # language templates are written in
     
+    # Owner access notifications
+    NOTIFICATIONS_ENABLED: bool = True
+    NOTIFICATION_POLL_INTERVAL: float = 15.0  # also the window "immediate" scans are collapsed in
+    NOTIFICATION_BATCH_SIZE: int = 100  # users handled per aggregator pass
+    
+    # Webhooks
+    WEBHOOK_DISPATCHER_ENABLED: bool = True
+    WEBHOOK_OUTBOX_BATCH_SIZE: int = 100
+    WEBHOOK_OUTBOX_POLL_INTERVAL: float = 2.0  # seconds between idle polls
+    WEBHOOK_OUTBOX_LEASE_SECONDS: int = 60
+    WEBHOOK_OUTBOX_CONCURRENCY: int = 20  # outbox entries dispatched at once
+    WEBHOOK_OUTBOX_RETENTION_HOURS: int = 24
+    WEBHOOK_TIMEOUT: float = 10.0
+    WEBHOOK_HTTP2: bool = True
+    WEBHOOK_MAX_CONNECTIONS: int = 100
+    WEBHOOK_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    WEBHOOK_KEEPALIVE_EXPIRY: float = 30.0
+    WEBHOOK_MAX_CONNECTIONS_PER_HOST: int = 10
+    WEBHOOK_MAX_CONCURRENCY: int = 20
+    WEBHOOK_MAX_ATTEMPTS: int = 8
+    WEBHOOK_RETRY_BASE_SECONDS: float = 10.0
+    WEBHOOK_RETRY_MAX_SECONDS: float = 3600.0
+    WEBHOOK_RETRY_BATCH_SIZE: int = 100
+    WEBHOOK_RETRY_POLL_INTERVAL: float = 5.0
+    WEBHOOK_INDEX_CHECK_INTERVAL: float = 1.0  # seconds between Redis version checks
+    WEBHOOK_CIRCUIT_FAILURE_THRESHOLD: int = 5  # consecutive failures that open a receiver's circuit
+    WEBHOOK_CIRCUIT_COOLDOWN_SECONDS: float = 30.0  # open time before a half-open probe
+    WEBHOOK_LOG_BUFFER_SIZE: int = 500  # buffered log rows that trigger a bulk insert
+    WEBHOOK_LOG_FLUSH_INTERVAL: float = 2.0  # max seconds a log row stays buffered
+    WEBHOOK_LOG_RETENTION_DAYS: int = 30
+    WEBHOOK_STATS_RETENTION_DAYS: int = 180
+    WEBHOOK_RETENTION_CHUNK_SIZE: int = 5000  # rows per retention delete statement
+    WEBHOOK_SIGNATURE_TOLERANCE_SECONDS: int = 300  # max age accepted by verify_timestamped_signature
+
     # Password Reset
     RESET_TOKEN_EXPIRE_MINUTES: int = 30
     FRONTEND_URL: str = "http://localhost:8081"
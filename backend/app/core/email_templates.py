@@ -0,0 +1,193 @@
+"""
+Precompiled, localized email templates
+"""
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, Template, select_autoescape
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates"
+
+# File suffixes making up one notification: subject line, HTML body, text body
+TEMPLATE_PARTS = ("subject.txt", "html", "txt")
+
+
+@dataclass(frozen=True)
+class RenderedEmail:
+    """Subject and bodies of a rendered notification"""
+    subject: str
+    html: str
+    text: str
+
+
+class _Catalog:
+    """
+    Translations for one locale, read from templates/locales/<locale>.json
+
+    Keys are the source (Spanish) strings; values are the translation, or a
+    [singular, plural] pair for strings used with ngettext.
+    """
+
+    def __init__(self, messages: Optional[Dict[str, Any]] = None):
+        self.messages = messages or {}
+
+    def gettext(self, message: str) -> str:
+        translated = self.messages.get(message)
+        return translated if isinstance(translated, str) else message
+
+    def ngettext(self, singular: str, plural: str, n: int) -> str:
+        translated = self.messages.get(singular)
+        if isinstance(translated, list):
+            singular, plural = translated
+        return singular if n == 1 else plural
+
+
+class EmailTemplates:
+    """
+    Compiles every email template once per locale and renders from memory
+
+    A notification named `x` consists of `x.subject.txt`, `x.html` and
+    `x.txt` under templates/email; files starting with an underscore are
+    layouts. `load` compiles them all, so rendering never touches the
+    filesystem or the Jinja parser. Templates are written in Spanish and
+    marked with {% trans %} / _(); other locales come from JSON catalogs.
+    """
+
+    def __init__(self, directory: Path = TEMPLATE_DIR, default_locale: Optional[str] = None):
+        self.directory = directory
+        self.default_locale = default_locale or settings.EMAIL_DEFAULT_LOCALE
+        self.locales: List[str] = []
+        self._templates: Dict[Tuple[str, str], Tuple[Template, Template, Template]] = {}
+
+    def _environment(self, catalog: _Catalog) -> Environment:
+        environment = Environment(
+            loader=FileSystemLoader(str(self.directory / "email")),
+            autoescape=select_autoescape(["html"]),
+            undefined=StrictUndefined,
+            auto_reload=False,
+            lstrip_blocks=True,
+            extensions=["jinja2.ext.i18n"],
+        )
+        # Collapse whitespace in {% trans %} blocks so catalog keys stay on one line
+        environment.policies["ext.i18n.trimmed"] = True
+        environment.install_gettext_callables(catalog.gettext, catalog.ngettext, newstyle=True)
+        environment.globals.update(app_name=settings.SMTP_FROM_NAME)
+        return environment
+
+    def load(self) -> int:
+        """
+        Compile all templates for all locales
+
+        Returns:
+            Number of notifications compiled (summed over locales)
+        """
+        catalogs = {self.default_locale: _Catalog()}
+        for path in sorted((self.directory / "locales").glob("*.json")):
+            catalogs[path.stem] = _Catalog(json.loads(path.read_text(encoding="utf-8")))
+
+        templates = {}
+        for locale, catalog in catalogs.items():
+            environment = self._environment(catalog)
+            names = {
+                template.split(".", 1)[0]
+                for template in environment.list_templates()
+                if not template.startswith("_")
+            }
+            for name in names:
+                templates[(locale, name)] = tuple(
+                    environment.get_template(f"{name}.{part}") for part in TEMPLATE_PARTS
+                )
+
+        self._templates = templates
+        self.locales = sorted(catalogs)
+        logger.info(
+            "Compiled %d email templates for locales: %s", len(templates), ", ".join(self.locales)
+        )
+        return len(templates)
+
+    def _match(self, locale: str) -> Optional[str]:
+        """Supported locale for a tag ("en-US" -> "en"), if any"""
+        locale = locale.strip().replace("_", "-").lower()
+        for candidate in (locale, locale.split("-", 1)[0]):
+            if candidate in self.locales:
+                return candidate
+        return None
+
+    def resolve_locale(self, locale: Optional[str]) -> str:
+        """Closest supported locale, or the default"""
+        return (locale and self._match(locale)) or self.default_locale
+
+    def negotiate_locale(self, accept_language: Optional[str]) -> str:
+        """
+        Pick a locale from an Accept-Language header
+
+        Args:
+            accept_language: Header value, e.g. "en-US,en;q=0.9,es;q=0.8"
+
+        Returns:
+            Best supported locale, or the default
+        """
+        if not self._templates:
+            self.load()
+
+        ranked = []
+        for position, item in enumerate((accept_language or "").split(",")):
+            language, _, params = item.strip().partition(";")
+            quality = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    continue
+            if language and language != "*" and quality > 0:
+                ranked.append((-quality, position, language))
+
+        for _, _, language in sorted(ranked):
+            locale = self._match(language)
+            if locale:
+                return locale
+        return self.default_locale
+
+    def render(self, name: str, locale: Optional[str] = None, **context: Any) -> RenderedEmail:
+        """
+        Render a notification
+
+        Args:
+            name: Notification name (e.g. "password_reset")
+            locale: Preferred locale; unsupported ones fall back to the default
+            **context: Template variables
+
+        Returns:
+            Rendered subject, HTML and text bodies
+
+        Raises:
+            KeyError: Unknown notification
+        """
+        if not self._templates:
+            self.load()
+
+        locale = self.resolve_locale(locale)
+        try:
+            subject, html, text = self._templates[(locale, name)]
+        except KeyError:
+            raise KeyError(f"Unknown email template: {name}") from None
+
+        context.update(locale=locale)
+        context.setdefault("year", datetime.now(timezone.utc).year)
+        return RenderedEmail(
+            subject=" ".join(subject.render(context).split()),
+            html=html.render(context),
+            text=text.render(context),
+        )
+
+
+# Global template registry, compiled on application startup
+email_templates = EmailTemplates()
@@ -0,0 +1,93 @@
+"""
+Shared outbound HTTP client for webhook delivery
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class WebhookHTTPClient:
+    """
+    Long-lived httpx client with keep-alive, HTTP/2 and bounded concurrency
+
+    Concurrency is bounded globally and per host, so a slow receiver cannot
+    take every connection. The client and its semaphores are bound to the
+    event loop that created them and are rebuilt if the loop changes.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            http2 = settings.WEBHOOK_HTTP2 and HTTP2_AVAILABLE
+            if settings.WEBHOOK_HTTP2 and not HTTP2_AVAILABLE:
+                logger.warning("h2 package not installed; webhook client falls back to HTTP/1.1")
+
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.WEBHOOK_TIMEOUT, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.WEBHOOK_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.WEBHOOK_KEEPALIVE_EXPIRY,
+                ),
+                http2=http2,
+                follow_redirects=False,
+            )
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(settings.WEBHOOK_MAX_CONCURRENCY)
+            self._host_semaphores = {}
+        return self._client
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(settings.WEBHOOK_MAX_CONNECTIONS_PER_HOST)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def post(self, url: str, content: bytes, headers: Dict[str, str]) -> httpx.Response:
+        """
+        POST a request body through the shared pool
+
+        Args:
+            url: Target URL
+            content: Raw request body
+            headers: Request headers
+
+        Returns:
+            httpx response
+        """
+        client = self._ensure_client()
+        async with self._semaphore, self._host_semaphore(url):
+            return await client.post(url, content=content, headers=headers)
+
+    async def close(self) -> None:
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+            logger.info("Webhook HTTP client closed")
+
+
+# Global client instance
+webhook_http_client = WebhookHTTPClient()
@@ -0,0 +1,181 @@
+"""
+In-process LRU cache with per-entry TTL
+"""
+import fnmatch
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.metrics import record_cache_lookup
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for one cache tier"""
+    hits: int = 0
+    misses: int = 0
+    tier: Optional[str] = None  # Also counted in cache_lookups_total under this label
+
+    def record(self, hit: bool, count: int = 1) -> None:
+        """Count lookups that hit or missed"""
+        if hit:
+            self.hits += count
+        else:
+            self.misses += count
+        if self.tier:
+            record_cache_lookup(self.tier, hit, count)
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": round(self.hit_ratio, 4)}
+
+
+class LocalCache:
+    """
+    Thread-safe map bounded by entry count and age
+
+    The least recently used entry is evicted once `max_entries` is reached;
+    entries older than their TTL are dropped when read. Values are stored as
+    given, so callers should store immutable values (e.g. encoded strings).
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        default_ttl: Optional[float] = None,
+        tier: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.stats = CacheStats(tier=tier)
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return a live entry (marking it recently used) or `default`"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats.record(True)
+                    return value
+                del self._entries[key]
+            self.stats.record(False)
+            return default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store an entry, evicting the least recently used one if full"""
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys: str) -> int:
+        """Remove entries; returns how many existed"""
+        with self._lock:
+            return sum(self._entries.pop(key, None) is not None for key in keys)
+
+    def delete_matching(self, pattern: str) -> int:
+        """Remove entries whose key matches a glob pattern"""
+        with self._lock:
+            keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+
+
+class MemoryCacheBackend:
+    """
+    Stand-in for Redis inside one process
+
+    Holds encoded values in a LocalCache and keeps its own tag index, so
+    tag invalidation stays precise while Redis is down. Entries live at
+    most `max_ttl` seconds: other processes cannot invalidate them.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, max_ttl: float, tier: Optional[str] = None):
+        self.entries = LocalCache(max_entries, tier=tier)
+        self.max_ttl = max_ttl
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.entries.stats
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.entries.get(key)
+
+    def set_many(self, values: Dict[str, Any], ttl: float) -> None:
+        for key, value in values.items():
+            self.entries.set(key, value, min(ttl, self.max_ttl))
+
+    def tag(self, keys: Iterable[str], tags: Iterable[str]) -> None:
+        """Register keys under tags"""
+        keys = list(keys)
+        with self._lock:
+            for tag in tags:
+                self._tags.setdefault(tag, set()).update(keys)
+            if sum(len(members) for members in self._tags.values()) > 2 * self.entries.max_entries:
+                self._prune()
+
+    def _prune(self) -> None:
+        # Evicted and expired members would otherwise pile up
+        for tag in list(self._tags):
+            self._tags[tag] = {key for key in self._tags[tag] if key in self.entries}
+            if not self._tags[tag]:
+                del self._tags[tag]
+
+    def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        """Delete every entry registered under the tags; returns their keys"""
+        with self._lock:
+            keys = list(dict.fromkeys(
+                key for tag in tags for key in self._tags.pop(tag, ())
+            ))
+        self.entries.delete(*keys)
+        return keys
+
+    def delete(self, *keys: str) -> int:
+        return self.entries.delete(*keys)
+
+    def delete_matching(self, pattern: str) -> int:
+        return self.entries.delete_matching(pattern)
+
+    def incr(self, key: str) -> int:
+        """Increment a counter stored as ASCII digits, like Redis INCR"""
+        with self._lock:
+            value = int(self.entries.get(key, b"0")) + 1
+            self.entries.set(key, str(value).encode(), self.max_ttl)
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tags.clear()
+        self.entries.clear()
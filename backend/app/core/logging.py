@@ -1,13 +1,139 @@
+import atexit
+import copy
+import fnmatch
+import functools
 import logging
+import queue
+import random
 import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
 
 from app.core.config import settings
+from app.core.serialization import dumps_bytes
+
+# Id of the request being handled, added to every record logged while handling it
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Whether INFO and DEBUG records of the current request are kept (see LOG_SAMPLE_RATES)
+log_sampled_var: ContextVar[bool] = ContextVar("log_sampled", default=True)
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id",
+}
+
+_listener: Optional[QueueListener] = None
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """
+    Request id for a new request
+
+    A well-formed id sent by the client or proxy (X-Request-ID) is kept so log
+    lines can be matched across services; anything else gets a fresh id.
+    """
+    if incoming and len(incoming) <= 64 and incoming.replace("-", "").isalnum():
+        return incoming
+    return uuid.uuid4().hex
+
+
+@functools.lru_cache(maxsize=8)
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """
+    Parse LOG_SAMPLE_RATES ("<path glob>=<rate>,...") into rates by pattern
+
+    Example: "/api/access/scan=0.1" keeps the INFO lines of one scan in ten.
+    """
+    rates = {}
+    for entry in value.split(","):
+        pattern, _, rate = entry.strip().partition("=")
+        if pattern and rate:
+            rates[pattern] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def sample_request(path: str) -> bool:
+    """
+    Decide whether a request's INFO and DEBUG lines are logged
+
+    Warnings and errors are always logged; paths without a configured rate
+    are always sampled.
+    """
+    for pattern, rate in parse_sample_rates(settings.LOG_SAMPLE_RATES).items():
+        if fnmatch.fnmatchcase(path, pattern):
+            return random.random() < rate
+    return True
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Tag records with the current request id and drop unsampled ones
+
+    Runs in the thread that logs, where the request's context variables are
+    visible; the listener thread only sees what was copied onto the record.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and not log_sampled_var.get():
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with `extra` fields as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "location": f"{record.module}.{record.funcName}:{record.lineno}",
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_text or record.exc_info:
+            entry["exception"] = record.exc_text or self.formatException(record.exc_info)
+        return dumps_bytes(entry).decode()
+
+
+class _ContextQueueHandler(QueueHandler):
+    """
+    Queue records for the listener thread without formatting them
+
+    The message is interpolated here (arguments may change after the call
+    returns) and tracebacks are rendered while the frames still exist, but
+    formatting and the I/O are left to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Other handlers (e.g. pytest's) still see the original record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
 
 def setup_logging():
-    """Configure application logging"""
+    """
+    Configure application logging
+    
+    Records go through a queue to a listener thread that formats them and
+    writes to stdout and the log files, so logging on the event loop never
+    waits on I/O.
+    """
+    global _listener
     
     # Create logs directory if it doesn't exist
     log_dir = Path("logs")
@@ -18,7 +144,7 @@ def setup_logging():
     
     # Create formatters
     detailed_formatter = logging.Formatter(
-        "[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s",
+        "[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] [%(request_id)s] %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S"
     )
     
@@ -26,18 +152,17 @@ def setup_logging():
         "%(levelname)s - %(message)s"
     )
     
-    # Configure root logger
-    root_logger = logging.getLogger()
-    root_logger.setLevel(log_level)
-    
-    # Clear existing handlers
-    root_logger.handlers = []
+    if settings.LOG_FORMAT == "json":
+        console_formatter = file_formatter = JsonFormatter()
+    else:
+        console_formatter = simple_formatter if settings.ENVIRONMENT == "development" else detailed_formatter
+        file_formatter = detailed_formatter
     
     # Console handler (stdout)
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(log_level)
-    console_handler.setFormatter(simple_formatter if settings.ENVIRONMENT == "development" else detailed_formatter)
-    root_logger.addHandler(console_handler)
+    console_handler.setFormatter(console_formatter)
+    handlers = [console_handler]
     
     # File handler (rotating)
     if settings.ENVIRONMENT != "development":
@@ -47,8 +172,8 @@ def setup_logging():
             backupCount=5
         )
         file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(detailed_formatter)
-        root_logger.addHandler(file_handler)
+        file_handler.setFormatter(file_formatter)
+        handlers.append(file_handler)
         
         # Error file handler
         error_handler = RotatingFileHandler(
@@ -57,8 +182,21 @@ def setup_logging():
             backupCount=5
         )
         error_handler.setLevel(logging.ERROR)
-        error_handler.setFormatter(detailed_formatter)
-        root_logger.addHandler(error_handler)
+        error_handler.setFormatter(file_formatter)
+        handlers.append(error_handler)
+    
+    # Replace a listener from an earlier call (flushing what it queued)
+    stop_logging()
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = _ContextQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    
+    # Configure root logger
+    root_logger = logging.getLogger()
+    root_logger.setLevel(log_level)
+    root_logger.handlers = [queue_handler]
     
     # Reduce noise from libraries
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
@@ -67,6 +205,17 @@ def setup_logging():
     return root_logger
 
 
+def stop_logging():
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
 def get_logger(name: str) -> logging.Logger:
     """Get a logger instance for a module"""
     return logging.getLogger(name)
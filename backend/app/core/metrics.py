@@ -0,0 +1,191 @@
+"""
+Prometheus metrics
+
+Collectors live in the default registry. Under gunicorn each worker holds
+its own values; with PROMETHEUS_MULTIPROC_DIR set, workers write them to
+files in that directory and /metrics aggregates every worker's files
+(see gunicorn.conf.py).
+"""
+import os
+from typing import Optional
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# Route label for requests no route matched, so probes for random paths
+# cannot create new series
+UNMATCHED_ROUTE = "<unmatched>"
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by method, route template and status",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by method, route template and status",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled",
+    multiprocess_mode="livesum",
+)
+
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements run per request by route template",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+HTTP_REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in SQL statements per request by route template",
+    ["route"],
+)
+DB_REPEATED_STATEMENTS = Counter(
+    "db_repeated_statements_total",
+    "Statement shapes a request ran more than SQL_REPEAT_THRESHOLD times",
+    ["route"],
+)
+
+DB_CONNECTIONS_CHECKED_OUT = Gauge(
+    "db_pool_connections_checked_out",
+    "Database connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured database pool size (unset for pools without a size)",
+    multiprocess_mode="livesum",
+)
+DB_CONNECTIONS_OPENED = Counter(
+    "db_connections_opened_total",
+    "New database connections opened by the pool",
+)
+
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups by tier and result",
+    ["tier", "result"],
+)
+
+ACCESS_SCANS = Counter(
+    "access_scans_total",
+    "Recorded QR scans by location and access type",
+    ["location", "access_type"],
+)
+
+WEBHOOK_DELIVERIES = Counter(
+    "webhook_deliveries_total",
+    "Webhook delivery attempts by outcome",
+    ["outcome"],
+)
+WEBHOOK_DELIVERY_DURATION = Histogram(
+    "webhook_delivery_duration_seconds",
+    "Latency of attempted webhook deliveries",
+)
+WEBHOOK_DEAD_LETTERS = Counter(
+    "webhook_dead_letters_total",
+    "Webhook deliveries moved to the dead-letter table",
+)
+
+
+def route_label(request: Request) -> str:
+    """
+    Route template that handled a request (e.g. `/api/devices/{device_id}`)
+
+    Labelling by template instead of the raw path keeps one series per
+    endpoint rather than one per device or user id.
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def observe_request(method: str, route: str, status: int, duration: float) -> None:
+    """Count a finished request and record its latency"""
+    labels = (method, route, str(status))
+    HTTP_REQUESTS.labels(*labels).inc()
+    HTTP_REQUEST_DURATION.labels(*labels).observe(duration)
+
+
+def observe_queries(route: str, count: int, duration: float, repeated: int = 0) -> None:
+    """Record a request's SQL statement count, time and repeated shapes"""
+    HTTP_REQUEST_DB_QUERIES.labels(route).observe(count)
+    HTTP_REQUEST_DB_DURATION.labels(route).observe(duration)
+    if repeated:
+        DB_REPEATED_STATEMENTS.labels(route).inc(repeated)
+
+
+def record_cache_lookup(tier: str, hit: bool, count: int = 1) -> None:
+    """Count lookups against one cache tier"""
+    CACHE_LOOKUPS.labels(tier, "hit" if hit else "miss").inc(count)
+
+
+def record_scan(location: Optional[str], access_type: str) -> None:
+    """Count a recorded scan (scans without a location count as "unknown")"""
+    ACCESS_SCANS.labels(location or "unknown", access_type).inc()
+
+
+def record_webhook_delivery(outcome: str, duration: Optional[float] = None) -> None:
+    """
+    Count a webhook delivery attempt
+
+    Args:
+        outcome: "success", "http_error", "network_error" or "short_circuited"
+        duration: Seconds spent on the request (None when it was not sent)
+    """
+    WEBHOOK_DELIVERIES.labels(outcome).inc()
+    if duration is not None:
+        WEBHOOK_DELIVERY_DURATION.observe(duration)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Track connection checkouts, new connections and pool size for an engine
+
+    With NullPool every checkout opens a new connection, so
+    db_connections_opened_total grows with traffic; with a sized pool it
+    stays near the pool size.
+    """
+    size = getattr(engine.pool, "size", None)
+    if callable(size):
+        DB_POOL_SIZE.set(size())
+
+    @event.listens_for(engine, "connect")
+    def _connected(dbapi_connection, connection_record):
+        DB_CONNECTIONS_OPENED.inc()
+
+    @event.listens_for(engine, "checkout")
+    def _checked_out(dbapi_connection, connection_record, connection_proxy):
+        DB_CONNECTIONS_CHECKED_OUT.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _checked_in(dbapi_connection, connection_record):
+        DB_CONNECTIONS_CHECKED_OUT.dec()
+
+
+def render() -> bytes:
+    """
+    Metrics in the Prometheus text format
+
+    In multiprocess mode a fresh registry collects every worker's files;
+    otherwise this process's default registry is exported.
+    """
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
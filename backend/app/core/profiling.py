@@ -0,0 +1,207 @@
+"""
+On-demand request profiling
+
+An admin requests a short-lived profile token and sends it in the
+X-Profile-Token header; only those requests run under a sampling profiler.
+Requests without the header pay one header lookup. Profiles are saved as
+speedscope JSON (flamegraph at https://www.speedscope.app) and pyinstrument
+HTML in a directory that keeps the newest PROFILE_MAX_STORED of them.
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from jose import JWTError, jwt
+
+from app.core.config import settings
+from app.core.serialization import dumps_bytes, loads
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+    PYINSTRUMENT_AVAILABLE = True
+except ImportError:
+    PYINSTRUMENT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_SCOPE = "profile"
+
+# Output formats and their file suffixes
+PROFILE_FORMATS = {"speedscope": ".speedscope.json", "html": ".html"}
+_META_SUFFIX = ".meta.json"
+_PROFILE_ID = re.compile(r"^\d{8}T\d{12}-[0-9a-f]{8}$")
+
+
+def create_profile_token(admin_id: Any, ttl_seconds: Optional[int] = None) -> Tuple[str, datetime]:
+    """
+    Sign a token that lets requests carrying it be profiled
+
+    The token has no `sub` claim, so it cannot be used to authenticate.
+
+    Args:
+        admin_id: Admin requesting the token (recorded with each profile)
+        ttl_seconds: Lifetime (default PROFILE_TOKEN_TTL)
+
+    Returns:
+        Token and its expiry
+    """
+    expires_at = datetime.now(timezone.utc) + timedelta(
+        seconds=ttl_seconds or settings.PROFILE_TOKEN_TTL
+    )
+    token = jwt.encode(
+        {"scope": PROFILE_SCOPE, "admin": str(admin_id), "exp": expires_at},
+        settings.SECRET_KEY,
+        algorithm=settings.ALGORITHM,
+    )
+    return token, expires_at
+
+
+def verify_profile_token(token: str) -> Optional[str]:
+    """Admin id of a valid, unexpired profile token (None otherwise)"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("scope") != PROFILE_SCOPE:
+        return None
+    return payload.get("admin")
+
+
+class ProfileStore:
+    """
+    Ring buffer of profiles on disk
+
+    Each profile is a metadata file plus one file per output format, all
+    named by the profile id; ids sort by creation time, so the oldest
+    profiles are the first names in the directory.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_profiles: Optional[int] = None):
+        self._directory = directory
+        self._max_profiles = max_profiles
+        self._lock = threading.Lock()
+        self._last_stamp = 0
+
+    @property
+    def directory(self) -> Path:
+        return Path(self._directory or settings.PROFILE_DIR)
+
+    @property
+    def max_profiles(self) -> int:
+        return self._max_profiles or settings.PROFILE_MAX_STORED
+
+    def _ids(self) -> List[str]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(path.name[:-len(_META_SUFFIX)] for path in self.directory.glob(f"*{_META_SUFFIX}"))
+
+    def save(self, outputs: Dict[str, str], meta: Dict[str, Any]) -> str:
+        """
+        Store a profile, dropping the oldest ones beyond the limit
+
+        Args:
+            outputs: Rendered profile by format name
+            meta: Request details shown in the listing
+
+        Returns:
+            Profile id
+        """
+        with self._lock:
+            # Microsecond stamps, kept increasing so ids sort in save order
+            stamp = max(time.time_ns() // 1000, self._last_stamp + 1)
+            self._last_stamp = stamp
+            created = datetime.fromtimestamp(stamp / 1e6, timezone.utc)
+            profile_id = f"{created:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for name, content in outputs.items():
+                (self.directory / f"{profile_id}{PROFILE_FORMATS[name]}").write_text(content)
+            # Written last: a profile is listed only once its outputs exist
+            (self.directory / f"{profile_id}{_META_SUFFIX}").write_bytes(
+                dumps_bytes({"id": profile_id, "formats": sorted(outputs), **meta})
+            )
+            for old_id in self._ids()[:-self.max_profiles]:
+                for path in self.directory.glob(f"{old_id}.*"):
+                    path.unlink(missing_ok=True)
+        return profile_id
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Metadata of the newest profiles, newest first"""
+        profiles = []
+        for profile_id in reversed(self._ids()[-limit:]):
+            try:
+                profiles.append(loads((self.directory / f"{profile_id}{_META_SUFFIX}").read_bytes()))
+            except (OSError, ValueError):
+                continue  # Evicted while listing
+        return profiles
+
+    def path(self, profile_id: str, output: str) -> Optional[Path]:
+        """File holding one output of a profile, if it is still stored"""
+        if not _PROFILE_ID.match(profile_id) or output not in PROFILE_FORMATS:
+            return None
+        path = self.directory / f"{profile_id}{PROFILE_FORMATS[output]}"
+        return path if path.is_file() else None
+
+
+def _render(session) -> Dict[str, str]:
+    return {
+        "speedscope": SpeedscopeRenderer().render(session),
+        "html": HTMLRenderer().render(session),
+    }
+
+
+async def profile_request(request, call_next):
+    """
+    Run a request under the profiler if it carries a valid profile token
+
+    Only code running on the event loop thread is sampled; time a sync
+    endpoint spends in the threadpool shows up as the await on it.
+    """
+    admin_id = verify_profile_token(request.headers[PROFILE_HEADER])
+    if admin_id is None or not PYINSTRUMENT_AVAILABLE:
+        if admin_id is None:
+            logger.warning("Ignoring invalid profile token on %s %s", request.method, request.url.path)
+        else:
+            logger.warning("Profile requested but pyinstrument is not installed")
+        return await call_next(request)
+
+    profiler = Profiler(interval=settings.PROFILE_INTERVAL, async_mode="enabled")
+    started = time.perf_counter()
+    profiler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        session = profiler.stop()
+    duration = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    meta = {
+        "method": request.method,
+        "path": request.url.path,
+        "route": getattr(route, "path", None),
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 2),
+        "admin_id": admin_id,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+    def render_and_save() -> str:
+        return profile_store.save(_render(session), meta)
+
+    # Rendering and disk writes stay off the event loop
+    profile_id = await asyncio.to_thread(render_and_save)
+    response.headers[PROFILE_ID_HEADER] = profile_id
+    logger.info("Profiled %s %s as %s", request.method, request.url.path, profile_id)
+    return response
+
+
+# Global profile store
+profile_store = ProfileStore()
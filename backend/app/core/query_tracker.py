@@ -0,0 +1,155 @@
+"""
+Per-request SQL statistics
+
+Engine events count the statements a tracked request runs, their total time
+and how often each statement shape repeats. A shape is the SQL with literals,
+bound parameters and expanded IN lists collapsed, so one query run for many
+different ids has a single shape; a shape repeating many times in one request
+is the usual sign of an N+1 loop.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_PARAMETERS = re.compile(r"%\(\w+\)s|%s|(?<![:\w]):\w+|\$\d+")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+_STARTED = "query_tracker_started"
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+
+class RepeatedStatementError(RuntimeError):
+    """A request repeated one statement shape more than SQL_REPEAT_THRESHOLD times"""
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Normalize a statement so runs that differ only in values compare equal
+
+    Args:
+        statement: SQL as sent to the driver
+
+    Returns:
+        The statement with values replaced by `?` and IN lists collapsed
+    """
+    shape = _STRINGS.sub("?", statement)
+    shape = _PARAMETERS.sub("?", shape)
+    shape = _NUMBERS.sub("?", shape)
+    shape = _LISTS.sub("(?)", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+
+@dataclass
+class QueryStats:
+    """Statements run during one tracked block"""
+    count: int = 0
+    duration: float = 0.0  # seconds
+    shapes: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, duration: float) -> int:
+        """Count one statement; returns how often its shape has run so far"""
+        shape = statement_shape(statement)
+        self.count += 1
+        self.duration += duration
+        self.shapes[shape] += 1
+        return self.shapes[shape]
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Shapes run more than `threshold` times, most repeated first"""
+        return [(shape, runs) for shape, runs in self.shapes.most_common() if runs > threshold]
+
+    def describe(self) -> str:
+        """Summary listing each shape with its run count"""
+        lines = [f"{self.count} statements in {self.duration * 1000:.1f}ms"]
+        lines.extend(f"  {runs}x {shape}" for shape, runs in self.shapes.most_common())
+        return "\n".join(lines)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Record the statements run in this context (and tasks or threads it starts)
+
+    Yields:
+        Statistics filled in as statements run
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def current_stats() -> Optional[QueryStats]:
+    """Statistics of the block being tracked, if any"""
+    return _current.get()
+
+
+def report_repeats(stats: QueryStats, route: str) -> List[Tuple[str, int]]:
+    """
+    Log statement shapes a request repeated more than SQL_REPEAT_THRESHOLD times
+
+    Args:
+        stats: The request's statistics
+        route: Route template, for the log line
+
+    Returns:
+        The repeated shapes with their run counts (empty when SQL_REPEAT_MODE is off)
+    """
+    if settings.SQL_REPEAT_MODE == "off":
+        return []
+    repeats = stats.repeated(settings.SQL_REPEAT_THRESHOLD)
+    for shape, runs in repeats:
+        logger.warning("Possible N+1 on %s: statement ran %d times: %s", route, runs, shape)
+    return repeats
+
+
+def server_timing(stats: QueryStats, total: float) -> str:
+    """
+    Server-Timing header value with database and total time
+
+    Args:
+        stats: The request's statistics
+        total: Seconds spent handling the request
+    """
+    return (
+        f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries", '
+        f"total;dur={total * 1000:.2f}"
+    )
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info[_STARTED] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.pop(_STARTED, None)
+    if stats is None or started is None:
+        return
+    runs = stats.record(statement, time.perf_counter() - started)
+    if settings.SQL_REPEAT_MODE == "raise" and runs == settings.SQL_REPEAT_THRESHOLD + 1:
+        # Fail at the offending statement so the traceback points at the loop
+        raise RepeatedStatementError(
+            f"Statement ran {runs} times in one request: {statement_shape(statement)}"
+        )
@@ -2,77 +2,559 @@
 Redis cache service for performance optimization
 """
 import redis
+import redis.asyncio as aioredis
+import enum
 import json
 import logging
 import asyncio
-from typing import Any, Optional, Callable
+import math
+import random
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Callable, Tuple
 from functools import wraps
-from datetime import timedelta
 
+from sqlalchemy.orm import Session
+
+from app.core import cache_codec
 from app.core.config import settings
+from app.core.local_cache import CacheStats, LocalCache, MemoryCacheBackend
+from app.core.tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
+def _pool_options() -> Dict[str, Any]:
+    """Connection pool options shared by the async and sync clients"""
+    return {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+        # Values are binary codec frames; keys and messages are decoded by callers
+        "decode_responses": False,
+    }
+
+
+# Tag sets hold the cache keys registered under a tag
+TAG_KEY_PREFIX = "tag:"
+
+# KEYS: tag sets; ARGV[1]: TTL in seconds; ARGV[2..]: cache keys.
+# A tag set lives at least as long as its longest-lived member.
+_TAG_REGISTER_LUA = """
+local unpack = unpack or table.unpack
+local ttl = tonumber(ARGV[1])
+for _, tag in ipairs(KEYS) do
+    redis.call('SADD', tag, unpack(ARGV, 2))
+    if redis.call('TTL', tag) < ttl then
+        redis.call('EXPIRE', tag, ttl)
+    end
+end
+return #KEYS
+"""
+
+# Bumped by every tag invalidation; each tag remembers the generation that
+# last invalidated it (for CACHE_INVALIDATION_GRACE seconds)
+GENERATION_KEY = "cache:generation"
+TAG_GENERATION_PREFIX = "tag_gen:"
+
+# KEYS[1]: generation counter, then the tag sets, then their generation
+# markers; ARGV[1]: seconds a marker is kept. Deletes every member and the
+# sets in one atomic step, records the new generation on each tag and
+# returns the deleted member keys.
+_TAG_INVALIDATE_LUA = """
+local unpack = unpack or table.unpack
+local count = (#KEYS - 1) / 2
+local generation = redis.call('INCR', KEYS[1])
+local deleted = {}
+for t = 2, count + 1 do
+    local members = redis.call('SMEMBERS', KEYS[t])
+    for i = 1, #members, 500 do
+        redis.call('UNLINK', unpack(members, i, math.min(i + 499, #members)))
+    end
+    for _, member in ipairs(members) do
+        deleted[#deleted + 1] = member
+    end
+    redis.call('DEL', KEYS[t])
+    redis.call('SET', KEYS[t + count], generation, 'EX', ARGV[1])
+end
+return deleted
+"""
+
+# KEYS: cache keys, then tag sets, then their generation markers.
+# ARGV: number of cache keys, number of tags, TTL, generation the values
+# were computed at, 1 to write the values (0 to only register them), then
+# the values. Writes nothing and returns 0 if a tag was invalidated after
+# that generation, so a load that raced with a write cannot cache what it
+# read before the write.
+_GUARDED_SET_LUA = """
+local unpack = unpack or table.unpack
+local count, tags = tonumber(ARGV[1]), tonumber(ARGV[2])
+local ttl, since = tonumber(ARGV[3]), tonumber(ARGV[4])
+for i = count + tags + 1, count + 2 * tags do
+    if tonumber(redis.call('GET', KEYS[i]) or '0') > since then
+        return 0
+    end
+end
+if ARGV[5] == '1' then
+    for i = 1, count do
+        redis.call('SETEX', KEYS[i], ttl, ARGV[5 + i])
+    end
+end
+for i = count + 1, count + tags do
+    redis.call('SADD', KEYS[i], unpack(KEYS, 1, count))
+    if redis.call('TTL', KEYS[i]) < ttl then
+        redis.call('EXPIRE', KEYS[i], ttl)
+    end
+end
+return 1
+"""
+
+
+# Deletes a lock only if it still holds the caller's token
+_LOCK_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _tag_keys(tags: Iterable[str]) -> List[str]:
+    return [f"{TAG_KEY_PREFIX}{tag}" for tag in dict.fromkeys(tags)]
+
+
+def _generation_keys(tags: Iterable[str]) -> List[str]:
+    return [f"{TAG_GENERATION_PREFIX}{tag}" for tag in dict.fromkeys(tags)]
+
+
+def _invalidation_keys(tags: Iterable[str]) -> List[str]:
+    return [GENERATION_KEY, *_tag_keys(tags), *_generation_keys(tags)]
+
+
+def _encode(value: Any) -> bytes:
+    return cache_codec.encode(value)
+
+
+def _decode(value: Optional[bytes]) -> Optional[Any]:
+    return cache_codec.decode(value) if value else None
+
+
+class CacheTier(str, enum.Enum):
+    """Where a cached value may live"""
+    LOCAL = "local"  # This process only (L1)
+    REDIS = "redis"  # Shared Redis only (L2)
+    BOTH = "both"    # L1 in front of L2
+
+
+class _MissedWrites:
+    """Invalidations Redis did not see while the fallback was serving"""
+    
+    def __init__(self):
+        self.tags: set = set()
+        self.keys: set = set()
+        self.patterns: set = set()
+        self.everything = False
+    
+    def add(self, kind: str, items: Iterable[str]) -> None:
+        target = getattr(self, kind)
+        target.update(items)
+        if len(self.tags) + len(self.keys) + len(self.patterns) > settings.CACHE_FALLBACK_MAX_ENTRIES:
+            # Too much to replay precisely: drop everything on reconnect
+            self.everything = True
+            self.tags, self.keys, self.patterns = set(), set(), set()
+    
+    def __bool__(self) -> bool:
+        return bool(self.everything or self.tags or self.keys or self.patterns)
+
+
 class RedisCache:
-    """Redis cache manager"""
+    """
+    Async Redis cache manager with an in-process L1
+    
+    Commands go through a `redis.asyncio` client backed by an explicit,
+    bounded connection pool, so they never block the event loop. Every
+    command is bounded by REDIS_SOCKET_TIMEOUT: a slow Redis degrades to a
+    cache miss instead of stalling the request. Multi-key operations use
+    MGET or a non-transactional pipeline (one round trip).
+    
+    Reads and writes take a tier. With BOTH, values are also kept in a
+    size- and TTL-bounded LRU (CACHE_L1_MAX_ENTRIES, CACHE_L1_TTL) so hot
+    keys skip the Redis round trip. Every write and invalidation is
+    published on CACHE_INVALIDATION_CHANNEL in the same pipeline, and each
+    process evicts the keys other processes changed. L1 is only used for
+    BOTH while that subscription is up; LOCAL entries are per process by
+    design.
+    
+    Entries can be registered under tags (e.g. `user:{id}`, `device:{id}`);
+    `invalidate_tags` drops every member of a tag atomically with a Lua
+    script, so no request ever walks the keyspace. Scripts touch members
+    that are not declared in KEYS, which is fine for a single Redis but
+    not for Redis Cluster.
+    
+    Every tag invalidation also bumps a generation counter and records it
+    on the tag. A value stored with `since` (the generation read before it
+    was computed) is dropped if one of its tags was invalidated after that,
+    so a load racing with a write never caches the rows it read before.
+    
+    When Redis cannot be reached at startup, or CACHE_FAILOVER_ERRORS
+    commands fail in a row, the cache switches to an in-process
+    MemoryCacheBackend (TTL- and LRU-bounded) instead of turning caching
+    off, and reconnects in the background. Writes and invalidations made
+    meanwhile are replayed against Redis before switching back, so Redis
+    never serves entries that changed during the outage.
+    """
     
     def __init__(self):
-        self.redis_client: Optional[redis.Redis] = None
+        self.pool: Optional[aioredis.ConnectionPool] = None
+        self.redis_client: Optional[aioredis.Redis] = None
         self.enabled = False
+        self.local = LocalCache(settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_TTL, tier="l1")
+        self.redis_stats = CacheStats(tier="l2")
+        # Identifies this process's own invalidation messages
+        self.instance_id = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribed = False
+        self.fallback = MemoryCacheBackend(
+            settings.CACHE_FALLBACK_MAX_ENTRIES, settings.CACHE_FALLBACK_TTL, tier="fallback"
+        )
+        self.failovers = 0
+        self._errors = 0
+        self._missed = _MissedWrites()
+        self._reconnect: Optional[asyncio.Task] = None
+        # Generations of the fallback's tag invalidations
+        self._generation = 0
+        self._generation_floor = 0
+        self._invalidated: Dict[str, int] = {}
     
-    def connect(self):
+    @property
+    def backend(self) -> str:
+        """Backend serving shared reads and writes ("redis" or "memory")"""
+        return "redis" if self.enabled else self.fallback.name
+    
+    async def connect(self):
         """Connect to Redis server"""
         try:
             redis_url = getattr(settings, 'REDIS_URL', 'redis://localhost:6379/0')
-            self.redis_client = redis.from_url(
-                redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
+            self.pool = aioredis.ConnectionPool.from_url(redis_url, **_pool_options())
+            self.redis_client = aioredis.Redis(connection_pool=self.pool)
             # Test connection
-            self.redis_client.ping()
+            await self.redis_client.ping()
             self.enabled = True
+            self.start_invalidation_listener()
             logger.info("Redis cache connected successfully")
         except Exception as e:
-            logger.warning(f"Redis cache not available: {e}. Continuing without cache.")
+            logger.warning("Redis cache not available: %s. Using the in-process fallback.", e)
             self.enabled = False
+            self._start_reconnect()
     
-    def disconnect(self):
-        """Disconnect from Redis"""
+    async def disconnect(self):
+        """Disconnect from Redis and close pooled connections"""
+        for task in (self._listener, self._reconnect):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._listener = None
+        self._reconnect = None
         if self.redis_client:
-            self.redis_client.close()
+            await self.redis_client.aclose()
+            if self.pool:
+                await self.pool.disconnect()
+            self.enabled = False
             logger.info("Redis cache disconnected")
     
-    def get(self, key: str) -> Optional[Any]:
+    def _redis_error(self, operation: str, error: Exception) -> None:
+        logger.error("Redis %s error: %s", operation, error)
+        self._errors += 1
+        if self.enabled and self._errors >= settings.CACHE_FAILOVER_ERRORS:
+            self._fail_over(error)
+    
+    def _fail_over(self, reason: Exception) -> None:
+        logger.warning("Redis cache unavailable (%s); switching to the in-process fallback", reason)
+        self.enabled = False
+        self.failovers += 1
+        # Other processes' invalidations can no longer reach L1
+        self.local.clear()
+        self._start_reconnect()
+    
+    def _start_reconnect(self) -> None:
+        if self._reconnect is not None and not self._reconnect.done():
+            return
+        try:
+            self._reconnect = asyncio.get_running_loop().create_task(self._reconnect_loop())
+        except RuntimeError:
+            # No event loop (e.g. called from a script): connect() retries
+            self._reconnect = None
+    
+    async def _reconnect_loop(self) -> None:
+        delay = settings.CACHE_RECONNECT_INTERVAL
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.redis_client.ping()
+                await self._replay_missed()
+            except Exception as e:
+                logger.debug("Redis reconnect failed: %s", e)
+                delay = min(delay * 2, 30.0)
+                continue
+            self._errors = 0
+            self.fallback.clear()
+            self.enabled = True
+            self.start_invalidation_listener()
+            logger.info("Redis cache reconnected; leaving the in-process fallback")
+            return
+    
+    async def _replay_missed(self) -> None:
+        """Apply writes made during the outage to Redis"""
+        missed = self._missed
+        if not missed:
+            return
+        client = self.redis_client
+        if missed.everything:
+            await client.flushdb()
+        else:
+            keys = list(missed.keys)
+            if missed.tags:
+                members = await client.register_script(_TAG_INVALIDATE_LUA)(
+                    keys=_invalidation_keys(missed.tags), args=[settings.CACHE_INVALIDATION_GRACE]
+                )
+                keys.extend(member.decode() for member in members)
+            for pattern in missed.patterns:
+                keys.extend([key async for key in client.scan_iter(match=pattern)])
+            batch_size = settings.CACHE_SCAN_BATCH_SIZE
+            for i in range(0, len(keys), batch_size):
+                await client.unlink(*keys[i:i + batch_size])
+        # Processes that stayed connected may hold copies of those keys
+        await client.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation(all=True))
+        self._missed = _MissedWrites()
+    
+    def invalidate_locally(self, tags: Iterable[str]) -> None:
+        """
+        Invalidate tags from synchronous code that could not reach Redis
+        
+        This process's copies are dropped at once; Redis gets the
+        invalidation as soon as this cache can reach it.
+        """
+        tags = list(tags)
+        self.fallback.invalidate_tags(tags)
+        self._record_invalidation(tags)
+        # L1 tag membership lives in Redis
+        self.local.clear()
+        if self.enabled:
+            try:
+                asyncio.get_running_loop().create_task(self.invalidate_tags(*tags))
+                return
+            except RuntimeError:
+                pass
+        self._missed.add("tags", tags)
+    
+    def _record_invalidation(self, tags: Iterable[str]) -> None:
+        """Note a fallback tag invalidation for stores computed before it"""
+        self._generation += 1
+        for tag in tags:
+            self._invalidated[tag] = self._generation
+        if len(self._invalidated) > settings.CACHE_FALLBACK_MAX_ENTRIES:
+            # Forget the tags; stores computed before now are refused instead
+            self._invalidated.clear()
+            self._generation_floor = self._generation
+    
+    def _invalidated_since(self, tags: Iterable[str], generation: int) -> bool:
+        return generation < self._generation_floor or any(
+            self._invalidated.get(tag, 0) > generation for tag in tags
+        )
+    
+    def start_invalidation_listener(self) -> None:
+        """Start following other processes' invalidations"""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+    
+    async def _listen(self) -> None:
+        delay = 1.0
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+                # Invalidations published while unsubscribed were missed
+                self.local.clear()
+                self._subscribed = True
+                delay = 1.0
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message:
+                        self._apply_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Cache invalidation channel lost: %s", e)
+            finally:
+                self._subscribed = False
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+    
+    def _apply_invalidation(self, data: str) -> None:
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        if message.get("origin") == self.instance_id:
+            return
+        if message.get("all"):
+            self.local.clear()
+        elif message.get("pattern"):
+            self.local.delete_matching(message["pattern"])
+        else:
+            self.local.delete(*message.get("keys", ()))
+    
+    def _invalidation(self, **fields: Any) -> str:
+        return json.dumps({"origin": self.instance_id, **fields})
+    
+    def _use_local(self, tier: CacheTier) -> bool:
+        return tier == CacheTier.LOCAL or (tier == CacheTier.BOTH and self._subscribed)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratios and state of both tiers, and the active backend"""
+        return {
+            "backend": self.backend,
+            "failovers": self.failovers,
+            "l1": {
+                **self.local.stats.as_dict(),
+                "size": len(self.local),
+                "coherent": self._subscribed,
+            },
+            "l2": {**self.redis_stats.as_dict(), "enabled": self.enabled},
+            "fallback": {**self.fallback.stats.as_dict(), "size": len(self.fallback)},
+        }
+    
+    async def ping(self) -> bool:
+        """Check that Redis answers"""
+        if not self.enabled:
+            return False
+        
+        try:
+            return bool(await self.redis_client.ping())
+        except Exception as e:
+            self._redis_error("ping", e)
+            return False
+    
+    async def generation(self) -> Tuple[str, int]:
+        """
+        Current invalidation generation
+        
+        Read it before computing a value and pass it as `since` when
+        storing the value.
+        """
+        if not self.enabled:
+            return self.fallback.name, self._generation
+        
+        try:
+            value = await self.redis_client.get(GENERATION_KEY)
+        except Exception as e:
+            self._redis_error("generation", e)
+            # Stores for recently invalidated tags will be refused
+            return "redis", 0
+        return "redis", int(value or 0)
+    
+    @traced("cache.get")
+    async def get(self, key: str, tier: CacheTier = CacheTier.BOTH) -> Optional[Any]:
         """
         Get value from cache
         
         Args:
             key: Cache key
-            
+            tier: Tiers to look in
+        
         Returns:
             Cached value or None
         """
-        if not self.enabled:
+        use_local = self._use_local(tier)
+        if use_local:
+            encoded = self.local.get(key)
+            if encoded is not None:
+                return _decode(encoded)
+        if tier == CacheTier.LOCAL:
             return None
+        if not self.enabled:
+            return _decode(self.fallback.get(key))
         
         try:
-            value = self.redis_client.get(key)
-            if value:
-                logger.debug(f"Cache hit: {key}")
-                return json.loads(value)
-            logger.debug(f"Cache miss: {key}")
-            return None
+            value = await self.redis_client.get(key)
         except Exception as e:
-            logger.error(f"Redis get error: {e}")
+            self._redis_error("get", e)
             return None
+        
+        self._errors = 0
+        if value:
+            logger.debug("Cache hit: %s", key)
+            self.redis_stats.record(True)
+            if use_local:
+                self.local.set(key, value)
+            return _decode(value)
+        logger.debug("Cache miss: %s", key)
+        self.redis_stats.record(False)
+        return None
+    
+    @traced("cache.get_many")
+    async def get_many(self, keys: List[str], tier: CacheTier = CacheTier.BOTH) -> Dict[str, Any]:
+        """
+        Get several values, fetching L1 misses with one MGET
+        
+        Args:
+            keys: Cache keys
+            tier: Tiers to look in
+        
+        Returns:
+            Cached values by key (misses are left out)
+        """
+        found: Dict[str, Any] = {}
+        use_local = self._use_local(tier)
+        if use_local:
+            for key in keys:
+                encoded = self.local.get(key)
+                if encoded is not None:
+                    found[key] = _decode(encoded)
+        missing = [key for key in keys if key not in found]
+        if tier == CacheTier.LOCAL or not missing:
+            return found
+        if not self.enabled:
+            for key in missing:
+                value = self.fallback.get(key)
+                if value is not None:
+                    found[key] = _decode(value)
+            return found
+        
+        try:
+            values = await self.redis_client.mget(missing)
+        except Exception as e:
+            self._redis_error("mget", e)
+            return found
+        
+        self._errors = 0
+        for key, value in zip(missing, values):
+            if value:
+                self.redis_stats.record(True)
+                if use_local:
+                    self.local.set(key, value)
+                found[key] = _decode(value)
+            else:
+                self.redis_stats.record(False)
+        return found
     
-    def set(
+    @traced("cache.set")
+    async def set(
         self,
         key: str,
         value: Any,
-        ttl: int = 300  # 5 minutes default
+        ttl: int = 300,  # 5 minutes default
+        tier: CacheTier = CacheTier.BOTH,
+        tags: Iterable[str] = (),
+        since: Optional[Tuple[str, int]] = None
     ) -> bool:
         """
         Set value in cache
@@ -81,99 +563,624 @@ class RedisCache:
             key: Cache key
             value: Value to cache
             ttl: Time to live in seconds
-            
+            tier: Tiers to store in
+            tags: Tags to register the key under
+            since: Generation the value was computed at (see set_many)
+        
         Returns:
             True if successful
         """
-        if not self.enabled:
+        return await self.set_many({key: value}, ttl, tier, tags, since)
+    
+    @traced("cache.set_many")
+    async def set_many(
+        self,
+        values: Dict[str, Any],
+        ttl: int = 300,
+        tier: CacheTier = CacheTier.BOTH,
+        tags: Iterable[str] = (),
+        since: Optional[Tuple[str, int]] = None
+    ) -> bool:
+        """
+        Set several values in one pipelined round trip
+        
+        Tags are registered and other processes are told to drop their L1
+        copies in the same round trip.
+        
+        Args:
+            values: Values by cache key
+            ttl: Time to live in seconds
+            tier: Tiers to store in
+            tags: Tags to register every key under
+            since: generation() read before the values were computed;
+                nothing is stored if a tag was invalidated after it
+        
+        Returns:
+            True if successful
+        """
+        if not values:
             return False
         
+        encoded = {key: _encode(value) for key, value in values.items()}
+        if since is not None:
+            return await self._set_if_current(encoded, ttl, tier, list(dict.fromkeys(tags)), since)
+        stored = False
+        if self._use_local(tier):
+            for key, value in encoded.items():
+                self.local.set(key, value, min(ttl, settings.CACHE_L1_TTL))
+            stored = True
+        if not self.enabled:
+            if tier != CacheTier.LOCAL:
+                self.fallback.set_many(encoded, ttl)
+                # Redis may still hold older values for these keys
+                self._missed.add("keys", encoded)
+            self.fallback.tag(encoded, tags)
+            return True
+        
         try:
-            serialized = json.dumps(value, default=str)
-            self.redis_client.setex(key, ttl, serialized)
-            logger.debug(f"Cache set: {key} (TTL: {ttl}s)")
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                if tier != CacheTier.LOCAL:
+                    for key, value in encoded.items():
+                        pipe.setex(key, ttl, value)
+                tag_keys = _tag_keys(tags)
+                if tag_keys:
+                    await self.redis_client.register_script(_TAG_REGISTER_LUA)(
+                        keys=tag_keys, args=[ttl, *encoded], client=pipe
+                    )
+                pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation(keys=list(encoded)))
+                await pipe.execute()
+            logger.debug("Cache set: %s (TTL: %ss)", ", ".join(encoded), ttl)
+            self._errors = 0
+            return True
+        except Exception as e:
+            self._redis_error("set", e)
+            return stored and tier == CacheTier.LOCAL
+    
+    async def _set_if_current(
+        self,
+        encoded: Dict[str, bytes],
+        ttl: int,
+        tier: CacheTier,
+        tags: List[str],
+        since: Tuple[str, int]
+    ) -> bool:
+        """set_many for values computed at generation `since`"""
+        backend, generation = since
+        if backend != self.backend:
+            # Failed over or reconnected meanwhile: the generations differ
+            return False
+        use_local = self._use_local(tier)
+        if not self.enabled:
+            if self._invalidated_since(tags, generation):
+                return False
+            if use_local:
+                for key, value in encoded.items():
+                    self.local.set(key, value, min(ttl, settings.CACHE_L1_TTL))
+            if tier != CacheTier.LOCAL:
+                self.fallback.set_many(encoded, ttl)
+                self._missed.add("keys", encoded)
+            self.fallback.tag(encoded, tags)
             return True
+        
+        # L1 goes first: an invalidation landing after the check below
+        # evicts it like any other copy, and a refused store removes it
+        if use_local:
+            for key, value in encoded.items():
+                self.local.set(key, value, min(ttl, settings.CACHE_L1_TTL))
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                await self.redis_client.register_script(_GUARDED_SET_LUA)(
+                    keys=[*encoded, *_tag_keys(tags), *_generation_keys(tags)],
+                    args=[
+                        len(encoded), len(tags), ttl, generation,
+                        int(tier != CacheTier.LOCAL), *encoded.values(),
+                    ],
+                    client=pipe,
+                )
+                pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation(keys=list(encoded)))
+                stored, _ = await pipe.execute()
         except Exception as e:
-            logger.error(f"Redis set error: {e}")
+            self._redis_error("set", e)
+            self.local.delete(*encoded)
+            return False
+        
+        self._errors = 0
+        if not stored:
+            self.local.delete(*encoded)
+            logger.debug("Cache set refused: %s changed while computed", ", ".join(encoded))
             return False
+        logger.debug("Cache set: %s (TTL: %ss)", ", ".join(encoded), ttl)
+        return True
     
-    def delete(self, key: str) -> bool:
+    @traced("cache.delete")
+    async def delete(self, *keys: str) -> bool:
         """
-        Delete key from cache
+        Delete keys from every tier and every process
         
         Args:
-            key: Cache key
-            
+            *keys: Cache keys
+        
         Returns:
             True if deleted
         """
-        if not self.enabled:
+        if not keys:
             return False
         
+        self.local.delete(*keys)
+        if not self.enabled:
+            self.fallback.delete(*keys)
+            self._missed.add("keys", keys)
+            return True
+        
         try:
-            self.redis_client.delete(key)
-            logger.debug(f"Cache deleted: {key}")
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.delete(*keys)
+                pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation(keys=list(keys)))
+                await pipe.execute()
+            logger.debug("Cache deleted: %s", ", ".join(keys))
             return True
         except Exception as e:
-            logger.error(f"Redis delete error: {e}")
+            self._redis_error("delete", e)
             return False
     
-    def delete_pattern(self, pattern: str) -> int:
+    @traced("cache.acquire_lock")
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
         """
-        Delete all keys matching pattern
+        Take a short-lived lock shared by every process (SET NX PX)
+        
+        When Redis is unavailable the lock is granted, so callers degrade
+        to working without coordination instead of stalling.
         
         Args:
-            pattern: Key pattern (e.g., "user:*")
-            
+            name: Lock name
+            ttl: Seconds before the lock expires on its own
+        
         Returns:
-            Number of keys deleted
+            Token for release_lock, or None if another holder has it
+        """
+        token = uuid.uuid4().hex
+        if not self.enabled:
+            return token
+        
+        try:
+            acquired = await self.redis_client.set(
+                f"lock:{name}", token, nx=True, px=int(ttl * 1000)
+            )
+            return token if acquired else None
+        except Exception as e:
+            self._redis_error("lock", e)
+            return token
+    
+    @traced("cache.release_lock")
+    async def release_lock(self, name: str, token: str) -> None:
+        """
+        Release a lock taken with acquire_lock (no-op if it expired meanwhile)
+        
+        Args:
+            name: Lock name
+            token: Token returned by acquire_lock
         """
         if not self.enabled:
+            return
+        
+        try:
+            await self.redis_client.register_script(_LOCK_RELEASE_LUA)(
+                keys=[f"lock:{name}"], args=[token]
+            )
+        except Exception as e:
+            self._redis_error("unlock", e)
+    
+    @traced("cache.incr")
+    async def incr(self, key: str) -> Optional[int]:
+        """
+        Atomically increment an integer counter
+        
+        While the fallback serves, counters are per process.
+        
+        Args:
+            key: Counter key
+        
+        Returns:
+            New value, or None if Redis failed
+        """
+        if not self.enabled:
+            return self.fallback.incr(key)
+        
+        try:
+            return await self.redis_client.incr(key)
+        except Exception as e:
+            self._redis_error("incr", e)
+            return None
+    
+    @traced("cache.invalidate_tags")
+    async def invalidate_tags(self, *tags: str) -> int:
+        """
+        Delete every entry registered under any of the tags
+        
+        Args:
+            *tags: Tags (e.g., "user:42")
+        
+        Returns:
+            Number of keys deleted
+        """
+        if not tags:
             return 0
+        if not self.enabled:
+            keys = self.fallback.invalidate_tags(tags)
+            self._record_invalidation(tags)
+            self.local.delete(*keys)
+            self._missed.add("tags", tags)
+            return len(keys)
         
         try:
-            keys = self.redis_client.keys(pattern)
+            script = self.redis_client.register_script(_TAG_INVALIDATE_LUA)
+            members = await script(
+                keys=_invalidation_keys(tags), args=[settings.CACHE_INVALIDATION_GRACE]
+            )
+            keys = list(dict.fromkeys(member.decode() for member in members))
             if keys:
-                count = self.redis_client.delete(*keys)
-                logger.debug(f"Cache deleted pattern {pattern}: {count} keys")
-                return count
+                self.local.delete(*keys)
+                await self.redis_client.publish(
+                    settings.CACHE_INVALIDATION_CHANNEL, self._invalidation(keys=keys)
+                )
+            logger.debug("Cache invalidated tags %s: %d keys", ", ".join(tags), len(keys))
+            return len(keys)
+        except Exception as e:
+            self._redis_error("tag invalidation", e)
             return 0
+    
+    @traced("cache.delete_pattern")
+    async def delete_pattern(self, pattern: str) -> int:
+        """
+        Delete all keys matching pattern
+        
+        Meant for ad-hoc admin purges: keys are found with incremental SCAN
+        and then removed with UNLINK in batches, so Redis keeps serving other
+        clients meanwhile. Application code should invalidate by tag.
+        
+        Args:
+            pattern: Key pattern (e.g., "user:*")
+        
+        Returns:
+            Number of keys deleted
+        """
+        self.local.delete_matching(pattern)
+        if not self.enabled:
+            self._missed.add("patterns", [pattern])
+            return self.fallback.delete_matching(pattern)
+        
+        try:
+            await self.redis_client.publish(
+                settings.CACHE_INVALIDATION_CHANNEL, self._invalidation(pattern=pattern)
+            )
+            batch_size = settings.CACHE_SCAN_BATCH_SIZE
+            keys = [
+                key async for key in
+                self.redis_client.scan_iter(match=pattern, count=batch_size)
+            ]
+            count = 0
+            for i in range(0, len(keys), batch_size):
+                count += await self.redis_client.unlink(*keys[i:i + batch_size])
+            logger.debug("Cache deleted pattern %s: %d keys", pattern, count)
+            return count
         except Exception as e:
-            logger.error(f"Redis delete pattern error: {e}")
+            self._redis_error("delete pattern", e)
             return 0
     
-    def clear_all(self) -> bool:
+    async def clear_all(self) -> bool:
         """Clear all cache"""
+        self.local.clear()
+        self.fallback.clear()
         if not self.enabled:
-            return False
+            self._missed.everything = True
+            return True
         
         try:
-            self.redis_client.flushdb()
+            await self.redis_client.flushdb()
+            await self.redis_client.publish(
+                settings.CACHE_INVALIDATION_CHANNEL, self._invalidation(all=True)
+            )
             logger.info("Cache cleared")
             return True
         except Exception as e:
-            logger.error(f"Redis clear error: {e}")
+            self._redis_error("clear", e)
             return False
 
 
-# Global cache instance
+class SyncRedisCache:
+    """
+    Blocking facade over a separate synchronous pool
+    
+    For scripts (init_db.py, seed_users.py) and for code that runs in
+    worker threads or outside an event loop. Same options and error
+    handling as RedisCache; only the commands those callers need.
+    """
+    
+    def __init__(self):
+        self.pool: Optional[redis.ConnectionPool] = None
+        self.redis_client: Optional[redis.Redis] = None
+        self.enabled = False
+        self.instance_id = uuid.uuid4().hex
+    
+    def connect(self):
+        """Connect to Redis server"""
+        try:
+            redis_url = getattr(settings, 'REDIS_URL', 'redis://localhost:6379/0')
+            self.pool = redis.ConnectionPool.from_url(redis_url, **_pool_options())
+            self.redis_client = redis.Redis(connection_pool=self.pool)
+            self.redis_client.ping()
+            self.enabled = True
+        except Exception as e:
+            logger.warning("Redis (sync) not available: %s. Continuing without cache.", e)
+            self.enabled = False
+    
+    def disconnect(self):
+        """Close pooled connections"""
+        if self.redis_client:
+            self.redis_client.close()
+            self.pool.disconnect()
+            self.enabled = False
+    
+    @traced("cache.get")
+    def get(self, key: str) -> Optional[Any]:
+        """Get value from cache (None on miss or error)"""
+        if not self.enabled:
+            return None
+        
+        try:
+            return _decode(self.redis_client.get(key))
+        except Exception as e:
+            logger.error("Redis get error: %s", e)
+            return None
+    
+    @traced("cache.set")
+    def set(self, key: str, value: Any, ttl: int = 300) -> bool:
+        """Set value in cache"""
+        if not self.enabled:
+            return False
+        
+        try:
+            self.redis_client.setex(key, ttl, _encode(value))
+            return True
+        except Exception as e:
+            logger.error("Redis set error: %s", e)
+            return False
+    
+    @traced("cache.delete")
+    def delete(self, *keys: str) -> bool:
+        """Delete keys from cache"""
+        if not self.enabled or not keys:
+            return False
+        
+        try:
+            self.redis_client.delete(*keys)
+            return True
+        except Exception as e:
+            logger.error("Redis delete error: %s", e)
+            return False
+    
+    @traced("cache.invalidate_tags")
+    def invalidate_tags(self, *tags: str) -> Optional[List[str]]:
+        """
+        Delete every entry registered under the tags and tell all processes
+        
+        Returns:
+            Deleted keys, or None if Redis is unavailable
+        """
+        if not self.enabled:
+            return None
+        
+        try:
+            script = self.redis_client.register_script(_TAG_INVALIDATE_LUA)
+            members = script(
+                keys=_invalidation_keys(tags), args=[settings.CACHE_INVALIDATION_GRACE]
+            )
+            keys = list(dict.fromkeys(member.decode() for member in members))
+            if keys:
+                self.redis_client.publish(
+                    settings.CACHE_INVALIDATION_CHANNEL,
+                    json.dumps({"origin": self.instance_id, "keys": keys})
+                )
+            return keys
+        except Exception as e:
+            logger.error("Redis tag invalidation error: %s", e)
+            return None
+    
+    @traced("cache.incr")
+    def incr(self, key: str) -> Optional[int]:
+        """Atomically increment an integer counter (None if unavailable)"""
+        if not self.enabled:
+            return None
+        
+        try:
+            return self.redis_client.incr(key)
+        except Exception as e:
+            logger.error("Redis incr error: %s", e)
+            return None
+
+
+# Global cache instances
 cache = RedisCache()
+sync_cache = SyncRedisCache()
+
+
+# Marks values written by @cached, which carry their own freshness
+_ENVELOPE = "__cached__"
+
+# Loads running in this process, by cache key
+_flights: Dict[str, asyncio.Future] = {}
+
+# Background refreshes (referenced so they are not garbage collected)
+_refreshes: set = set()
+
+
+def _unwrap(entry: Any) -> Optional[Dict[str, Any]]:
+    return entry if isinstance(entry, dict) and entry.get(_ENVELOPE) else None
+
+
+def _own_sessions(args: tuple, kwargs: dict) -> Tuple[tuple, dict, List[Session]]:
+    """
+    Swap database sessions in a call's arguments for new ones on the same engine
+    
+    A load may outlive the request that started it (it is shared with other
+    callers, or refreshes an entry in the background), so it must not use
+    the request's session, which is closed once the response is sent.
+    """
+    opened: List[Session] = []
+    
+    def swap(value):
+        if isinstance(value, Session):
+            session = Session(bind=value.get_bind())
+            opened.append(session)
+            return session
+        return value
+    
+    return (
+        tuple(swap(arg) for arg in args),
+        {name: swap(value) for name, value in kwargs.items()},
+        opened,
+    )
+
+
+def _refresh_early(entry: Dict[str, Any], beta: float) -> bool:
+    """
+    Probabilistic early expiration (XFetch)
+    
+    The closer an entry is to expiring and the longer it took to compute,
+    the likelier one reader recomputes it ahead of time, so a hot key is
+    refreshed by one caller instead of missed by all of them at once.
+    """
+    gap = entry["delta"] * beta * -math.log(1.0 - random.random())
+    return time.time() + gap >= entry["expires"]
 
 
 def cached(
     ttl: int = 300,
     key_prefix: str = "",
-    key_builder: Optional[Callable] = None
+    key_builder: Optional[Callable] = None,
+    tier: CacheTier = CacheTier.BOTH,
+    tags: Optional[Callable[..., Iterable[str]]] = None,
+    result_tags: Optional[Callable[[Any], Iterable[str]]] = None,
+    stale_ttl: int = 0,
+    negative_ttl: int = 0,
+    beta: Optional[float] = None
 ):
     """
     Decorator for caching function results
     
+    Concurrent misses for one key run the function once: callers in this
+    process share one load, and other processes wait briefly on a Redis
+    lock for its result (CACHE_LOCK_TTL, CACHE_LOCK_WAIT). Entries may be
+    refreshed early (XFetch), and for `stale_ttl` seconds after expiring
+    they are still served while one background task refreshes them.
+    
+    A result is only stored if none of its tags was invalidated while it
+    was computed (see RedisCache.generation), so a write that commits
+    during a load is never hidden behind the rows the load read before it.
+    
+    Loads get their own database sessions in place of any `Session`
+    argument, and plain (sync) functions run in a worker thread, so a load
+    never blocks the event loop or touches a finished request's session.
+    Other arguments are kept, so they should be plain values, not ORM
+    objects tied to the caller's session.
+    
     Args:
         ttl: Time to live in seconds
         key_prefix: Prefix for cache key
         key_builder: Custom function to build cache key
+        tier: LOCAL (per process), REDIS (shared) or BOTH
+        tags: Function building the entry's tags from the call's arguments
+        result_tags: Function building more tags from the result
+        stale_ttl: Seconds an expired value may be served while refreshing
+        negative_ttl: Seconds to cache a None result (0 = never)
+        beta: Early refresh eagerness (0 = off; default CACHE_XFETCH_BETA)
     """
+    beta = settings.CACHE_XFETCH_BETA if beta is None else beta
+    
     def decorator(func):
+        def call_sync(args, kwargs):
+            args, kwargs, sessions = _own_sessions(args, kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                for session in sessions:
+                    session.close()
+        
+        async def compute(*args, **kwargs):
+            if not asyncio.iscoroutinefunction(func):
+                return await asyncio.to_thread(call_sync, args, kwargs)
+            args, kwargs, sessions = _own_sessions(args, kwargs)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                for session in sessions:
+                    session.close()
+        
+        async def store(cache_key, args, kwargs):
+            since = await cache.generation()
+            started = time.monotonic()
+            result = await compute(*args, **kwargs)
+            delta = time.monotonic() - started
+            
+            if result is None and not negative_ttl:
+                return result
+            if delta >= settings.CACHE_INVALIDATION_GRACE:
+                # Invalidations that old are forgotten: the result cannot be checked
+                return result
+            fresh_for = negative_ttl if result is None else ttl
+            entry = {
+                _ENVELOPE: 1,
+                "value": result,
+                "delta": round(delta, 4),
+                "expires": time.time() + fresh_for,
+            }
+            entry_tags = list(tags(*args, **kwargs)) if tags else []
+            if result_tags and result is not None:
+                entry_tags.extend(result_tags(result))
+            await cache.set(
+                cache_key, entry, fresh_for + (stale_ttl if result is not None else 0), tier,
+                entry_tags, since=since
+            )
+            return result
+        
+        async def load(cache_key, args, kwargs):
+            token = await cache.acquire_lock(cache_key, settings.CACHE_LOCK_TTL)
+            if token is None:
+                # Another process is computing it: wait for its result
+                deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)
+                    entry = _unwrap(await cache.get(cache_key, tier))
+                    if entry and entry["expires"] > time.time():
+                        return entry["value"]
+                return await store(cache_key, args, kwargs)
+            try:
+                return await store(cache_key, args, kwargs)
+            finally:
+                await cache.release_lock(cache_key, token)
+        
+        def single_flight(cache_key, args, kwargs) -> asyncio.Future:
+            flight = _flights.get(cache_key)
+            if flight is None or flight.get_loop() is not asyncio.get_running_loop():
+                flight = asyncio.ensure_future(load(cache_key, args, kwargs))
+                _flights[cache_key] = flight
+                flight.add_done_callback(
+                    lambda done: _flights.pop(cache_key, None) if _flights.get(cache_key) is done else None
+                )
+            return flight
+        
+        def refresh_in_background(cache_key, args, kwargs):
+            if cache_key in _flights:
+                return
+            task = single_flight(cache_key, args, kwargs)
+            _refreshes.add(task)
+            
+            def finished(done):
+                _refreshes.discard(done)
+                if not done.cancelled() and done.exception():
+                    logger.error("Background refresh of %s failed: %s", cache_key, done.exception())
+            task.add_done_callback(finished)
+        
         @wraps(func)
         async def wrapper(*args, **kwargs):
             # Build cache key
@@ -186,17 +1193,17 @@ def cached(
                 cache_key = f"{key_prefix}{func.__name__}:{arg_str}:{kwarg_str}"
             
             # Try to get from cache
-            cached_result = cache.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-            
-            # Execute function
-            result = await func(*args, **kwargs) if asyncio.iscoroutinefunction(func) else func(*args, **kwargs)
-            
-            # Store in cache
-            cache.set(cache_key, result, ttl)
+            entry = _unwrap(await cache.get(cache_key, tier))
+            if entry is not None:
+                if entry["expires"] <= time.time():
+                    # Stale: serve it and refresh behind the caller
+                    refresh_in_background(cache_key, args, kwargs)
+                elif beta and _refresh_early(entry, beta):
+                    refresh_in_background(cache_key, args, kwargs)
+                return entry["value"]
             
-            return result
+            # Miss: one load per key, shared by concurrent callers
+            return await asyncio.shield(single_flight(cache_key, args, kwargs))
         
         return wrapper
     return decorator
@@ -216,3 +1223,24 @@ def access_history_cache_key(user_id: str, limit: int = 100) -> str:
 def user_cache_key(user_id: str) -> str:
     """Build cache key for user"""
     return f"user:{user_id}"
+
+
+# Cache tags
+def user_cache_tag(user_id: str) -> str:
+    """Tag for entries showing a user's profile data"""
+    return f"user:{user_id}"
+
+
+def device_cache_tag(device_id: str) -> str:
+    """Tag for entries showing a device"""
+    return f"device:{device_id}"
+
+
+def user_devices_cache_tag(user_id: str) -> str:
+    """Tag for a user's device list (changes when a device is added)"""
+    return f"devices:user:{user_id}"
+
+
+def access_history_cache_tag(scope: str) -> str:
+    """Tag for access history pages of a user, or of everyone ("all")"""
+    return f"access:user:{scope}"
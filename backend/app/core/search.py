@@ -0,0 +1,163 @@
+"""
+Text search and keyset pagination helpers
+
+PostgreSQL matches substrings with ILIKE, which is served by the pg_trgm GIN
+indexes created in migration 008. SQLite (used by the test suite) has no
+pg_trgm, so each searchable table gets an FTS5 shadow table with the trigram
+tokenizer, kept in sync by triggers.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import DDL, Table, and_, event, or_, text
+from sqlalchemy.orm import Query, Session
+
+from app.core.exceptions import ValidationException
+
+# FTS5 trigram queries need at least three characters per term
+FTS5_MIN_TERM_LENGTH = 3
+
+
+def register_fts5_index(table: Table, fts_name: str, columns: List[str]) -> None:
+    """
+    Attach an FTS5 trigram index to a table when it is created on SQLite
+
+    Args:
+        table: Base table to index
+        fts_name: Name of the FTS5 virtual table
+        columns: Text columns to index
+    """
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"new.{c}" for c in columns)
+    old_cols = ", ".join(f"old.{c}" for c in columns)
+    name = table.name
+
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_name} USING fts5("
+        f"{cols}, content='{name}', content_rowid='rowid', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_name}_ai AFTER INSERT ON {name} BEGIN "
+        f"INSERT INTO {fts_name}(rowid, {cols}) VALUES (new.rowid, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_name}_ad AFTER DELETE ON {name} BEGIN "
+        f"INSERT INTO {fts_name}({fts_name}, rowid, {cols}) "
+        f"VALUES ('delete', old.rowid, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_name}_au AFTER UPDATE ON {name} BEGIN "
+        f"INSERT INTO {fts_name}({fts_name}, rowid, {cols}) "
+        f"VALUES ('delete', old.rowid, {old_cols}); "
+        f"INSERT INTO {fts_name}(rowid, {cols}) VALUES (new.rowid, {new_cols}); END",
+    ]
+
+    for statement in statements:
+        event.listen(table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+    event.listen(
+        table,
+        "before_drop",
+        DDL(f"DROP TABLE IF EXISTS {fts_name}").execute_if(dialect="sqlite"),
+    )
+
+
+def search_term(q: str) -> str:
+    """
+    Normalize a search query
+
+    Raises:
+        ValidationException: If nothing is left after stripping whitespace
+            (an empty term would match every row)
+    """
+    term = q.strip()
+    if not term:
+        raise ValidationException("Search query must not be blank")
+    return term
+
+
+def _escape_like(term: str) -> str:
+    """Escape LIKE wildcards so the term is matched literally"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def text_match_clause(db: Session, table: Table, fts_name: str, columns: List, term: str):
+    """
+    Build a WHERE clause matching `term` as a substring of any of `columns`
+
+    Args:
+        db: Database session (used to pick the dialect)
+        table: Base table being searched
+        fts_name: FTS5 table name used on SQLite
+        columns: Column objects to match
+        term: Search term
+
+    Returns:
+        SQLAlchemy boolean clause
+    """
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "sqlite" and len(term) >= FTS5_MIN_TERM_LENGTH:
+        phrase = '"' + term.replace('"', '""') + '"'
+        return text(
+            f"{table.name}.rowid IN "
+            f"(SELECT rowid FROM {fts_name} WHERE {fts_name} MATCH :search_phrase)"
+        ).bindparams(search_phrase=phrase)
+
+    pattern = f"%{_escape_like(term)}%"
+    return or_(*[column.ilike(pattern, escape="\\") for column in columns])
+
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    """Encode the keyset position of the last returned row"""
+    raw = json.dumps([created_at.isoformat(), str(row_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    Decode a cursor produced by `encode_cursor`
+
+    Raises:
+        ValidationException: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except (ValueError, TypeError):
+        raise ValidationException("Invalid cursor")
+
+
+def keyset_page(query: Query, model, limit: int, cursor: Optional[str] = None):
+    """
+    Apply newest-first keyset pagination on (created_at, id)
+
+    Args:
+        query: Filtered query over `model`
+        model: Mapped class with `created_at` and `id` columns
+        limit: Page size
+        cursor: Cursor from the previous page
+
+    Returns:
+        Tuple of (rows, next_cursor)
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                model.created_at < created_at,
+                and_(model.created_at == created_at, model.id < row_id),
+            )
+        )
+
+    rows = (
+        query.order_by(model.created_at.desc(), model.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return rows, next_cursor
@@ -0,0 +1,78 @@
+"""
+Fast JSON encoding and compression shared by outbound payloads
+"""
+import json
+import zlib
+from typing import Any, Tuple
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    Serialize an object to compact JSON bytes
+
+    Uses orjson when installed; otherwise the stdlib encoder with the same
+    compact separators, so the output shape does not depend on the backend.
+
+    Args:
+        obj: JSON-serializable object (UUIDs and datetimes are allowed)
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), default=str, ensure_ascii=False).encode()
+
+
+def loads(data: bytes) -> Any:
+    """Parse JSON bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """
+    Compress bytes with zstd when installed, otherwise zlib
+
+    Returns:
+        Encoding name ("zstd" or "zlib") and compressed bytes
+    """
+    if ZSTD_AVAILABLE:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(encoding: str, data: bytes) -> bytes:
+    """
+    Reverse `compress`
+
+    Args:
+        encoding: Encoding name returned by `compress`
+        data: Compressed bytes
+
+    Returns:
+        Original bytes
+    """
+    if encoding == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("zstandard package is required to read zstd data")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if encoding == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown encoding: {encoding}")
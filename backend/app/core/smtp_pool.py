@@ -0,0 +1,128 @@
+"""
+Pool of persistent SMTP connections
+"""
+import logging
+import queue
+import smtplib
+import threading
+import time
+from email.message import Message
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def is_permanent_smtp_error(error: Exception) -> bool:
+    """Whether retrying the same message cannot succeed (5xx answers)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+class SMTPConnectionPool:
+    """
+    Reuses logged-in SMTP connections across messages
+
+    Connecting, STARTTLS and AUTH happen once per connection instead of once
+    per message. At most `max_connections` connections exist; idle ones are
+    dropped after `idle_timeout` seconds because servers close them anyway.
+    A reused connection that turns out to be closed is replaced once
+    transparently. `send` blocks, so async callers run it in a thread.
+    """
+
+    def __init__(self, max_connections: Optional[int] = None, idle_timeout: Optional[float] = None):
+        self.max_connections = max_connections or settings.SMTP_POOL_SIZE
+        self.idle_timeout = idle_timeout if idle_timeout is not None else settings.SMTP_IDLE_TIMEOUT
+        self._idle: "queue.LifoQueue[Tuple[smtplib.SMTP, float]]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+        try:
+            if settings.SMTP_STARTTLS:
+                server.starttls()
+            if settings.SMTP_USER and settings.SMTP_PASSWORD:
+                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        except Exception:
+            self._discard(server)
+            raise
+        logger.debug("SMTP connection opened to %s:%s", settings.SMTP_HOST, settings.SMTP_PORT)
+        return server
+
+    def _checkout(self) -> Tuple[smtplib.SMTP, bool]:
+        """Return an idle connection (reused=True) or a new one"""
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect(), False
+            if time.monotonic() - last_used > self.idle_timeout:
+                self._discard(server)
+                continue
+            return server, True
+
+    def _checkin(self, server: smtplib.SMTP) -> None:
+        self._idle.put((server, time.monotonic()))
+
+    def _reset_or_discard(self, server: smtplib.SMTP) -> None:
+        try:
+            server.rset()
+        except Exception:
+            self._discard(server)
+        else:
+            self._checkin(server)
+
+    @staticmethod
+    def _discard(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def send(self, message: Message) -> None:
+        """
+        Send a message over a pooled connection
+
+        Args:
+            message: Message with From/To headers set
+
+        Raises:
+            smtplib.SMTPException or OSError when delivery fails
+        """
+        with self._slots:
+            while True:
+                server, reused = self._checkout()
+                try:
+                    server.send_message(message)
+                except smtplib.SMTPServerDisconnected:
+                    self._discard(server)
+                    if reused:
+                        # Server dropped the idle connection; try a fresh one
+                        continue
+                    raise
+                except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                    # The server answered, so the connection is still usable
+                    self._reset_or_discard(server)
+                    raise
+                except Exception:
+                    self._discard(server)
+                    raise
+                self._checkin(server)
+                return
+
+    def close(self) -> None:
+        """Close every idle connection"""
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(server)
+
+
+# Global pool instance
+smtp_pool = SMTPConnectionPool()
@@ -0,0 +1,506 @@
+"""
+Lightweight request tracing
+
+A trace starts where work enters the process (an HTTP request, an outbox
+entry picked up by the dispatcher) and collects spans for what runs on its
+behalf: authentication, service methods, SQL statements, cache calls and
+outbound webhooks. The current span lives in a context variable, so spans
+nest across awaits, tasks and worker threads without being passed around.
+
+Context travels between processes as a W3C `traceparent` header: incoming
+requests continue the caller's trace, webhook deliveries carry it to the
+receiver, and outbox rows store it so the dispatcher's work joins the trace
+of the request that produced the event.
+
+Sampling is decided once per trace (TRACE_SAMPLE_RATE, or the caller's
+decision when a traceparent arrives). Spans of unsampled traces are never
+built; with TRACE_EXPORTER=none no trace is started at all. Finished spans
+are queued and exported in batches by a background thread, to a JSON lines
+file or to an OTLP/HTTP collector.
+"""
+import atexit
+import functools
+import inspect
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.query_tracker import statement_shape
+from app.core.serialization import dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+
+# OTLP SpanKind values
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+
+_SQL_SPAN = "tracing_span"
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+_processor: Optional["BatchSpanProcessor"] = None
+
+
+def _new_id(length: int) -> str:
+    return os.urandom(length // 2).hex()
+
+
+@dataclass
+class Span:
+    """One timed operation of a trace"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    kind: str = "internal"
+    sampled: bool = True
+    start_time: int = field(default_factory=time.time_ns)  # unix nanoseconds
+    end_time: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "unset"  # unset, ok or error
+    status_message: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent header value naming this span as the parent"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    def update_name(self, name: str) -> None:
+        if self.sampled:
+            self.name = name
+
+    def set_error(self, message: Optional[str] = None) -> None:
+        if self.sampled:
+            self.status = "error"
+            self.status_message = message
+
+    def record_exception(self, error: BaseException) -> None:
+        self.set_attribute("exception.type", type(error).__name__)
+        self.set_error(str(error)[:500])
+
+    def end(self) -> None:
+        """Stop the clock and hand a sampled span to the exporter"""
+        if self.end_time is None:
+            self.end_time = time.time_ns()
+            if self.sampled and _processor is not None:
+                _processor.submit(self)
+
+
+# Stand-in yielded where no span is recorded; its setters do nothing
+NON_RECORDING_SPAN = Span("", _INVALID_TRACE_ID, _INVALID_SPAN_ID, sampled=False)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """
+    Read a W3C traceparent header
+
+    Returns:
+        Trace id, parent span id and the sampled flag, or None if malformed
+    """
+    match = _TRACEPARENT.match(value.strip().lower()) if value else None
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == _INVALID_TRACE_ID or parent_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+def current_span() -> Optional[Span]:
+    """Innermost span of the running trace, if any"""
+    return _current.get()
+
+
+def current_traceparent() -> Optional[str]:
+    """traceparent of the running trace (also for unsampled traces), if any"""
+    span = _current.get()
+    return span.traceparent if span is not None else None
+
+
+def inject(headers: Dict[str, str]) -> Dict[str, str]:
+    """Add the running trace's traceparent to outgoing headers"""
+    traceparent = current_traceparent()
+    if traceparent is not None:
+        headers[TRACEPARENT_HEADER] = traceparent
+    return headers
+
+
+@contextmanager
+def _activate(span: Span) -> Iterator[Span]:
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+
+
+@contextmanager
+def start_trace(
+    name: str,
+    traceparent: Optional[str] = None,
+    kind: str = "server",
+    **attributes: Any
+) -> Iterator[Span]:
+    """
+    Start the root span of a unit of work
+
+    Continues the trace named by `traceparent` (keeping its sampling
+    decision) or starts a new one sampled at TRACE_SAMPLE_RATE. Unsampled
+    traces still carry their ids, so they propagate to webhooks unchanged.
+
+    Args:
+        name: Span name
+        traceparent: Context received from the caller (header or outbox row)
+        kind: OTLP span kind
+        **attributes: Initial span attributes
+
+    Yields:
+        The root span (NON_RECORDING_SPAN while tracing is off)
+    """
+    if _processor is None:
+        yield NON_RECORDING_SPAN
+        return
+
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id = _new_id(32), None
+        sampled = random.random() < settings.TRACE_SAMPLE_RATE
+
+    span = Span(
+        name, trace_id, _new_id(16), parent_id,
+        kind=kind, sampled=sampled, attributes=attributes if sampled else {},
+    )
+    with _activate(span):
+        yield span
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes: Any) -> Iterator[Span]:
+    """
+    Record a child span of the running trace
+
+    Outside a sampled trace nothing is recorded and NON_RECORDING_SPAN is
+    yielded, so call sites need no checks of their own.
+    """
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        yield NON_RECORDING_SPAN
+        return
+
+    child = Span(name, parent.trace_id, _new_id(16), parent.span_id, kind=kind, attributes=attributes)
+    with _activate(child):
+        yield child
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """
+    Decorator recording a span around each call of a function
+
+    Args:
+        name: Span name (defaults to the function's qualified name)
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return await func(*args, **kwargs)
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_methods(cls: type) -> type:
+    """
+    Class decorator recording a span around each public static method
+
+    Spans are named `<Class>.<method>`; private helpers are left alone.
+    """
+    for attr, value in list(vars(cls).items()):
+        if isinstance(value, staticmethod) and not attr.startswith("_"):
+            setattr(cls, attr, staticmethod(traced(f"{cls.__name__}.{attr}")(value.__func__)))
+    return cls
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class FileSpanExporter:
+    """Appends finished spans to a file, one JSON object per line"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.TRACE_FILE
+
+    def export(self, spans: List[Span]) -> None:
+        lines = b"".join(
+            dumps_bytes({
+                "trace_id": span.trace_id,
+                "span_id": span.span_id,
+                "parent_id": span.parent_id,
+                "name": span.name,
+                "kind": span.kind,
+                "service": settings.TRACE_SERVICE_NAME,
+                "start_time_unix_nano": span.start_time,
+                "end_time_unix_nano": span.end_time,
+                "duration_ms": round((span.end_time - span.start_time) / 1e6, 3),
+                "status": span.status,
+                "status_message": span.status_message,
+                "attributes": span.attributes,
+            }) + b"\n"
+            for span in spans
+        )
+        # One append per batch keeps lines from several workers whole
+        with open(self.path, "ab") as trace_file:
+            trace_file.write(lines)
+
+    def shutdown(self) -> None:
+        pass
+
+
+class OTLPSpanExporter:
+    """Posts finished spans to an OTLP/HTTP collector as JSON (/v1/traces)"""
+
+    def __init__(self, endpoint: Optional[str] = None, client: Optional[httpx.Client] = None):
+        self.endpoint = endpoint or settings.TRACE_OTLP_ENDPOINT
+        self._client = client or httpx.Client(timeout=5.0)
+
+    def encode(self, spans: List[Span]) -> Dict[str, Any]:
+        """OTLP ExportTraceServiceRequest in its JSON mapping"""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": _otlp_value(settings.TRACE_SERVICE_NAME)},
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [
+                        {
+                            "traceId": span.trace_id,
+                            "spanId": span.span_id,
+                            **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                            "name": span.name,
+                            "kind": SPAN_KINDS.get(span.kind, 1),
+                            "startTimeUnixNano": str(span.start_time),
+                            "endTimeUnixNano": str(span.end_time),
+                            "attributes": [
+                                {"key": key, "value": _otlp_value(value)}
+                                for key, value in span.attributes.items()
+                            ],
+                            "status": {
+                                "code": {"unset": 0, "ok": 1, "error": 2}[span.status],
+                                **({"message": span.status_message} if span.status_message else {}),
+                            },
+                        }
+                        for span in spans
+                    ],
+                }],
+            }],
+        }
+
+    def export(self, spans: List[Span]) -> None:
+        response = self._client.post(
+            self.endpoint,
+            content=dumps_bytes(self.encode(spans)),
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+
+    def shutdown(self) -> None:
+        self._client.close()
+
+
+class BatchSpanProcessor:
+    """
+    Exports finished spans from a background thread
+
+    Spans wait in a bounded queue until TRACE_EXPORT_BATCH_SIZE of them are
+    collected or the oldest has waited TRACE_EXPORT_INTERVAL seconds. When
+    the exporter falls behind and the queue is full, new spans are dropped
+    instead of slowing requests down.
+    """
+
+    def __init__(
+        self,
+        exporter,
+        max_queue: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        interval: Optional[float] = None,
+    ):
+        self.exporter = exporter
+        self.batch_size = batch_size or settings.TRACE_EXPORT_BATCH_SIZE
+        self.interval = interval if interval is not None else settings.TRACE_EXPORT_INTERVAL
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(max_queue or settings.TRACE_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self) -> None:
+        """Wait until every span submitted so far is exported"""
+        self._queue.join()
+
+    def shutdown(self) -> None:
+        """Export what is queued and stop the thread"""
+        self._queue.put(None)
+        self._thread.join()
+        self.exporter.shutdown()
+
+    def _run(self) -> None:
+        stopping = False
+        while True:
+            batch: List[Span] = []
+            taken = 0
+            deadline = None
+            while len(batch) < self.batch_size:
+                try:
+                    if stopping:
+                        item = self._queue.get_nowait()
+                    elif deadline is None:
+                        item = self._queue.get()
+                        deadline = time.monotonic() + self.interval
+                    else:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+            self._export(batch)
+            for _ in range(taken):
+                self._queue.task_done()
+            if stopping and len(batch) < self.batch_size:
+                return
+
+    def _export(self, batch: List[Span]) -> None:
+        if not batch:
+            return
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logger.warning("Dropped %d spans: export failed: %s", len(batch), e)
+
+
+def setup_tracing(exporter=None) -> Optional[BatchSpanProcessor]:
+    """
+    Start exporting spans (a no-op while TRACE_EXPORTER is "none")
+
+    Args:
+        exporter: Exporter to use instead of the one TRACE_EXPORTER names
+
+    Returns:
+        The running processor, if tracing is on
+    """
+    global _processor
+
+    # Replace a processor from an earlier call (exporting what it queued)
+    stop_tracing()
+    if exporter is None:
+        if settings.TRACE_EXPORTER == "file":
+            exporter = FileSpanExporter()
+        elif settings.TRACE_EXPORTER == "otlp":
+            exporter = OTLPSpanExporter()
+        elif settings.TRACE_EXPORTER != "none":
+            logger.warning("Unknown TRACE_EXPORTER %r; tracing is off", settings.TRACE_EXPORTER)
+    if exporter is None:
+        return None
+
+    processor = BatchSpanProcessor(exporter)
+    processor.start()
+    _processor = processor
+    logger.info(
+        "Tracing to %s (sample rate %s)", type(exporter).__name__, settings.TRACE_SAMPLE_RATE
+    )
+    return processor
+
+
+def stop_tracing() -> None:
+    """Export queued spans and stop the exporter thread"""
+    global _processor
+    processor, _processor = _processor, None
+    if processor is not None:
+        processor.shutdown()
+
+
+atexit.register(stop_tracing)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_span(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return
+    conn.info[_SQL_SPAN] = Span(
+        "db.query", parent.trace_id, _new_id(16), parent.span_id, kind="client",
+        attributes={"db.system": conn.dialect.name, "db.statement": statement_shape(statement)},
+    )
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_statement_span(conn, cursor, statement, parameters, context, executemany):
+    statement_span = conn.info.pop(_SQL_SPAN, None)
+    if statement_span is not None:
+        statement_span.end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_statement_span(exception_context):
+    conn = exception_context.connection
+    statement_span = conn.info.pop(_SQL_SPAN, None) if conn is not None else None
+    if statement_span is not None:
+        statement_span.record_exception(exception_context.original_exception)
+        statement_span.end()
@@ -1,26 +1,49 @@
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import SQLAlchemyError
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from prometheus_client import CONTENT_TYPE_LATEST
 import time
 import logging
 
 from app.core.config import settings
 from app.core.database import Base, engine
-from app.core.logging import setup_logging, get_logger
+from app.core.logging import (
+    get_logger,
+    log_sampled_var,
+    new_request_id,
+    request_id_var,
+    sample_request,
+    setup_logging,
+)
+from app.core import cache_invalidation, metrics, profiling, query_tracker, tracing
 from app.core.exceptions import ECCIControlException
-from app.core.redis_cache import cache
+from app.core.redis_cache import cache, sync_cache
 from app.api.endpoints import auth, users, devices, access
 from app.api.endpoints import webhooks
+from app.api.endpoints import admin
+from app.core.email_templates import email_templates
+from app.core.http_client import webhook_http_client
+from app.core.smtp_pool import smtp_pool
+from app.services.email_queue import email_queue
+from app.services.notification_service import notification_aggregator
+from app.services.webhook_dispatcher import webhook_dispatcher, webhook_retry_scheduler
+from app.services.webhook_log_writer import webhook_log_writer
 
 # Setup logging
 setup_logging()
 logger = get_logger(__name__)
 
+# Export spans (TRACE_EXPORTER)
+tracing.setup_tracing()
+
+# Track database connections for /metrics
+metrics.instrument_engine(engine)
+
 # Initialize rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
@@ -39,7 +62,7 @@ async def startup_event():
         Base.metadata.create_all(bind=engine)
         logger.info("Database tables created successfully")
     except Exception as e:
-        logger.error(f"Failed to create database tables: {e}")
+        logger.error("Failed to create database tables: %s", e)
 
 # Add rate limiter to app state
 app.state.limiter = limiter
@@ -48,34 +71,77 @@ app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
+    request_id = new_request_id(request.headers.get("X-Request-ID"))
+    request_id_token = request_id_var.set(request_id)
+    sampled_token = log_sampled_var.set(sample_request(request.url.path))
+    start_time = time.perf_counter()
     
     # Log request
-    logger.info(f"Request: {request.method} {request.url.path}")
+    logger.debug("Request: %s %s", request.method, request.url.path)
     
+    metrics.HTTP_REQUESTS_IN_PROGRESS.inc()
     try:
-        response = await call_next(request)
-        
-        # Calculate duration
-        duration = time.time() - start_time
+        with query_tracker.track_queries() as queries, tracing.start_trace(
+            f"{request.method} {request.url.path}",
+            traceparent=request.headers.get(tracing.TRACEPARENT_HEADER),
+            **{"http.method": request.method, "http.target": request.url.path},
+        ) as trace_span:
+            # The response waits for the cache invalidations of its commits
+            async with cache_invalidation.invalidations_settled():
+                if profiling.PROFILE_HEADER in request.headers:
+                    response = await profiling.profile_request(request, call_next)
+                else:
+                    response = await call_next(request)
+            
+            # Calculate duration
+            duration = time.perf_counter() - start_time
+            route = metrics.route_label(request)
+            
+            trace_span.update_name(f"{request.method} {route}")
+            trace_span.set_attribute("http.route", route)
+            trace_span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                trace_span.set_error(f"HTTP {response.status_code}")
         
         # Log response
         logger.info(
-            f"Response: {request.method} {request.url.path} "
-            f"- Status: {response.status_code} - Duration: {duration:.3f}s"
+            "Response: %s %s - Status: %d - Duration: %.3fs - Queries: %d (%.1fms)",
+            request.method, request.url.path, response.status_code, duration,
+            queries.count, queries.duration * 1000,
+            extra={
+                "method": request.method,
+                "path": request.url.path,
+                "route": route,
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 2),
+                "queries": queries.count,
+            },
         )
+        repeats = query_tracker.report_repeats(queries, route)
+        metrics.observe_request(request.method, route, response.status_code, duration)
+        metrics.observe_queries(route, queries.count, queries.duration, len(repeats))
+        if settings.SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = query_tracker.server_timing(queries, duration)
+        response.headers["X-Request-ID"] = request_id
         
         return response
     except Exception as e:
-        logger.error(f"Request failed: {request.method} {request.url.path} - Error: {str(e)}")
+        logger.error("Request failed: %s %s - Error: %s", request.method, request.url.path, e)
+        metrics.observe_request(
+            request.method, metrics.route_label(request), 500, time.perf_counter() - start_time
+        )
         raise
+    finally:
+        metrics.HTTP_REQUESTS_IN_PROGRESS.dec()
+        log_sampled_var.reset(sampled_token)
+        request_id_var.reset(request_id_token)
 
 
 # Exception handlers
 @app.exception_handler(ECCIControlException)
 async def ecci_exception_handler(request: Request, exc: ECCIControlException):
     """Handle custom ECCI Control exceptions"""
-    logger.warning(f"ECCI Exception: {exc.detail}")
+    logger.warning("ECCI Exception: %s", exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
@@ -85,7 +151,7 @@ async def ecci_exception_handler(request: Request, exc: ECCIControlException):
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle validation errors"""
-    logger.warning(f"Validation error: {exc.errors()}")
+    logger.warning("Validation error: %s", exc.errors())
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={"detail": "Validation error", "errors": exc.errors()}
@@ -95,7 +161,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 @app.exception_handler(SQLAlchemyError)
 async def database_exception_handler(request: Request, exc: SQLAlchemyError):
     """Handle database errors"""
-    logger.error(f"Database error: {str(exc)}")
+    logger.error("Database error: %s", exc)
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "Database error occurred"}
@@ -105,7 +171,7 @@ async def database_exception_handler(request: Request, exc: SQLAlchemyError):
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle unexpected exceptions"""
-    logger.error(f"Unexpected error: {str(exc)}", exc_info=True)
+    logger.error("Unexpected error: %s", exc, exc_info=True)
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "An unexpected error occurred"}
@@ -129,6 +195,7 @@ app.include_router(users.router, prefix="/api")
 app.include_router(devices.router, prefix="/api")
 app.include_router(access.router, prefix="/api")
 app.include_router(webhooks.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
 
 
 # Health check endpoint
@@ -158,19 +225,22 @@ async def health_check():
         db.execute("SELECT 1")
         health_status["checks"]["database"] = "ok"
     except Exception as e:
-        logger.error(f"Database health check failed: {e}")
+        logger.error("Database health check failed: %s", e)
         health_status["checks"]["database"] = "failed"
         health_status["status"] = "unhealthy"
     
     # Check Redis cache
     try:
-        if cache.ping():
+        if await cache.ping():
             health_status["checks"]["cache"] = "ok"
+        elif cache.backend == "memory":
+            health_status["checks"]["cache"] = "fallback"
         else:
             health_status["checks"]["cache"] = "failed"
     except Exception as e:
-        logger.warning(f"Cache health check failed: {e}")
+        logger.warning("Cache health check failed: %s", e)
         health_status["checks"]["cache"] = "unavailable"
+    health_status["cache_stats"] = cache.stats()
     
     # Return 503 if unhealthy
     status_code = 200 if health_status["status"] == "healthy" else 503
@@ -181,6 +251,14 @@ async def health_check():
     )
 
 
+# Prometheus metrics endpoint
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        """Metrics in the Prometheus text format (aggregated across workers)"""
+        return Response(content=metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -197,27 +275,75 @@ async def root():
 @app.on_event("startup")
 async def startup_event():
     """Run on application startup"""
-    logger.info(f"Starting {settings.API_TITLE} v{settings.API_VERSION}")
-    logger.info(f"Environment: {settings.ENVIRONMENT}")
-    logger.info(f"Debug mode: {settings.DEBUG}")
+    logger.info("Starting %s v%s", settings.API_TITLE, settings.API_VERSION)
+    logger.info("Environment: %s", settings.ENVIRONMENT)
+    logger.info("Debug mode: %s", settings.DEBUG)
     
-    # Connect to Redis cache
+    # Connect to Redis cache (the sync client serves code running in worker threads)
     try:
-        cache.connect()
+        await cache.connect()
+        sync_cache.connect()
     except Exception as e:
-        logger.warning(f"Redis cache connection failed: {e}")
+        logger.warning("Redis cache connection failed: %s", e)
+    
+    # Start draining the webhook outbox and retrying failed deliveries
+    if settings.WEBHOOK_DISPATCHER_ENABLED:
+        await webhook_log_writer.start()
+        await webhook_dispatcher.start()
+        await webhook_retry_scheduler.start()
+    
+    # Compile email templates before the first request needs them
+    try:
+        email_templates.load()
+    except Exception as e:
+        logger.error("Email template compilation failed: %s", e)
+    
+    # Start sending queued emails
+    if settings.EMAIL_QUEUE_ENABLED:
+        await email_queue.start()
+    
+    # Start collapsing scans into owner notifications
+    if settings.NOTIFICATIONS_ENABLED:
+        await notification_aggregator.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Run on application shutdown"""
-    logger.info(f"Shutting down {settings.API_TITLE}")
+    logger.info("Shutting down %s", settings.API_TITLE)
+    
+    # Stop the webhook workers
+    try:
+        await webhook_dispatcher.stop()
+        await webhook_retry_scheduler.stop()
+        await webhook_log_writer.stop()
+    except Exception as e:
+        logger.error("Webhook dispatcher shutdown error: %s", e)
+    
+    try:
+        await webhook_http_client.close()
+    except Exception as e:
+        logger.error("Webhook HTTP client shutdown error: %s", e)
+    
+    # Stop notifications first so their last emails still reach the queue
+    try:
+        await notification_aggregator.stop()
+    except Exception as e:
+        logger.error("Notification aggregator shutdown error: %s", e)
+    
+    # Send what is due and close SMTP connections
+    try:
+        await email_queue.stop()
+        smtp_pool.close()
+    except Exception as e:
+        logger.error("Email queue shutdown error: %s", e)
     
     # Disconnect from Redis
     try:
-        cache.disconnect()
+        await cache.disconnect()
+        sync_cache.disconnect()
     except Exception as e:
-        logger.error(f"Redis disconnect error: {e}")
+        logger.error("Redis disconnect error: %s", e)
 
 
 if __name__ == "__main__":
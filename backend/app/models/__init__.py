@@ -3,5 +3,14 @@ from .user import User
 from .device import Device
 from .access_record import AccessRecord, AccessType
 from .password_reset_token import PasswordResetToken
+from .notification import AccessNotification, NotificationFrequency
 
-__all__ = ["User", "Device", "AccessRecord", "AccessType", "PasswordResetToken"]
+__all__ = [
+    "User",
+    "Device",
+    "AccessRecord",
+    "AccessType",
+    "PasswordResetToken",
+    "AccessNotification",
+    "NotificationFrequency",
+]
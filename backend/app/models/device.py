@@ -5,6 +5,7 @@ from datetime import datetime, timezone
 import uuid
 
 from app.core.database import Base
+from app.core.search import register_fts5_index
 
 
 class Device(Base):
@@ -27,7 +28,12 @@ class Device(Base):
         Index("ix_devices_user_id", "user_id"),
         Index("ix_devices_serial_number", "serial_number"),
         Index("ix_devices_qr_data", "qr_data"),
+        Index("ix_devices_created_at_id", "created_at", "id"),
     )
 
     def __repr__(self):
         return f"<Device(id={self.id}, user_id={self.user_id}, name={self.name})>"
+
+
+# SQLite fallback for the pg_trgm indexes used by admin device search
+register_fts5_index(Device.__table__, "devices_search", ["serial_number", "brand", "model", "name"])
@@ -0,0 +1,46 @@
+"""
+Owner notifications for device scans
+"""
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, BigInteger
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime, timezone
+import enum
+
+from app.core.database import Base
+
+
+class NotificationFrequency(str, enum.Enum):
+    """How often a user hears about scans of their devices"""
+    IMMEDIATE = "immediate"  # Within one aggregator pass of the scan
+    HOURLY = "hourly"        # One digest per clock hour
+    OFF = "off"
+
+    def __str__(self):
+        return self.value
+
+
+class AccessNotification(Base):
+    """
+    Scan waiting to be reported to the device owner
+
+    Rows are written in the same transaction as the access record and
+    collapsed by the notification aggregator into one email per user once
+    `due_at` has passed. All scans of a user in the same window share the
+    same `due_at`.
+    """
+    __tablename__ = "access_notifications"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    access_record_id = Column(
+        UUID(as_uuid=True), ForeignKey("access_records.id", ondelete="CASCADE"), nullable=False
+    )
+    due_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    __table_args__ = (
+        Index("ix_access_notifications_due_at_user_id", "due_at", "user_id"),
+    )
+
+    def __repr__(self):
+        return f"<AccessNotification(user_id={self.user_id}, access_record_id={self.access_record_id}, due_at={self.due_at})>"
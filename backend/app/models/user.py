@@ -5,6 +5,8 @@ import uuid
 
 from app.core.database import Base
 from app.models.role import UserRole
+from app.models.notification import NotificationFrequency
+from app.core.search import register_fts5_index
 
 
 class User(Base):
@@ -21,13 +23,23 @@ class User(Base):
     biometric_public_key = Column(String(500), nullable=True)  # For biometric auth
     profile_photo = Column(Text, nullable=True)  # Base64 image
     dark_mode = Column(Boolean, default=False, nullable=False)
+    notification_frequency = Column(
+        Enum(NotificationFrequency, native_enum=False, length=20, values_callable=lambda obj: [e.value for e in obj]),
+        default=NotificationFrequency.OFF,
+        nullable=False,
+    )
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
 
     __table_args__ = (
         Index("ix_users_email", "email"),
         Index("ix_users_student_id", "student_id"),
+        Index("ix_users_created_at_id", "created_at", "id"),
     )
 
     def __repr__(self):
         return f"<User(id={self.id}, email={self.email}, student_id={self.student_id})>"
+
+
+# SQLite fallback for the pg_trgm indexes used by admin user search
+register_fts5_index(User.__table__, "users_search", ["full_name", "student_id", "email"])
@@ -1,7 +1,7 @@
 """
 Webhook model for external integrations
 """
-from sqlalchemy import Column, String, DateTime, Boolean, Index, Enum, Integer, Text, ForeignKey, ARRAY
+from sqlalchemy import Column, String, DateTime, Boolean, Index, Enum, Integer, BigInteger, Float, LargeBinary, Text, ForeignKey, ARRAY, text
 from sqlalchemy.dialects.postgresql import JSON, UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -36,6 +36,11 @@ class Webhook(Base):
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
     last_triggered_at = Column(DateTime(timezone=True), nullable=True)
     failure_count = Column(Integer, default=0, nullable=False)
+    # Batched delivery: events are aggregated into one POST per flush
+    batch_enabled = Column(Boolean, default=False, nullable=False)
+    batch_max_events = Column(Integer, default=100, nullable=False)
+    batch_max_bytes = Column(Integer, default=262144, nullable=False)
+    batch_linger_ms = Column(Integer, default=1000, nullable=False)
 
     __table_args__ = (
         Index("ix_webhooks_is_active", "is_active"),
@@ -49,19 +54,167 @@ class WebhookLog(Base):
     __tablename__ = "webhook_logs"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    webhook_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    webhook_id = Column(UUID(as_uuid=True), nullable=False)
     event = Column(String(100), nullable=False)
-    payload = Column(JSON, nullable=False)
+    payload = Column(JSON, nullable=True)  # Inline copy, only on rows written before payload_hash
+    payload_hash = Column(String(64), nullable=True)  # WebhookPayload.hash of the body sent
     response_status = Column(Integer, nullable=True)
     response_body = Column(String(1000), nullable=True)
     success = Column(Boolean, nullable=False)
     error_message = Column(String(500), nullable=True)
+    latency_ms = Column(Float, nullable=True)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
 
     __table_args__ = (
-        Index("ix_webhook_logs_webhook_id", "webhook_id"),
+        # Serves "latest logs of a webhook" without sorting the whole table
+        Index("ix_webhook_logs_webhook_id_created_at", "webhook_id", "created_at"),
         Index("ix_webhook_logs_created_at", "created_at"),
     )
 
     def __repr__(self):
         return f"<WebhookLog(id={self.id}, webhook_id={self.webhook_id}, event={self.event}, success={self.success})>"
+
+
+class WebhookPayload(Base):
+    """
+    Content-addressed, compressed request body shared by webhook logs
+
+    Every subscriber of an event receives the same bytes, so the body is
+    stored once under its SHA-256 and each log row only keeps the hash.
+    `last_used_at` is refreshed whenever a new log references the payload,
+    so retention can drop payloads no live log points to.
+    """
+    __tablename__ = "webhook_payloads"
+
+    hash = Column(String(64), primary_key=True)
+    encoding = Column(String(10), nullable=False)  # "zstd" or "zlib"
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)  # Uncompressed bytes
+    last_used_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    __table_args__ = (
+        Index("ix_webhook_payloads_last_used_at", "last_used_at"),
+    )
+
+    def __repr__(self):
+        return f"<WebhookPayload(hash={self.hash}, size={self.size})>"
+
+
+# Upper bounds (ms) of the latency histogram buckets in WebhookStatsHourly
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class WebhookStatsHourly(Base):
+    """
+    Delivery counts and latency histogram per webhook and hour
+
+    Maintained incrementally as logs are written, so success rates and
+    latency percentiles never need a scan of webhook_logs.
+    """
+    __tablename__ = "webhook_stats_hourly"
+
+    webhook_id = Column(UUID(as_uuid=True), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    deliveries = Column(Integer, default=0, nullable=False)
+    successes = Column(Integer, default=0, nullable=False)
+    latency_total_ms = Column(Float, default=0.0, nullable=False)
+    latency_le_50 = Column(Integer, default=0, nullable=False)
+    latency_le_100 = Column(Integer, default=0, nullable=False)
+    latency_le_250 = Column(Integer, default=0, nullable=False)
+    latency_le_500 = Column(Integer, default=0, nullable=False)
+    latency_le_1000 = Column(Integer, default=0, nullable=False)
+    latency_le_2500 = Column(Integer, default=0, nullable=False)
+    latency_le_5000 = Column(Integer, default=0, nullable=False)
+    latency_le_10000 = Column(Integer, default=0, nullable=False)
+    latency_gt_10000 = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index("ix_webhook_stats_hourly_bucket_start", "bucket_start"),
+    )
+
+    @staticmethod
+    def histogram_columns():
+        """Histogram column names in bucket order (last one is the overflow)"""
+        return [f"latency_le_{bound}" for bound in LATENCY_BUCKETS_MS] + [
+            f"latency_gt_{LATENCY_BUCKETS_MS[-1]}"
+        ]
+
+    def __repr__(self):
+        return f"<WebhookStatsHourly(webhook_id={self.webhook_id}, bucket_start={self.bucket_start})>"
+
+
+class WebhookOutbox(Base):
+    """
+    Transactional outbox for webhook events
+
+    Rows are written in the same transaction as the change that produced the
+    event and drained by the background dispatcher, so delivery never runs on
+    the request path and no committed event is lost.
+    """
+    __tablename__ = "webhook_outbox"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    event = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Dispatcher lease
+    dispatched_at = Column(DateTime(timezone=True), nullable=True)
+    trace_context = Column(String(55), nullable=True)  # traceparent of the request that produced the event
+
+    __table_args__ = (
+        Index(
+            "ix_webhook_outbox_pending",
+            "id",
+            postgresql_where=text("dispatched_at IS NULL"),
+        ),
+        Index("ix_webhook_outbox_dispatched_at", "dispatched_at"),
+    )
+
+    def __repr__(self):
+        return f"<WebhookOutbox(id={self.id}, event={self.event}, dispatched_at={self.dispatched_at})>"
+
+
+class WebhookDelivery(Base):
+    """Retry state for a delivery that has not succeeded yet"""
+    __tablename__ = "webhook_deliveries"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    webhook_id = Column(UUID(as_uuid=True), ForeignKey("webhooks.id", ondelete="CASCADE"), nullable=False)
+    event = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)  # Envelope exactly as first sent
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    last_error = Column(String(500), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    __table_args__ = (
+        Index("ix_webhook_deliveries_next_attempt_at", "next_attempt_at"),
+        Index("ix_webhook_deliveries_webhook_id", "webhook_id"),
+    )
+
+    def __repr__(self):
+        return f"<WebhookDelivery(id={self.id}, webhook_id={self.webhook_id}, attempts={self.attempts})>"
+
+
+class WebhookDeadLetter(Base):
+    """Delivery that exhausted its retries, kept for inspection and replay"""
+    __tablename__ = "webhook_dead_letters"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    webhook_id = Column(UUID(as_uuid=True), ForeignKey("webhooks.id", ondelete="CASCADE"), nullable=False)
+    event = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    last_error = Column(String(500), nullable=True)
+    first_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    dead_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    replayed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_webhook_dead_letters_webhook_id_dead_at", "webhook_id", "dead_at"),
+        Index("ix_webhook_dead_letters_dead_at", "dead_at"),
+    )
+
+    def __repr__(self):
+        return f"<WebhookDeadLetter(id={self.id}, webhook_id={self.webhook_id}, event={self.event})>"
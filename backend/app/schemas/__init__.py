@@ -1,6 +1,6 @@
 # Schemas module
-from .user import UserCreate, UserLogin, UserResponse, TokenResponse, BiometricAuthRequest
-from .device import DeviceCreate, DeviceUpdate, DeviceResponse, DeviceWithQR
+from .user import UserCreate, UserLogin, UserResponse, UserSearchResponse, TokenResponse, BiometricAuthRequest
+from .device import DeviceCreate, DeviceUpdate, DeviceResponse, DeviceWithQR, DeviceSearchResponse
 from .access_record import AccessRecordCreate, AccessRecordResponse
 from .password import PasswordChange, PasswordResetRequest, PasswordReset, ProfileUpdate
 
@@ -8,12 +8,14 @@ __all__ = [
     "UserCreate",
     "UserLogin",
     "UserResponse",
+    "UserSearchResponse",
     "TokenResponse",
     "BiometricAuthRequest",
     "DeviceCreate",
     "DeviceUpdate",
     "DeviceResponse",
     "DeviceWithQR",
+    "DeviceSearchResponse",
     "AccessRecordCreate",
     "AccessRecordResponse",
 ]
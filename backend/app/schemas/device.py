@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
 from uuid import UUID
-from typing import Optional
+from typing import List, Optional
 
 
 class DeviceCreate(BaseModel):
@@ -92,3 +92,9 @@ class DeviceWithQR(BaseModel):
                 "qr_image_base64": "data:image/png;base64,...",
             }
         }
+
+
+class DeviceSearchResponse(BaseModel):
+    """Page of device search results"""
+    items: List[DeviceResponse]
+    next_cursor: Optional[str] = None
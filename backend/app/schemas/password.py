@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field
 from typing import Optional
 
+from app.models.notification import NotificationFrequency
+
 
 class PasswordChange(BaseModel):
     """Request to change password"""
@@ -47,12 +49,14 @@ class ProfileUpdate(BaseModel):
     full_name: Optional[str] = Field(None, min_length=3)
     profile_photo: Optional[str] = None  # base64 or URL
     dark_mode: Optional[bool] = None
+    notification_frequency: Optional[NotificationFrequency] = None
     
     class Config:
         json_schema_extra = {
             "example": {
                 "full_name": "John Doe Updated",
                 "profile_photo": "data:image/png;base64,...",
-                "dark_mode": True
+                "dark_mode": True,
+                "notification_frequency": "hourly"
             }
         }
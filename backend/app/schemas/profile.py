@@ -0,0 +1,40 @@
+"""
+Request profiling schemas for API
+"""
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+
+
+class ProfileTokenRequest(BaseModel):
+    """Schema for requesting a profile token"""
+    ttl_seconds: int = Field(600, ge=10, le=3600)
+
+
+class ProfileTokenResponse(BaseModel):
+    """Token that makes requests carrying it be profiled"""
+    token: str
+    header: str
+    expires_at: datetime
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "token": "eyJhbGciOiJIUzI1NiIs...",
+                "header": "X-Profile-Token",
+                "expires_at": "2026-01-05T14:13:11Z"
+            }
+        }
+
+
+class ProfileInfo(BaseModel):
+    """A stored request profile"""
+    id: str
+    method: str
+    path: str
+    route: Optional[str] = None
+    status: int
+    duration_ms: float
+    admin_id: str
+    created_at: datetime
+    formats: List[str]
@@ -1,8 +1,9 @@
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from uuid import UUID
-from typing import Optional
+from typing import List, Optional
 from app.models.role import UserRole
+from app.models.notification import NotificationFrequency
 
 
 class UserCreate(BaseModel):
@@ -63,6 +64,7 @@ class UserResponse(BaseModel):
     biometric_enabled: bool
     profile_photo: Optional[str] = None
     dark_mode: bool
+    notification_frequency: NotificationFrequency = NotificationFrequency.OFF
     created_at: datetime
     updated_at: datetime
 
@@ -84,6 +86,12 @@ class UserResponse(BaseModel):
         }
 
 
+class UserSearchResponse(BaseModel):
+    """Page of user search results"""
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
+
+
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str
@@ -4,7 +4,7 @@ Webhook schemas for API
 from pydantic import BaseModel, HttpUrl, Field
 from datetime import datetime
 from uuid import UUID
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 
 class WebhookCreate(BaseModel):
@@ -13,6 +13,10 @@ class WebhookCreate(BaseModel):
     url: HttpUrl
     events: List[str] = Field(..., min_items=1)
     secret: Optional[str] = None
+    batch_enabled: bool = False
+    batch_max_events: int = Field(100, ge=1, le=1000)
+    batch_max_bytes: int = Field(262144, ge=1024, le=5242880)
+    batch_linger_ms: int = Field(1000, ge=10, le=30000)
     
     class Config:
         json_schema_extra = {
@@ -20,7 +24,10 @@ class WebhookCreate(BaseModel):
                 "name": "Access Notification",
                 "url": "https://example.com/webhook",
                 "events": ["access.recorded", "device.created"],
-                "secret": "optional-custom-secret"
+                "secret": "optional-custom-secret",
+                "batch_enabled": True,
+                "batch_max_events": 200,
+                "batch_linger_ms": 500
             }
         }
 
@@ -31,6 +38,10 @@ class WebhookUpdate(BaseModel):
     url: Optional[HttpUrl] = None
     events: Optional[List[str]] = None
     is_active: Optional[bool] = None
+    batch_enabled: Optional[bool] = None
+    batch_max_events: Optional[int] = Field(None, ge=1, le=1000)
+    batch_max_bytes: Optional[int] = Field(None, ge=1024, le=5242880)
+    batch_linger_ms: Optional[int] = Field(None, ge=10, le=30000)
 
 
 class WebhookResponse(BaseModel):
@@ -45,6 +56,11 @@ class WebhookResponse(BaseModel):
     updated_at: datetime
     last_triggered_at: Optional[datetime]
     failure_count: int
+    batch_enabled: bool
+    batch_max_events: int
+    batch_max_bytes: int
+    batch_linger_ms: int
+    circuit_state: str = "closed"
     
     class Config:
         from_attributes = True
@@ -59,6 +75,67 @@ class WebhookLogResponse(BaseModel):
     response_status: Optional[int]
     error_message: Optional[str]
     created_at: datetime
+    payload: Optional[Dict[str, Any]] = None  # Envelope that was sent (None once purged)
     
     class Config:
         from_attributes = True
+
+
+class WebhookStatsBucket(BaseModel):
+    """Schema for one hour of webhook delivery stats"""
+    bucket_start: datetime
+    deliveries: int
+    successes: int
+
+
+class WebhookStatsResponse(BaseModel):
+    """Schema for aggregated webhook delivery stats"""
+    webhook_id: UUID
+    window_hours: int
+    deliveries: int
+    successes: int
+    success_rate: Optional[float]
+    latency_avg_ms: Optional[float]
+    latency_p50_ms: Optional[float]
+    latency_p95_ms: Optional[float]
+    hourly: List[WebhookStatsBucket]
+
+
+class WebhookDeadLetterResponse(BaseModel):
+    """Schema for a dead-lettered delivery"""
+    id: UUID
+    webhook_id: UUID
+    event: str
+    attempts: int
+    last_error: Optional[str]
+    first_attempt_at: datetime
+    dead_at: datetime
+    replayed_at: Optional[datetime]
+    
+    class Config:
+        from_attributes = True
+
+
+class DeadLetterReplayRequest(BaseModel):
+    """Schema for replaying dead-lettered deliveries"""
+    webhook_id: Optional[UUID] = None
+    event: Optional[str] = None
+    limit: int = Field(1000, ge=1, le=10000)
+    batch_size: int = Field(50, ge=1, le=1000)
+    batch_interval_seconds: float = Field(10.0, ge=0, le=3600)
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "webhook_id": "550e8400-e29b-41d4-a716-446655440000",
+                "limit": 500,
+                "batch_size": 50,
+                "batch_interval_seconds": 10
+            }
+        }
+
+
+class DeadLetterReplayResponse(BaseModel):
+    """Schema for a replay summary"""
+    replayed: int
+    batches: int
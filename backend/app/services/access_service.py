@@ -1,15 +1,30 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
 from uuid import UUID
 from datetime import datetime, timezone
 import logging
 
 from app.models import AccessRecord, AccessType, Device, User
+from app.models.webhook import WebhookEvent
 from app.services.device_service import DeviceService
+from app.services.notification_service import NotificationService
+from app.services.webhook_service import WebhookService
 from app.core.exceptions import ValidationException, AuthorizationException
+from app.core.cache_invalidation import invalidate_on_commit
+from app.core.config import settings
+from app.core.metrics import record_scan
+from app.core.redis_cache import (
+    access_history_cache_key,
+    access_history_cache_tag,
+    cached,
+    device_cache_tag,
+    user_cache_tag,
+)
+from app.core.tracing import trace_methods
 
 logger = logging.getLogger(__name__)
 
 
+@trace_methods
 class AccessService:
     @staticmethod
     def record_access(
@@ -20,7 +35,7 @@ class AccessService:
         current_user,
     ) -> AccessRecord:
         """Record access when QR is scanned"""
-        logger.info(
+        logger.debug(
             "Recording access: type=%s, location=%s, scanned_by=%s",
             access_type,
             location,
@@ -47,7 +62,7 @@ class AccessService:
         try:
             access_type_enum = AccessType(normalized_type)
         except ValueError:
-            logger.warning(f"Invalid access type received: {access_type}")
+            logger.warning("Invalid access type received: %s", access_type)
             raise ValidationException(
                 f"Invalid access type '{access_type}'; expected 'entrada' or 'salida'"
             )
@@ -63,20 +78,43 @@ class AccessService:
             )
 
             db.add(access_record)
+            db.flush()
+
+            # Publish webhook events atomically with the access record
+            payload = AccessService._webhook_payload(access_record)
+            WebhookService.enqueue_event(db, WebhookEvent.ACCESS_RECORDED, payload)
+            WebhookService.enqueue_event(
+                db,
+                WebhookEvent.ACCESS_ENTRY
+                if access_type_enum == AccessType.ENTRADA
+                else WebhookEvent.ACCESS_EXIT,
+                payload,
+            )
+
+            # Stage the owner's scan notification in the same transaction
+            NotificationService.enqueue_access_notification(db, access_record)
+
+            invalidate_on_commit(
+                db,
+                access_history_cache_tag(device.user_id),
+                access_history_cache_tag("all"),
+            )
             db.commit()
             db.refresh(access_record)
+            record_scan(location, access_type_enum.value)
 
+            # Read ids from the refreshed record: the device and user expired on commit
             logger.info(
                 "Access recorded successfully: device=%s, type=%s, owner=%s, scanned_by=%s",
-                device.id,
+                access_record.device_id,
                 access_type_enum.value,
-                device.user_id,
-                getattr(current_user, "id", None),
+                access_record.user_id,
+                access_record.scanned_by_id,
             )
 
             return access_record
         except Exception as e:
-            logger.error(f"Failed to record access: {str(e)}")
+            logger.error("Failed to record access: %s", e)
             db.rollback()
             raise
 
@@ -88,7 +126,7 @@ class AccessService:
         limit: int = 100,
     ):
         """Get access history for a device"""
-        logger.info(f"Fetching access history for device {device_id}")
+        logger.debug("Fetching access history for device %s", device_id)
 
         device = DeviceService.get_device(db, device_id)
 
@@ -104,44 +142,113 @@ class AccessService:
                 "Not authorized to view this device's access history"
             )
 
-        records = (
-            db.query(AccessRecord)
+        rows = (
+            AccessService._history_query(db)
             .filter(AccessRecord.device_id == device_id)
             .order_by(AccessRecord.timestamp.desc())
             .limit(limit)
             .all()
         )
 
-        logger.info(f"Found {len(records)} access records for device {device_id}")
-        return [AccessService._serialize_access_record(db, r) for r in records]
+        logger.debug("Found %d access records for device %s", len(rows), device_id)
+        return [AccessService._serialize_access_record(row) for row in rows]
 
     @staticmethod
     def get_user_access_history(db: Session, current_user, limit: int = 100):
         """Get access history for a user or all if security/admin"""
-        logger.info(f"Fetching access history for user {current_user.id}")
+        return AccessService.get_scoped_access_history(
+            db, AccessService.history_scope(current_user), limit
+        )
 
-        role = getattr(current_user, "role", None)
-        query = db.query(AccessRecord)
+    @staticmethod
+    def get_scoped_access_history(db: Session, scope: str, limit: int = 100):
+        """Get everyone's access history (scope "all") or one user's (scope = user ID)"""
+        logger.debug("Fetching access history for scope %s", scope)
+
+        query = AccessService._history_query(db)
 
-        if role in ("security", "admin"):
+        if scope == "all":
             # Security/admin see all records
-            records = query.order_by(AccessRecord.timestamp.desc()).limit(limit).all()
+            rows = query.order_by(AccessRecord.timestamp.desc()).limit(limit).all()
         else:
-            records = (
-                query.filter(AccessRecord.user_id == current_user.id)
+            rows = (
+                query.filter(AccessRecord.user_id == UUID(scope))
                 .order_by(AccessRecord.timestamp.desc())
                 .limit(limit)
                 .all()
             )
 
-        logger.info(f"Found {len(records)} access records for user {current_user.id} (role={role})")
-        return [AccessService._serialize_access_record(db, r) for r in records]
+        logger.debug("Found %d access records for scope %s", len(rows), scope)
+        return [AccessService._serialize_access_record(row) for row in rows]
+
+    @staticmethod
+    def history_scope(current_user) -> str:
+        """Whose history a user sees: everyone's for security/admin, else their own"""
+        if getattr(current_user, "role", None) in ("security", "admin"):
+            return "all"
+        return str(current_user.id)
+
+    @staticmethod
+    def _history_tags(records) -> list:
+        """Devices and users whose data appears in a history page"""
+        tags = set()
+        for record in records:
+            tags.add(device_cache_tag(record["device_id"]))
+            tags.add(user_cache_tag(record["user_id"]))
+            if record["scanned_by_id"]:
+                tags.add(user_cache_tag(record["scanned_by_id"]))
+        return list(tags)
+
+    @staticmethod
+    @cached(
+        ttl=settings.CACHE_ACCESS_HISTORY_TTL,
+        key_builder=lambda db, scope, limit=100: access_history_cache_key(scope, limit),
+        tags=lambda db, scope, limit=100: [access_history_cache_tag(scope)],
+        result_tags=lambda records: AccessService._history_tags(records),
+    )
+    def get_cached_access_history(db: Session, scope: str, limit: int = 100):
+        """Get access history for a scope (see `history_scope`), read through the cache"""
+        return AccessService.get_scoped_access_history(db, scope, limit)
+
+    @staticmethod
+    def _webhook_payload(record: AccessRecord) -> dict:
+        """Build the webhook event payload for an access record"""
+        return {
+            "access_record_id": str(record.id),
+            "device_id": str(record.device_id),
+            "user_id": str(record.user_id),
+            "scanned_by_id": str(record.scanned_by_id) if record.scanned_by_id else None,
+            "access_type": record.access_type.value,
+            "location": record.location,
+            "timestamp": record.timestamp.isoformat(),
+        }
+
+    @staticmethod
+    def _history_query(db: Session):
+        """
+        Access records with their device and user names, in one query
+
+        Joining here replaces a lookup of the device, owner and scanner per
+        record (up to 3 extra queries per row of history).
+        """
+        owner = aliased(User)
+        scanner = aliased(User)
+        return (
+            db.query(
+                AccessRecord,
+                Device.name.label("device_name"),
+                Device.serial_number.label("device_serial_number"),
+                owner.full_name.label("user_name"),
+                scanner.full_name.label("scanned_by_name"),
+            )
+            .outerjoin(Device, Device.id == AccessRecord.device_id)
+            .outerjoin(owner, owner.id == AccessRecord.user_id)
+            .outerjoin(scanner, scanner.id == AccessRecord.scanned_by_id)
+        )
 
     @staticmethod
-    def _serialize_access_record(db: Session, record: AccessRecord):
-        device = db.query(Device).get(record.device_id) if record.device_id else None
-        owner = db.query(User).get(record.user_id) if record.user_id else None
-        scanner = db.query(User).get(record.scanned_by_id) if record.scanned_by_id else None
+    def _serialize_access_record(row):
+        record = row.AccessRecord
 
         return {
             "id": record.id,
@@ -151,8 +258,8 @@ class AccessService:
             "access_type": getattr(record.access_type, "value", record.access_type),
             "timestamp": record.timestamp,
             "location": record.location,
-            "device_name": getattr(device, "name", None),
-            "device_serial_number": getattr(device, "serial_number", None),
-            "user_name": getattr(owner, "full_name", None),
-            "scanned_by_name": getattr(scanner, "full_name", None),
+            "device_name": row.device_name,
+            "device_serial_number": row.device_serial_number,
+            "user_name": row.user_name,
+            "scanned_by_name": row.scanned_by_name,
         }
@@ -1,18 +1,33 @@
 from sqlalchemy.orm import Session
 from uuid import UUID
+from typing import List
 import logging
 
 from app.models import Device, User
-from app.services.qr_service import create_device_with_qr
+from app.schemas import DeviceResponse
+from app.models.webhook import WebhookEvent
+from app.services.qr_service import build_device_with_qr
+from app.services.webhook_service import WebhookService
+from app.core.search import text_match_clause, keyset_page
+from app.core.cache_invalidation import invalidate_on_commit
+from app.core.config import settings
+from app.core.redis_cache import (
+    cached,
+    device_cache_key,
+    device_cache_tag,
+    user_devices_cache_tag,
+)
 from app.core.exceptions import (
     ConflictException,
     NotFoundException,
     AuthorizationException,
 )
+from app.core.tracing import trace_methods
 
 logger = logging.getLogger(__name__)
 
 
+@trace_methods
 class DeviceService:
     @staticmethod
     def create_device(
@@ -23,7 +38,7 @@ class DeviceService:
         serial_number: str
     ) -> Device:
         """Create a new device with QR code"""
-        logger.info(f"Creating device for user {user_id}: {name}")
+        logger.info("Creating device for user %s: %s", user_id, name)
         
         # Check if serial number already exists
         existing_device = db.query(Device).filter(
@@ -31,18 +46,27 @@ class DeviceService:
         ).first()
         
         if existing_device:
-            logger.warning(f"Device creation failed: Serial number {serial_number} already exists")
+            logger.warning("Device creation failed: Serial number %s already exists", serial_number)
             raise ConflictException(
                 "Device with this serial number already exists"
             )
 
         try:
-            # Create device with QR
-            device = create_device_with_qr(db, user_id, name, device_type, serial_number)
-            logger.info(f"Device created successfully: {device.id}")
+            # Create device with QR and publish the event in the same commit
+            device = build_device_with_qr(user_id, name, device_type, serial_number)
+            db.add(device)
+            db.flush()
+            WebhookService.enqueue_event(
+                db, WebhookEvent.DEVICE_CREATED, DeviceService._webhook_payload(device)
+            )
+            invalidate_on_commit(db, user_devices_cache_tag(user_id))
+            db.commit()
+            db.refresh(device)
+            logger.info("Device created successfully: %s", device.id)
             return device
         except Exception as e:
-            logger.error(f"Failed to create device: {str(e)}")
+            logger.error("Failed to create device: %s", e)
+            db.rollback()
             raise
 
     @staticmethod
@@ -51,7 +75,7 @@ class DeviceService:
         device = db.query(Device).filter(Device.id == device_id).first()
         
         if not device:
-            logger.warning(f"Device not found: {device_id}")
+            logger.warning("Device not found: %s", device_id)
             raise NotFoundException("Device")
         
         return device
@@ -62,7 +86,7 @@ class DeviceService:
         device = db.query(Device).filter(Device.qr_data == qr_data).first()
         
         if not device:
-            logger.warning(f"Device not found by QR data")
+            logger.warning("Device not found by QR data")
             raise NotFoundException("Device")
         
         return device
@@ -70,11 +94,48 @@ class DeviceService:
     @staticmethod
     def get_user_devices(db: Session, user_id: UUID):
         """Get all devices for a user"""
-        logger.info(f"Fetching devices for user: {user_id}")
+        logger.debug("Fetching devices for user: %s", user_id)
         devices = db.query(Device).filter(Device.user_id == user_id).all()
-        logger.info(f"Found {len(devices)} devices for user {user_id}")
+        logger.debug("Found %d devices for user %s", len(devices), user_id)
         return devices
 
+    @staticmethod
+    @cached(
+        ttl=settings.CACHE_DEVICES_TTL,
+        key_builder=lambda db, user_id: device_cache_key(user_id),
+        tags=lambda db, user_id: [user_devices_cache_tag(user_id)],
+        result_tags=lambda devices: [device_cache_tag(device.id) for device in devices],
+    )
+    def get_cached_user_devices(db: Session, user_id: UUID) -> List[DeviceResponse]:
+        """Get all devices for a user, read through the cache"""
+        return [
+            DeviceResponse.model_validate(device)
+            for device in DeviceService.get_user_devices(db, user_id)
+        ]
+
+    @staticmethod
+    def search_devices(db: Session, term: str, limit: int = 20, cursor: str = None):
+        """
+        Search devices by partial serial number, brand, model or name
+
+        Args:
+            db: Database session
+            term: Substring to look for
+            limit: Page size
+            cursor: Keyset cursor from the previous page
+
+        Returns:
+            Tuple of (devices, next_cursor)
+        """
+        match = text_match_clause(
+            db,
+            Device.__table__,
+            "devices_search",
+            [Device.serial_number, Device.brand, Device.model, Device.name],
+            term,
+        )
+        return keyset_page(db.query(Device).filter(match), Device, limit, cursor)
+
     @staticmethod
     def update_device(
         db: Session, 
@@ -85,13 +146,13 @@ class DeviceService:
         serial_number: str = None
     ) -> Device:
         """Update device information"""
-        logger.info(f"Updating device {device_id} for user {user_id}")
+        logger.info("Updating device %s for user %s", device_id, user_id)
         
         device = DeviceService.get_device(db, device_id)
 
         # Verify ownership
         if device.user_id != user_id:
-            logger.warning(f"Unauthorized device update attempt: {device_id} by user {user_id}")
+            logger.warning("Unauthorized device update attempt: %s by user %s", device_id, user_id)
             raise AuthorizationException(
                 "Not authorized to update this device"
             )
@@ -103,7 +164,7 @@ class DeviceService:
             ).first()
             
             if existing:
-                logger.warning(f"Device update failed: Serial number {serial_number} already exists")
+                logger.warning("Device update failed: Serial number %s already exists", serial_number)
                 raise ConflictException(
                     "Device with this serial number already exists"
                 )
@@ -115,35 +176,56 @@ class DeviceService:
             device.device_type = device_type
 
         try:
+            WebhookService.enqueue_event(
+                db, WebhookEvent.DEVICE_UPDATED, DeviceService._webhook_payload(device)
+            )
+            invalidate_on_commit(db, device_cache_tag(device.id))
             db.commit()
             db.refresh(device)
-            logger.info(f"Device updated successfully: {device_id}")
+            logger.info("Device updated successfully: %s", device_id)
             return device
         except Exception as e:
-            logger.error(f"Failed to update device: {str(e)}")
+            logger.error("Failed to update device: %s", e)
             db.rollback()
             raise
 
     @staticmethod
     def delete_device(db: Session, device_id: UUID, user_id: UUID) -> bool:
         """Delete a device"""
-        logger.info(f"Deleting device {device_id} for user {user_id}")
+        logger.info("Deleting device %s for user %s", device_id, user_id)
         
         device = DeviceService.get_device(db, device_id)
 
         # Verify ownership
         if device.user_id != user_id:
-            logger.warning(f"Unauthorized device deletion attempt: {device_id} by user {user_id}")
+            logger.warning("Unauthorized device deletion attempt: %s by user %s", device_id, user_id)
             raise AuthorizationException(
                 "Not authorized to delete this device"
             )
 
         try:
+            WebhookService.enqueue_event(
+                db, WebhookEvent.DEVICE_DELETED, DeviceService._webhook_payload(device)
+            )
+            invalidate_on_commit(db, device_cache_tag(device.id))
             db.delete(device)
             db.commit()
-            logger.info(f"Device deleted successfully: {device_id}")
+            logger.info("Device deleted successfully: %s", device_id)
             return True
         except Exception as e:
-            logger.error(f"Failed to delete device: {str(e)}")
+            logger.error("Failed to delete device: %s", e)
             db.rollback()
             raise
+
+    @staticmethod
+    def _webhook_payload(device: Device) -> dict:
+        """Build the webhook event payload for a device"""
+        return {
+            "device_id": str(device.id),
+            "user_id": str(device.user_id),
+            "name": device.name,
+            "device_type": device.device_type,
+            "brand": device.brand,
+            "model": device.model,
+            "serial_number": device.serial_number,
+        }
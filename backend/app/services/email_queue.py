@@ -0,0 +1,129 @@
+"""
+In-process outbound email queue
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email.message import Message
+from typing import Callable, List, Optional
+
+from app.core.background import PollingWorker
+from app.core.config import settings
+from app.core.smtp_pool import is_permanent_smtp_error, smtp_pool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(order=True)
+class QueuedEmail:
+    """Message waiting for (re)delivery, ordered by due time"""
+    not_before: float
+    sequence: int
+    message: Message = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+class EmailQueue(PollingWorker):
+    """
+    Sends queued messages off the request path
+
+    Requests only call `enqueue`. Due messages are sent concurrently, at
+    most one per pooled SMTP connection. Transient failures (4xx answers,
+    network errors) are retried with exponential backoff and jitter up to
+    EMAIL_MAX_ATTEMPTS; 5xx answers are dropped at once. The queue lives in
+    memory, so messages still waiting when the process dies are lost.
+    """
+
+    name = "Email queue"
+
+    def __init__(
+        self,
+        sender: Optional[Callable[[Message], None]] = None,
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        super().__init__(
+            batch_size=batch_size or settings.EMAIL_QUEUE_BATCH_SIZE,
+            poll_interval=poll_interval or settings.EMAIL_QUEUE_POLL_INTERVAL,
+        )
+        self.sender = sender or smtp_pool.send
+        self.concurrency = concurrency or settings.SMTP_POOL_SIZE
+        self._pending: List[QueuedEmail] = []
+        self._sequence = itertools.count()
+        # enqueue may be called from worker threads
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, message: Message) -> None:
+        """
+        Queue a message for delivery (thread-safe)
+
+        Args:
+            message: Complete message (From/To/Subject set)
+        """
+        with self._lock:
+            heapq.heappush(
+                self._pending, QueuedEmail(time.monotonic(), next(self._sequence), message)
+            )
+        self.wake()
+
+    @staticmethod
+    def compute_backoff(attempts: int) -> float:
+        """Exponential delay with jitter after `attempts` failed attempts"""
+        delay = min(
+            settings.EMAIL_RETRY_MAX_SECONDS,
+            settings.EMAIL_RETRY_BASE_SECONDS * (2 ** (attempts - 1)),
+        )
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def run_once(self) -> int:
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._pending and self._pending[0].not_before <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self._pending))
+        if not due:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._deliver(email, semaphore) for email in due))
+        return len(due)
+
+    async def _deliver(self, email: QueuedEmail, semaphore: asyncio.Semaphore) -> None:
+        email.attempts += 1
+        try:
+            async with semaphore:
+                await asyncio.to_thread(self.sender, email.message)
+        except Exception as e:
+            recipient = email.message["To"]
+            if is_permanent_smtp_error(e) or email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+                logger.error(
+                    "Email to %s dropped after %d attempts: %s", recipient, email.attempts, e
+                )
+                return
+            logger.warning("Email to %s failed (attempt %d): %s", recipient, email.attempts, e)
+            email.not_before = time.monotonic() + self.compute_backoff(email.attempts)
+            with self._lock:
+                heapq.heappush(self._pending, email)
+            return
+
+        logger.info("Email sent successfully to %s", email.message["To"])
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Stop the loop after a last pass over due messages"""
+        await super().stop(timeout)
+        await self.run_once()
+        if self._pending:
+            logger.warning("%d queued emails were not sent before shutdown", len(self._pending))
+
+
+# Global queue instance
+email_queue = EmailQueue()
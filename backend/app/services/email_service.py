@@ -1,20 +1,54 @@
 """
 Email Service - SMTP email sending with templates
 """
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import logging
 
 from app.core.config import settings
+from app.core.email_templates import email_templates
+from app.core.tracing import trace_methods
+from app.services.email_queue import email_queue
 
 logger = logging.getLogger(__name__)
 
 
+@trace_methods
 class EmailService:
     """Service for sending emails via SMTP"""
     
+    @staticmethod
+    def build_message(
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None
+    ) -> MIMEMultipart:
+        """
+        Build a multipart email message
+        
+        Args:
+            to_email: Recipient email address
+            subject: Email subject
+            html_content: HTML email body
+            text_content: Plain text fallback (optional)
+            
+        Returns:
+            Message ready to send
+        """
+        message = MIMEMultipart("alternative")
+        message["Subject"] = subject
+        message["From"] = f"{settings.SMTP_FROM_NAME} <{settings.SMTP_FROM_EMAIL}>"
+        message["To"] = to_email
+        
+        # Add text and HTML parts
+        if text_content:
+            message.attach(MIMEText(text_content, "plain"))
+        message.attach(MIMEText(html_content, "html"))
+        
+        return message
+    
     @staticmethod
     def send_email(
         to_email: str,
@@ -23,7 +57,10 @@ class EmailService:
         text_content: Optional[str] = None
     ) -> bool:
         """
-        Send an email via SMTP
+        Queue an email for delivery via SMTP
+        
+        The message is sent by the background email queue over pooled SMTP
+        connections, so callers never wait for the mail server.
         
         Args:
             to_email: Recipient email address
@@ -32,7 +69,7 @@ class EmailService:
             text_content: Plain text fallback (optional)
             
         Returns:
-            bool: True if email sent successfully
+            bool: True if the email was queued
         """
         # Check if SMTP is configured
         if not settings.SMTP_USER or not settings.SMTP_PASSWORD:
@@ -47,35 +84,49 @@ class EmailService:
             return False
         
         try:
-            # Create message
-            message = MIMEMultipart("alternative")
-            message["Subject"] = subject
-            message["From"] = f"{settings.SMTP_FROM_NAME} <{settings.SMTP_FROM_EMAIL}>"
-            message["To"] = to_email
-            
-            # Add text and HTML parts
-            if text_content:
-                text_part = MIMEText(text_content, "plain")
-                message.attach(text_part)
-            
-            html_part = MIMEText(html_content, "html")
-            message.attach(html_part)
-            
-            # Send email
-            with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-                server.starttls()
-                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                server.send_message(message)
-            
-            logger.info("Email sent successfully to %s", to_email)
-            return True
-            
+            message = EmailService.build_message(to_email, subject, html_content, text_content)
         except Exception as e:
-            logger.error("Failed to send email to %s: %s", to_email, str(e))
+            logger.error("Failed to build email to %s: %s", to_email, str(e))
             return False
+        
+        email_queue.enqueue(message)
+        logger.debug("Email to %s queued", to_email)
+        return True
     
     @staticmethod
-    def send_password_reset_email(to_email: str, reset_token: str, full_name: str) -> bool:
+    def send_template_email(
+        to_email: str,
+        template: str,
+        locale: Optional[str] = None,
+        **context: Any
+    ) -> bool:
+        """
+        Render a precompiled notification template and queue it
+        
+        Args:
+            to_email: Recipient email address
+            template: Template name under app/templates/email
+            locale: Recipient's language (defaults to EMAIL_DEFAULT_LOCALE)
+            **context: Template variables
+            
+        Returns:
+            bool: True if the email was queued
+        """
+        rendered = email_templates.render(template, locale, **context)
+        return EmailService.send_email(
+            to_email=to_email,
+            subject=rendered.subject,
+            html_content=rendered.html,
+            text_content=rendered.text
+        )
+    
+    @staticmethod
+    def send_password_reset_email(
+        to_email: str,
+        reset_token: str,
+        full_name: str,
+        locale: Optional[str] = None
+    ) -> bool:
         """
         Send password reset email
         
@@ -83,134 +134,73 @@ class EmailService:
             to_email: User's email address
             reset_token: Password reset token
             full_name: User's full name
+            locale: User's language (optional)
             
         Returns:
             bool: True if email sent successfully
         """
-        # Generate reset link
-        reset_link = f"{settings.FRONTEND_URL}/reset-password?token={reset_token}"
-        
-        # HTML email template
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <style>
-                body {{
-                    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                    max-width: 600px;
-                    margin: 0 auto;
-                    padding: 20px;
-                }}
-                .container {{
-                    background-color: #ffffff;
-                    border-radius: 8px;
-                    padding: 30px;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                }}
-                .header {{
-                    text-align: center;
-                    padding-bottom: 20px;
-                    border-bottom: 2px solid #4F46E5;
-                }}
-                .header h1 {{
-                    color: #4F46E5;
-                    margin: 0;
-                }}
-                .content {{
-                    padding: 30px 0;
-                }}
-                .button {{
-                    display: inline-block;
-                    padding: 12px 30px;
-                    background-color: #4F46E5;
-                    color: #ffffff !important;
-                    text-decoration: none;
-                    border-radius: 6px;
-                    font-weight: 600;
-                    margin: 20px 0;
-                }}
-                .button:hover {{
-                    background-color: #4338CA;
-                }}
-                .footer {{
-                    text-align: center;
-                    padding-top: 20px;
-                    border-top: 1px solid #E5E7EB;
-                    color: #6B7280;
-                    font-size: 14px;
-                }}
-                .warning {{
-                    background-color: #FEF3C7;
-                    border-left: 4px solid #F59E0B;
-                    padding: 15px;
-                    margin: 20px 0;
-                    border-radius: 4px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🔐 ECCI Control</h1>
-                </div>
-                
-                <div class="content">
-                    <h2>Hola, {full_name}</h2>
-                    
-                    <p>Recibimos una solicitud para restablecer la contraseña de tu cuenta.</p>
-                    
-                    <p>Para crear una nueva contraseña, haz clic en el siguiente botón:</p>
-                    
-                    <div style="text-align: center;">
-                        <a href="{reset_link}" class="button">Restablecer Contraseña</a>
-                    </div>
-                    
-                    <p>O copia y pega este enlace en tu navegador:</p>
-                    <p style="word-break: break-all; color: #4F46E5;">{reset_link}</p>
-                    
-                    <div class="warning">
-                        <strong>⏱️ Importante:</strong> Este enlace expirará en {settings.RESET_TOKEN_EXPIRE_MINUTES} minutos.
-                    </div>
-                    
-                    <p>Si no solicitaste restablecer tu contraseña, ignora este correo. Tu contraseña permanecerá sin cambios.</p>
-                </div>
-                
-                <div class="footer">
-                    <p>Este es un correo automático, por favor no respondas.</p>
-                    <p>© 2026 ECCI Control System. Todos los derechos reservados.</p>
-                </div>
-            </div>
-        </body>
-        </html>
+        return EmailService.send_template_email(
+            to_email,
+            "password_reset",
+            locale,
+            full_name=full_name,
+            reset_link=f"{settings.FRONTEND_URL}/reset-password?token={reset_token}",
+            expire_minutes=settings.RESET_TOKEN_EXPIRE_MINUTES,
+        )
+    
+    @staticmethod
+    def send_device_registered_email(
+        to_email: str,
+        full_name: str,
+        device_name: str,
+        device_type: str,
+        serial_number: str,
+        locale: Optional[str] = None
+    ) -> bool:
         """
+        Tell a user a device was registered to their account
         
-        # Plain text fallback
-        text_content = f"""
-        Hola, {full_name}
-        
-        Recibimos una solicitud para restablecer la contraseña de tu cuenta ECCI Control.
-        
-        Para crear una nueva contraseña, visita el siguiente enlace:
-        {reset_link}
-        
-        Este enlace expirará en {settings.RESET_TOKEN_EXPIRE_MINUTES} minutos.
-        
-        Si no solicitaste restablecer tu contraseña, ignora este correo.
-        
-        Saludos,
-        ECCI Control System
+        Args:
+            to_email: User's email address
+            full_name: User's full name
+            device_name: Registered device name
+            device_type: Device type (laptop, phone, ...)
+            serial_number: Device serial number
+            locale: User's language (optional)
+            
+        Returns:
+            bool: True if email sent successfully
         """
+        return EmailService.send_template_email(
+            to_email,
+            "device_registered",
+            locale,
+            full_name=full_name,
+            device_name=device_name,
+            device_type=device_type,
+            serial_number=serial_number,
+        )
+    
+    @staticmethod
+    def send_access_alert_email(
+        to_email: str,
+        full_name: str,
+        scans: List[Dict[str, Any]],
+        locale: Optional[str] = None
+    ) -> bool:
+        """
+        Tell a user their devices were scanned
         
-        subject = "Restablece tu contraseña - ECCI Control"
-        
-        return EmailService.send_email(
-            to_email=to_email,
-            subject=subject,
-            html_content=html_content,
-            text_content=text_content
+        Args:
+            to_email: User's email address
+            full_name: User's full name
+            scans: One or more scans, each with device_name, access_type
+                ("entrada"/"salida"), location and timestamp
+            locale: User's language (optional)
+            
+        Returns:
+            bool: True if email sent successfully
+        """
+        return EmailService.send_template_email(
+            to_email, "access_alert", locale, full_name=full_name, scans=scans
         )
@@ -0,0 +1,194 @@
+"""
+Owner notifications for device scans
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.background import PollingWorker
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.tracing import trace_methods
+from app.models.access_record import AccessRecord
+from app.models.device import Device
+from app.models.notification import AccessNotification, NotificationFrequency
+from app.models.user import User
+from app.services.email_service import EmailService
+
+logger = logging.getLogger(__name__)
+
+
+@trace_methods
+class NotificationService:
+    """Service for staging and collecting scan notifications"""
+
+    @staticmethod
+    def window_due_at(frequency: NotificationFrequency, now: datetime) -> datetime:
+        """
+        When a scan made at `now` is reported
+
+        Immediate scans are due at once (the aggregator still collapses
+        scans that arrive within one poll interval); hourly scans are due
+        at the end of their clock hour.
+        """
+        if frequency == NotificationFrequency.HOURLY:
+            return now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        return now
+
+    @staticmethod
+    def enqueue_access_notification(
+        db: Session,
+        access_record: AccessRecord
+    ) -> Optional[AccessNotification]:
+        """
+        Stage a scan notification for the device owner in the caller's transaction
+
+        Args:
+            db: Database session (not committed here)
+            access_record: Flushed access record
+
+        Returns:
+            Pending notification, or None if the owner turned notifications off
+        """
+        frequency = (
+            db.query(User.notification_frequency)
+            .filter(User.id == access_record.user_id)
+            .scalar()
+        )
+        if frequency in (None, NotificationFrequency.OFF):
+            return None
+
+        notification = AccessNotification(
+            user_id=access_record.user_id,
+            access_record_id=access_record.id,
+            due_at=NotificationService.window_due_at(frequency, access_record.timestamp),
+        )
+        db.add(notification)
+        return notification
+
+    @staticmethod
+    def collect_due(db: Session, now: datetime, max_users: int) -> List[Dict[str, Any]]:
+        """
+        Remove due notifications and group them into one digest per user
+
+        Every due scan of a selected user is taken, so a user never gets two
+        digests for the same window. Rows are deleted in the caller's
+        transaction; users who switched notifications off since the scan get
+        nothing.
+
+        Args:
+            db: Database session (not committed here)
+            now: Current time
+            max_users: Maximum number of digests to build
+
+        Returns:
+            Digests with the user's email, full_name and scans (oldest first)
+        """
+        user_ids = [
+            user_id for (user_id,) in db.query(AccessNotification.user_id)
+            .filter(AccessNotification.due_at <= now)
+            .distinct()
+            .limit(max_users)
+            .all()
+        ]
+        if not user_ids:
+            return []
+
+        rows = (
+            db.query(AccessNotification.id, AccessRecord, Device.name, User)
+            .join(AccessRecord, AccessRecord.id == AccessNotification.access_record_id)
+            .join(Device, Device.id == AccessRecord.device_id)
+            .join(User, User.id == AccessNotification.user_id)
+            .filter(
+                AccessNotification.user_id.in_(user_ids),
+                AccessNotification.due_at <= now,
+            )
+            .order_by(AccessNotification.user_id, AccessRecord.timestamp)
+            .with_for_update(of=AccessNotification, skip_locked=True)
+            .all()
+        )
+
+        digests: Dict[Any, Dict[str, Any]] = {}
+        for _, record, device_name, user in rows:
+            if user.notification_frequency == NotificationFrequency.OFF:
+                continue
+            digest = digests.setdefault(user.id, {
+                "email": user.email,
+                "full_name": user.full_name,
+                "scans": [],
+            })
+            digest["scans"].append({
+                "device_name": device_name,
+                "access_type": getattr(record.access_type, "value", record.access_type),
+                "location": record.location,
+                "timestamp": record.timestamp,
+            })
+
+        db.query(AccessNotification).filter(
+            AccessNotification.id.in_([notification_id for notification_id, *_ in rows])
+        ).delete(synchronize_session=False)
+        return list(digests.values())
+
+
+class NotificationAggregator(PollingWorker):
+    """
+    Sends scan digests through the email queue
+
+    Each pass takes the users with due notifications, collapses their scans
+    into one access_alert email per user and hands it to the email queue,
+    so neither the scan request nor this worker waits for SMTP. A digest is
+    removed from the database before it is queued: like the email queue
+    itself, delivery is at most once.
+    """
+
+    name = "Notification aggregator"
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        super().__init__(
+            batch_size=batch_size or settings.NOTIFICATION_BATCH_SIZE,
+            poll_interval=poll_interval or settings.NOTIFICATION_POLL_INTERVAL,
+        )
+        self.session_factory = session_factory
+
+    async def run_once(self) -> int:
+        return await asyncio.to_thread(self.send_due)
+
+    def send_due(self) -> int:
+        """
+        Collect due digests and queue their emails
+
+        Returns:
+            Number of digests sent
+        """
+        db = self.session_factory()
+        try:
+            digests = NotificationService.collect_due(
+                db, datetime.now(timezone.utc), self.batch_size
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        for digest in digests:
+            try:
+                EmailService.send_access_alert_email(
+                    digest["email"], digest["full_name"], digest["scans"]
+                )
+            except Exception as e:
+                logger.error("Failed to queue access digest for %s: %s", digest["email"], e)
+
+        if digests:
+            logger.debug("Queued %d access digests", len(digests))
+        return len(digests)
+
+
+# Global aggregator instance
+notification_aggregator = NotificationAggregator()
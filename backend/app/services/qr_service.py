@@ -30,18 +30,17 @@ def generate_qr_code(qr_data: str) -> str:
     return f"data:image/png;base64,{img_base64}"
 
 
-def create_device_with_qr(
-    db: Session, user_id, name: str, device_type: str, serial_number: str
+def build_device_with_qr(
+    user_id, name: str, device_type: str, serial_number: str
 ) -> Device:
-    """Create a device and generate its QR code"""
+    """Build an unsaved device with freshly generated QR data and image"""
     # Generate unique QR data (UUID)
     qr_data = str(uuid4())
 
     # Generate QR code image
     qr_code = generate_qr_code(qr_data)
 
-    # Create device
-    device = Device(
+    return Device(
         user_id=user_id,
         name=name,
         device_type=device_type,
@@ -50,6 +49,13 @@ def create_device_with_qr(
         qr_code=qr_code,
     )
 
+
+def create_device_with_qr(
+    db: Session, user_id, name: str, device_type: str, serial_number: str
+) -> Device:
+    """Create a device and generate its QR code"""
+    device = build_device_with_qr(user_id, name, device_type, serial_number)
+
     db.add(device)
     db.commit()
     db.refresh(device)
@@ -4,9 +4,14 @@ from typing import Optional
 
 from app.models import User, Device
 from app.models.role import UserRole
+from app.models.webhook import WebhookEvent
 from app.core.security import hash_password, verify_password
+from app.core.search import text_match_clause, keyset_page
+from app.core.tracing import trace_methods
+from app.services.webhook_service import WebhookService
 
 
+@trace_methods
 class UserService:
     @staticmethod
     def create_user(
@@ -40,6 +45,18 @@ class UserService:
         )
 
         db.add(user)
+        db.flush()
+        WebhookService.enqueue_event(
+            db,
+            WebhookEvent.USER_REGISTERED,
+            {
+                "user_id": str(user.id),
+                "email": user.email,
+                "full_name": user.full_name,
+                "student_id": user.student_id,
+                "role": user.role.value,
+            },
+        )
         db.commit()
         db.refresh(user)
 
@@ -55,6 +72,18 @@ class UserService:
         """Get user by ID"""
         return db.query(User).filter(User.id == user_id).first()
 
+    @staticmethod
+    def search_users(db: Session, term: str, limit: int = 20, cursor: str = None):
+        """Search users by partial name, student ID or email (keyset paginated)"""
+        match = text_match_clause(
+            db,
+            User.__table__,
+            "users_search",
+            [User.full_name, User.student_id, User.email],
+            term,
+        )
+        return keyset_page(db.query(User).filter(match), User, limit, cursor)
+
     @staticmethod
     def authenticate_user(db: Session, email: str, password: str) -> User:
         """Authenticate user by email and password"""
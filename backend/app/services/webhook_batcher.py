@@ -0,0 +1,231 @@
+"""
+Batched delivery for high-volume webhook subscribers
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.serialization import dumps_bytes
+from app.models.webhook import WebhookDelivery
+from app.services.webhook_registry import WebhookConfig
+
+logger = logging.getLogger(__name__)
+
+# Event name used for batch envelopes
+BATCH_EVENT = "batch"
+
+# Error recorded on batches queued behind an earlier failed batch
+HELD_ERROR = "Held behind an earlier batch awaiting retry"
+
+
+@dataclass
+class _Buffer:
+    """Events waiting to be sent to one webhook"""
+    webhook: WebhookConfig
+    lock: asyncio.Lock
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    encoded: List[bytes] = field(default_factory=list)
+    waiters: List[asyncio.Future] = field(default_factory=list)
+    size: int = 0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class WebhookBatcher:
+    """
+    Aggregates events per webhook into single signed POSTs
+
+    A buffer is flushed when it reaches the webhook's event count or byte
+    limit, or when its oldest event has lingered for `batch_linger_ms`.
+    Flushes for one webhook are serialized by a lock, so batches leave in the
+    order their events were added and events of a device keep their relative
+    order. Each envelope carries the outbox sequence `id` so receivers can
+    also order across workers.
+
+    While a batch for the webhook waits in the retry queue, later batches
+    are not sent: they are queued behind it, and the retry scheduler resends
+    a webhook's batches one at a time, oldest first.
+
+    `add` returns a future that resolves once the batch holding the event was
+    delivered or durably queued for retry; the dispatcher only marks the
+    outbox entry dispatched after that.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self._buffers: Dict[UUID, _Buffer] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _buffer(self, webhook: WebhookConfig) -> _Buffer:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._buffers = {}
+            self._loop = loop
+
+        buffer = self._buffers.get(webhook.id)
+        if buffer is None:
+            buffer = _Buffer(webhook=webhook, lock=asyncio.Lock())
+            self._buffers[webhook.id] = buffer
+        else:
+            # Pick up configuration changes for subsequent flushes
+            buffer.webhook = webhook
+        return buffer
+
+    def add(
+        self,
+        webhook: WebhookConfig,
+        envelope: Dict[str, Any],
+        encoded: Optional[bytes] = None,
+    ) -> asyncio.Future:
+        """
+        Queue an event envelope for a batched webhook
+
+        Args:
+            webhook: Batched webhook snapshot
+            envelope: Event envelope
+            encoded: The envelope already serialized, reused in the batch body
+
+        Returns:
+            Future resolved when the event's batch has been handled
+        """
+        buffer = self._buffer(webhook)
+        waiter = self._loop.create_future()
+        if encoded is None:
+            encoded = dumps_bytes(envelope)
+
+        buffer.events.append(envelope)
+        buffer.encoded.append(encoded)
+        buffer.waiters.append(waiter)
+        buffer.size += len(encoded)
+
+        if len(buffer.events) >= webhook.batch_max_events or buffer.size >= webhook.batch_max_bytes:
+            self._schedule_flush(buffer, delay=0)
+        elif buffer.timer is None:
+            self._schedule_flush(buffer, delay=webhook.batch_linger_ms / 1000)
+
+        return waiter
+
+    def _schedule_flush(self, buffer: _Buffer, delay: float) -> None:
+        if buffer.timer is not None:
+            buffer.timer.cancel()
+        buffer.timer = self._loop.call_later(
+            delay, lambda: asyncio.ensure_future(self.flush(buffer.webhook.id))
+        )
+
+    async def flush(self, webhook_id: UUID) -> int:
+        """
+        Send everything buffered for a webhook as one batch
+
+        Returns:
+            Number of events sent
+        """
+        # Imported here: webhook_service routes batched webhooks to this module
+        from app.services.webhook_service import WebhookService
+
+        buffer = self._buffers.get(webhook_id)
+        if buffer is None:
+            return 0
+
+        async with buffer.lock:
+            if buffer.timer is not None:
+                buffer.timer.cancel()
+                buffer.timer = None
+
+            events, encoded, waiters = buffer.events, buffer.encoded, buffer.waiters
+            if not events:
+                return 0
+            buffer.events, buffer.encoded, buffer.waiters, buffer.size = [], [], [], 0
+            webhook = buffer.webhook
+
+            body = {
+                "event": BATCH_EVENT,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "count": len(events),
+                "events": events,
+            }
+
+            try:
+                held = await asyncio.to_thread(self._hold_if_retry_pending, webhook, body)
+                if not held:
+                    content = self._encode_batch(body, encoded)
+                    result = await WebhookService._send_webhook(webhook, BATCH_EVENT, content)
+                    await asyncio.to_thread(self._record, webhook, body, result, content)
+            except Exception as e:
+                logger.error("Webhook %s batch flush failed: %s", webhook_id, e)
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                return 0
+
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+            logger.debug("Webhook %s batch of %d events flushed", webhook_id, len(events))
+            return len(events)
+
+    def _hold_if_retry_pending(self, webhook: WebhookConfig, body: Dict[str, Any]) -> bool:
+        """
+        Queue a batch behind the webhook's pending batch retries, if any
+
+        Returns:
+            True if the batch was queued instead of being sent
+        """
+        db = self.session_factory()
+        try:
+            pending = (
+                db.query(WebhookDelivery.id)
+                .filter(
+                    WebhookDelivery.webhook_id == webhook.id,
+                    WebhookDelivery.event == BATCH_EVENT,
+                )
+                .first()
+            )
+            if pending is None:
+                return False
+
+            db.add(WebhookDelivery(
+                webhook_id=webhook.id,
+                event=BATCH_EVENT,
+                payload=body,
+                attempts=0,
+                last_error=HELD_ERROR,
+                # Due at once; the scheduler sends it when it reaches the front
+                next_attempt_at=datetime.now(timezone.utc),
+            ))
+            db.commit()
+            logger.debug("Webhook %s batch held behind a pending retry", webhook.id)
+            return True
+        finally:
+            db.close()
+
+    def _record(self, webhook: WebhookConfig, body: Dict[str, Any], result, content: bytes) -> None:
+        # Imported here: webhook_service routes batched webhooks to this module
+        from app.services.webhook_service import WebhookService
+
+        db = self.session_factory()
+        try:
+            WebhookService._apply_first_attempt(db, webhook, BATCH_EVENT, body, result, content)
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _encode_batch(body: Dict[str, Any], encoded: List[bytes]) -> bytes:
+        """Build the batch JSON around the events' existing encodings"""
+        header = dumps_bytes({key: value for key, value in body.items() if key != "events"})
+        return header[:-1] + b',"events":[' + b",".join(encoded) + b"]}"
+
+    async def flush_all(self) -> None:
+        """Flush every buffer (used on shutdown)"""
+        for webhook_id in list(self._buffers):
+            await self.flush(webhook_id)
+
+
+# Global batcher instance
+webhook_batcher = WebhookBatcher()
@@ -0,0 +1,415 @@
+"""
+Background workers that drain the webhook outbox and retry failed deliveries
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import event, exists, or_
+from sqlalchemy.orm import Session, aliased
+
+from app.core import tracing
+from app.core.background import PollingWorker
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.serialization import dumps_bytes
+from app.models.webhook import WebhookDelivery, WebhookEvent, WebhookOutbox
+from app.services.webhook_batcher import BATCH_EVENT, webhook_batcher
+from app.services.webhook_registry import WebhookConfig, webhook_subscriptions
+from app.services.webhook_service import OUTBOX_PENDING_KEY, WebhookService
+
+logger = logging.getLogger(__name__)
+
+# How often dispatched outbox rows are pruned (seconds)
+PURGE_INTERVAL = 3600
+
+
+@dataclass(frozen=True)
+class _ClaimedEntry:
+    """Detached copy of a leased outbox row"""
+    id: int
+    event: str
+    payload: Dict[str, Any]
+    trace_context: Optional[str]
+
+    @property
+    def ordering_key(self) -> str:
+        """Events about the same device (or user) are delivered in order"""
+        device_id = self.payload.get("device_id")
+        if device_id is not None:
+            return f"device:{device_id}"
+        user_id = self.payload.get("user_id")
+        if user_id is not None:
+            return f"user:{user_id}"
+        return f"entry:{self.id}"
+
+
+class WebhookDispatcher(PollingWorker):
+    """
+    Delivers outbox events to subscribed webhooks off the request path
+
+    Entries are claimed with a lease (`locked_until`) so several workers can
+    drain the same outbox; an entry is only marked dispatched after delivery
+    was attempted, and an expired lease makes it eligible again, which gives
+    at-least-once delivery. Entries that went to batched webhooks are marked
+    once their batches were handled.
+
+    Entries about different devices are dispatched concurrently (up to
+    `concurrency` at once) so one slow receiver does not hold up the batch;
+    entries about the same device keep their outbox order. When one of them
+    fails, the entries after it stay leased and are reclaimed with it.
+    """
+
+    name = "Webhook dispatcher"
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        lease_seconds: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ):
+        super().__init__(
+            batch_size=batch_size or settings.WEBHOOK_OUTBOX_BATCH_SIZE,
+            poll_interval=poll_interval or settings.WEBHOOK_OUTBOX_POLL_INTERVAL,
+        )
+        self.session_factory = session_factory
+        self.lease_seconds = lease_seconds or settings.WEBHOOK_OUTBOX_LEASE_SECONDS
+        self.concurrency = concurrency or settings.WEBHOOK_OUTBOX_CONCURRENCY
+        self._last_purge = time.monotonic()
+        self._batch_waits: Set[asyncio.Task] = set()
+
+    async def run_once(self) -> int:
+        return await self.drain_once()
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Stop the loop, then flush batch buffers so leased entries settle"""
+        await super().stop(timeout)
+        await webhook_batcher.flush_all()
+        if self._batch_waits:
+            await asyncio.wait(self._batch_waits, timeout=timeout)
+
+    async def on_idle(self) -> None:
+        if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = time.monotonic()
+            await asyncio.to_thread(self.purge_dispatched)
+
+    def _claim_batch(self) -> List[_ClaimedEntry]:
+        """Lease a batch of pending outbox entries and return copies of them"""
+        db = self.session_factory()
+        try:
+            now = datetime.now(timezone.utc)
+            entries = (
+                db.query(WebhookOutbox)
+                .filter(
+                    WebhookOutbox.dispatched_at.is_(None),
+                    or_(
+                        WebhookOutbox.locked_until.is_(None),
+                        WebhookOutbox.locked_until < now,
+                    ),
+                )
+                .order_by(WebhookOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+
+            lease = now + timedelta(seconds=self.lease_seconds)
+            claimed = []
+            for entry in entries:
+                entry.locked_until = lease
+                entry.attempts += 1
+                # Copied before the commit expires the rows
+                claimed.append(_ClaimedEntry(
+                    entry.id, entry.event, entry.payload, entry.trace_context
+                ))
+
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    async def drain_once(self) -> int:
+        """
+        Deliver one batch of outbox entries
+
+        Returns:
+            Number of entries processed
+        """
+        entries = await asyncio.to_thread(self._claim_batch)
+        if not entries:
+            return 0
+
+        chains: Dict[str, List[_ClaimedEntry]] = {}
+        for entry in entries:
+            chains.setdefault(entry.ordering_key, []).append(entry)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        done = await asyncio.gather(*(
+            self._dispatch_chain(chain, semaphore) for chain in chains.values()
+        ))
+
+        dispatched = [entry_id for chain_done in done for entry_id in chain_done]
+        if dispatched:
+            await asyncio.to_thread(self._mark_dispatched, dispatched)
+
+        logger.debug("Dispatched %d outbox entries", len(entries))
+        return len(entries)
+
+    async def _dispatch_chain(
+        self, chain: List[_ClaimedEntry], semaphore: asyncio.Semaphore
+    ) -> List[int]:
+        """Dispatch entries sharing an ordering key one after another"""
+        done = []
+        for position, entry in enumerate(chain):
+            async with semaphore:
+                try:
+                    dispatched = await self._dispatch(entry)
+                except Exception as e:
+                    # Leave it and the later entries leased; they are retried
+                    # together, in order, once the lease expires
+                    logger.error(
+                        "Failed to dispatch outbox entry %s (holding %d later entries): %s",
+                        entry.id, len(chain) - position - 1, e
+                    )
+                    break
+            if dispatched:
+                done.append(entry.id)
+        return done
+
+    async def _dispatch(self, entry: _ClaimedEntry) -> bool:
+        """
+        Deliver one entry to its subscribers
+
+        Returns:
+            True when the entry can be marked dispatched right away, False
+            when it is marked once its batches were handled
+
+        Raises:
+            Exception: Delivery failed; the entry stays leased
+        """
+        # Continues the trace of the request that produced the event
+        with tracing.start_trace(
+            "webhook.dispatch",
+            traceparent=entry.trace_context,
+            kind="consumer",
+            **{"webhook.event": entry.event, "outbox.id": entry.id},
+        ):
+            pending = await WebhookService.trigger_event(
+                self.session_factory, WebhookEvent(entry.event), entry.payload,
+                event_id=entry.id
+            )
+
+        if pending:
+            task = asyncio.create_task(self._mark_when_flushed(entry.id, pending))
+            self._batch_waits.add(task)
+            task.add_done_callback(self._batch_waits.discard)
+            return False
+        return True
+
+    async def _mark_when_flushed(self, entry_id: int, pending: List[asyncio.Future]) -> None:
+        """Mark an entry dispatched once every batch holding it was handled"""
+        try:
+            await asyncio.gather(*pending)
+        except Exception as e:
+            # Leave it leased; it is retried once the lease expires
+            logger.error("Batched delivery of outbox entry %s failed: %s", entry_id, e)
+            return
+        await asyncio.to_thread(self._mark_dispatched, [entry_id])
+
+    def _mark_dispatched(self, entry_ids: List[int]) -> None:
+        db = self.session_factory()
+        try:
+            db.query(WebhookOutbox).filter(WebhookOutbox.id.in_(entry_ids)).update(
+                {WebhookOutbox.dispatched_at: datetime.now(timezone.utc)},
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_dispatched(self, older_than_hours: Optional[int] = None) -> int:
+        """
+        Delete dispatched entries past the retention window
+
+        Returns:
+            Number of rows deleted
+        """
+        hours = older_than_hours or settings.WEBHOOK_OUTBOX_RETENTION_HOURS
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+        db = self.session_factory()
+        try:
+            deleted = (
+                db.query(WebhookOutbox)
+                .filter(WebhookOutbox.dispatched_at < cutoff)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+
+class WebhookRetryScheduler(PollingWorker):
+    """
+    Re-attempts failed deliveries once their backoff has elapsed
+
+    Due rows are found through the `next_attempt_at` index. Claiming a row
+    pushes `next_attempt_at` forward by the lease, so a crashed worker's
+    claims simply become due again. A webhook's batches are resent strictly
+    in order: only its oldest pending batch is ever claimed.
+    """
+
+    name = "Webhook retry scheduler"
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        lease_seconds: Optional[int] = None,
+    ):
+        super().__init__(
+            batch_size=batch_size or settings.WEBHOOK_RETRY_BATCH_SIZE,
+            poll_interval=poll_interval or settings.WEBHOOK_RETRY_POLL_INTERVAL,
+        )
+        self.session_factory = session_factory
+        self.lease_seconds = lease_seconds or settings.WEBHOOK_OUTBOX_LEASE_SECONDS
+
+    def _claim_due(self) -> List[Tuple[int, UUID, str, Dict[str, Any]]]:
+        """Lease due deliveries and return what is needed to resend them"""
+        db = self.session_factory()
+        try:
+            now = datetime.now(timezone.utc)
+            earlier = aliased(WebhookDelivery)
+            earlier_batch = exists().where(
+                earlier.webhook_id == WebhookDelivery.webhook_id,
+                earlier.event == BATCH_EVENT,
+                earlier.created_at < WebhookDelivery.created_at,
+            )
+            deliveries = (
+                db.query(WebhookDelivery)
+                .filter(
+                    WebhookDelivery.next_attempt_at <= now,
+                    or_(WebhookDelivery.event != BATCH_EVENT, ~earlier_batch),
+                )
+                .order_by(WebhookDelivery.next_attempt_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+
+            lease = now + timedelta(seconds=self.lease_seconds)
+            claimed = []
+            for delivery in deliveries:
+                delivery.next_attempt_at = lease
+                claimed.append((delivery.id, delivery.webhook_id, delivery.event, delivery.payload))
+
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    def _apply_results(
+        self, outcomes: List[Tuple[int, Optional[WebhookConfig], Optional[bytes], Any]]
+    ) -> None:
+        """
+        Record retry outcomes, rescheduling or dead-lettering failures
+
+        Deliveries without a webhook (deactivated or deleted since) are
+        dead-lettered.
+        """
+        db = self.session_factory()
+        try:
+            deliveries = {
+                delivery.id: delivery
+                for delivery in db.query(WebhookDelivery).filter(
+                    WebhookDelivery.id.in_([delivery_id for delivery_id, _, _, _ in outcomes])
+                )
+            }
+            for delivery_id, webhook, body, result in outcomes:
+                delivery = deliveries.get(delivery_id)
+                if delivery is None:
+                    continue
+                if webhook is None:
+                    WebhookService._dead_letter(db, delivery, "Webhook inactive or deleted")
+                    continue
+                if result.short_circuited:
+                    WebhookService._defer_for_circuit(delivery, result)
+                    continue
+                WebhookService._record_delivery(
+                    db, webhook, delivery.event, delivery.payload, result, body
+                )
+                if result.success:
+                    db.delete(delivery)
+                else:
+                    WebhookService._reschedule_or_dead_letter(db, delivery, result.error_message)
+
+            db.commit()
+        finally:
+            db.close()
+
+    async def run_once(self) -> int:
+        """
+        Retry one batch of due deliveries
+
+        Claiming and recording outcomes happen in worker threads; only the
+        requests themselves run on the event loop.
+
+        Returns:
+            Number of deliveries attempted
+        """
+        claimed = await asyncio.to_thread(self._claim_due)
+        if not claimed:
+            return 0
+
+        webhooks = [
+            await webhook_subscriptions.get(self.session_factory, webhook_id)
+            for _, webhook_id, _, _ in claimed
+        ]
+        bodies = [
+            dumps_bytes(payload) if webhook else None
+            for (_, _, _, payload), webhook in zip(claimed, webhooks)
+        ]
+        sends = [
+            WebhookService._send_webhook(webhook, event, body)
+            for (_, _, event, _), webhook, body in zip(claimed, webhooks, bodies)
+            if webhook
+        ]
+        results = iter(await asyncio.gather(*sends))
+
+        outcomes = [
+            (delivery_id, webhook, body, next(results) if webhook else None)
+            for (delivery_id, _, _, _), webhook, body in zip(claimed, webhooks, bodies)
+        ]
+        await asyncio.to_thread(self._apply_results, outcomes)
+
+        # A delivered batch may have released the next one queued behind it
+        if any(
+            event == BATCH_EVENT and result and result.success
+            for (_, _, event, _), (_, _, _, result) in zip(claimed, outcomes)
+        ):
+            self.wake()
+        return len(claimed)
+
+
+# Global worker instances
+webhook_dispatcher = WebhookDispatcher()
+webhook_retry_scheduler = WebhookRetryScheduler()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_dispatcher_after_commit(session: Session) -> None:
+    """Wake the dispatcher as soon as a commit publishes outbox rows"""
+    if session.info.pop(OUTBOX_PENDING_KEY, False):
+        webhook_dispatcher.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_outbox_flag_after_rollback(session: Session) -> None:
+    session.info.pop(OUTBOX_PENDING_KEY, None)
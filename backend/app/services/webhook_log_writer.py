@@ -0,0 +1,293 @@
+"""
+Buffered webhook log writes, hourly stats and retention
+"""
+import asyncio
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.background import PollingWorker
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.serialization import compress
+from app.models.webhook import LATENCY_BUCKETS_MS, WebhookLog, WebhookPayload, WebhookStatsHourly
+
+logger = logging.getLogger(__name__)
+
+# How often expired logs and stats are pruned (seconds)
+PURGE_INTERVAL = 3600
+
+# Buffered rows kept after failed flushes before the oldest are dropped
+MAX_BUFFER_FACTOR = 10
+
+
+def _upsert(db: Session):
+    """Dialect-specific INSERT supporting ON CONFLICT"""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+class WebhookLogWriter(PollingWorker):
+    """
+    Writes webhook logs in bulk and keeps WebhookStatsHourly current
+
+    While running, log rows are buffered in memory and flushed with one
+    multi-row INSERT when WEBHOOK_LOG_BUFFER_SIZE rows are waiting or every
+    WEBHOOK_LOG_FLUSH_INTERVAL seconds. Each flush also increments the
+    hourly stats rows with an upsert. When the writer is not running, rows
+    are written in the caller's transaction instead.
+
+    Request bodies are stored once per distinct content in webhook_payloads
+    (compressed, keyed by SHA-256); log rows keep only the hash, so an event
+    fanned out to N subscribers is stored once instead of N times.
+
+    Buffered rows are lost if the process dies before a flush; logs are an
+    audit aid, not part of the delivery guarantee.
+    """
+
+    name = "Webhook log writer"
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        buffer_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+    ):
+        super().__init__(
+            batch_size=buffer_size or settings.WEBHOOK_LOG_BUFFER_SIZE,
+            poll_interval=flush_interval or settings.WEBHOOK_LOG_FLUSH_INTERVAL,
+        )
+        self.session_factory = session_factory
+        self._buffer: List[Dict[str, Any]] = []
+        self._payloads: Dict[str, bytes] = {}
+        # add is called from worker threads
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+
+    def add(self, db: Session, row: Dict[str, Any], body: bytes) -> None:
+        """
+        Queue a log row (thread-safe)
+
+        Args:
+            db: Caller's session, used directly when the writer is not running
+            row: WebhookLog column values (without the payload)
+            body: Request body that was sent
+        """
+        row.setdefault("created_at", datetime.now(timezone.utc))
+        payload_hash = hashlib.sha256(body).hexdigest()
+        row["payload_hash"] = payload_hash
+        if not self.running:
+            self.write(db, [row], {payload_hash: body})
+            return
+
+        with self._lock:
+            self._payloads.setdefault(payload_hash, body)
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.wake()
+
+    async def run_once(self) -> int:
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            payloads, self._payloads = self._payloads, {}
+        if not rows:
+            return 0
+
+        try:
+            await asyncio.to_thread(self._flush, rows, payloads)
+        except Exception as e:
+            logger.error("Webhook log flush of %d rows failed: %s", len(rows), e)
+            with self._lock:
+                self._buffer[:0] = rows
+                for payload_hash, body in payloads.items():
+                    self._payloads.setdefault(payload_hash, body)
+                overflow = len(self._buffer) - self.batch_size * MAX_BUFFER_FACTOR
+                if overflow > 0:
+                    del self._buffer[:overflow]
+            if overflow > 0:
+                logger.error("Dropped %d buffered webhook log rows", overflow)
+            return 0
+        return len(rows)
+
+    async def on_idle(self) -> None:
+        if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = time.monotonic()
+            await asyncio.to_thread(self.purge_expired)
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Stop the loop and flush whatever is still buffered"""
+        await super().stop(timeout)
+        await self.run_once()
+
+    def _flush(self, rows: List[Dict[str, Any]], payloads: Dict[str, bytes]) -> None:
+        db = self.session_factory()
+        try:
+            self.write(db, rows, payloads)
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def write(db: Session, rows: List[Dict[str, Any]], payloads: Dict[str, bytes]) -> None:
+        """
+        Insert log rows and fold them into the hourly stats (not committed)
+
+        Args:
+            db: Database session
+            rows: WebhookLog column values, each with `created_at` and `payload_hash`
+            payloads: Request bodies by SHA-256 hex digest
+        """
+        WebhookLogWriter._store_payloads(db, payloads)
+        db.execute(insert(WebhookLog), rows)
+
+        stats = WebhookLogWriter._aggregate(rows)
+        insert_stats = _upsert(db)(WebhookStatsHourly)
+        counters = [
+            "deliveries", "successes", "latency_total_ms", *WebhookStatsHourly.histogram_columns()
+        ]
+        db.execute(
+            insert_stats.on_conflict_do_update(
+                index_elements=["webhook_id", "bucket_start"],
+                set_={
+                    column: getattr(WebhookStatsHourly, column) + getattr(insert_stats.excluded, column)
+                    for column in counters
+                },
+            ),
+            list(stats.values()),
+        )
+
+    @staticmethod
+    def _store_payloads(db: Session, payloads: Dict[str, bytes]) -> None:
+        """Upsert compressed bodies, refreshing last_used_at of known ones"""
+        if not payloads:
+            return
+
+        now = datetime.now(timezone.utc)
+        values = []
+        for payload_hash, body in payloads.items():
+            encoding, data = compress(body)
+            values.append({
+                "hash": payload_hash,
+                "encoding": encoding,
+                "data": data,
+                "size": len(body),
+                "last_used_at": now,
+            })
+
+        insert_payloads = _upsert(db)(WebhookPayload)
+        db.execute(
+            insert_payloads.on_conflict_do_update(
+                index_elements=["hash"],
+                set_={"last_used_at": insert_payloads.excluded.last_used_at},
+            ),
+            values,
+        )
+
+    @staticmethod
+    def _aggregate(rows: List[Dict[str, Any]]) -> Dict[Tuple, Dict[str, Any]]:
+        """Sum log rows into per-webhook, per-hour stats increments"""
+        histogram = WebhookStatsHourly.histogram_columns()
+        stats: Dict[Tuple, Dict[str, Any]] = {}
+
+        for row in rows:
+            bucket_start = row["created_at"].replace(minute=0, second=0, microsecond=0)
+            key = (row["webhook_id"], bucket_start)
+            entry = stats.get(key)
+            if entry is None:
+                entry = dict.fromkeys(histogram, 0)
+                entry.update(
+                    webhook_id=row["webhook_id"],
+                    bucket_start=bucket_start,
+                    deliveries=0,
+                    successes=0,
+                    latency_total_ms=0.0,
+                )
+                stats[key] = entry
+
+            entry["deliveries"] += 1
+            entry["successes"] += 1 if row["success"] else 0
+            latency = row.get("latency_ms")
+            if latency is not None:
+                entry["latency_total_ms"] += latency
+                entry[histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, latency)]] += 1
+
+        return stats
+
+    def purge_expired(
+        self,
+        log_retention_days: Optional[int] = None,
+        stats_retention_days: Optional[int] = None,
+    ) -> int:
+        """
+        Delete logs and stats past their retention windows
+
+        Logs are deleted in chunks of WEBHOOK_RETENTION_CHUNK_SIZE rows, each in
+        its own transaction, so a large backlog never holds long locks.
+        Payloads go once no log written within the window has used them.
+
+        Returns:
+            Number of log rows deleted
+        """
+        now = datetime.now(timezone.utc)
+        log_cutoff = now - timedelta(days=log_retention_days or settings.WEBHOOK_LOG_RETENTION_DAYS)
+        stats_cutoff = now - timedelta(
+            days=stats_retention_days or settings.WEBHOOK_STATS_RETENTION_DAYS
+        )
+        chunk_size = settings.WEBHOOK_RETENTION_CHUNK_SIZE
+
+        deleted = 0
+        while True:
+            db = self.session_factory()
+            try:
+                ids = [
+                    log_id for (log_id,) in db.query(WebhookLog.id)
+                    .filter(WebhookLog.created_at < log_cutoff)
+                    .limit(chunk_size)
+                    .all()
+                ]
+                if not ids:
+                    ids = [
+                        payload_hash for (payload_hash,) in db.query(WebhookPayload.hash)
+                        .filter(WebhookPayload.last_used_at < log_cutoff)
+                        .limit(chunk_size)
+                        .all()
+                    ]
+                    if ids:
+                        db.query(WebhookPayload).filter(
+                            WebhookPayload.hash.in_(ids)
+                        ).delete(synchronize_session=False)
+                        db.commit()
+                        continue
+
+                    db.query(WebhookStatsHourly).filter(
+                        WebhookStatsHourly.bucket_start < stats_cutoff
+                    ).delete(synchronize_session=False)
+                    db.commit()
+                    break
+
+                deleted += (
+                    db.query(WebhookLog)
+                    .filter(WebhookLog.id.in_(ids))
+                    .delete(synchronize_session=False)
+                )
+                db.commit()
+            finally:
+                db.close()
+
+        if deleted:
+            logger.info("Purged %d expired webhook log rows", deleted)
+        return deleted
+
+
+# Global writer instance
+webhook_log_writer = WebhookLogWriter()
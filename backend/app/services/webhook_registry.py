@@ -0,0 +1,143 @@
+"""
+In-process index of webhook subscriptions
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_cache import CacheTier, cache
+from app.models.webhook import Webhook
+
+logger = logging.getLogger(__name__)
+
+# Redis counter bumped whenever any webhook changes
+SUBSCRIPTIONS_VERSION_KEY = "webhooks:subscriptions:version"
+
+
+@dataclass(frozen=True)
+class WebhookConfig:
+    """Immutable snapshot of an active webhook used for delivery"""
+    id: UUID
+    url: str
+    secret: str
+    events: Tuple[str, ...]
+    batch_enabled: bool = False
+    batch_max_events: int = 100
+    batch_max_bytes: int = 262144
+    batch_linger_ms: int = 1000
+
+    @classmethod
+    def from_model(cls, webhook: Webhook) -> "WebhookConfig":
+        return cls(
+            id=webhook.id,
+            url=webhook.url,
+            secret=webhook.secret,
+            events=tuple(webhook.events or ()),
+            batch_enabled=bool(webhook.batch_enabled),
+            batch_max_events=webhook.batch_max_events,
+            batch_max_bytes=webhook.batch_max_bytes,
+            batch_linger_ms=webhook.batch_linger_ms,
+        )
+
+
+class WebhookSubscriptionIndex:
+    """
+    Maps each event to the active webhooks subscribed to it
+
+    The index is rebuilt from the database only when it is invalidated
+    locally or when the shared Redis version counter moved, which is checked
+    at most once per WEBHOOK_INDEX_CHECK_INTERVAL. Lookups in between are
+    plain dictionary reads. The version is read and bumped with the async
+    client and rebuilds run in a worker thread, so neither lookups nor
+    invalidations block the event loop.
+    """
+
+    def __init__(self, check_interval: Optional[float] = None):
+        self.check_interval = (
+            check_interval if check_interval is not None else settings.WEBHOOK_INDEX_CHECK_INTERVAL
+        )
+        self._by_event: Dict[str, Tuple[WebhookConfig, ...]] = {}
+        self._by_id: Dict[UUID, WebhookConfig] = {}
+        self._version = None
+        self._dirty = True
+        self._last_check = 0.0
+
+    def rebuild(self, db: Session, version: Any = None) -> None:
+        """
+        Reload active webhooks from the database
+
+        Args:
+            db: Database session
+            version: Subscriptions version read before calling, so a change
+                racing the query triggers another rebuild
+        """
+        webhooks = db.query(Webhook).filter(Webhook.is_active.is_(True)).all()
+
+        by_event: Dict[str, list] = {}
+        by_id: Dict[UUID, WebhookConfig] = {}
+        for webhook in webhooks:
+            config = WebhookConfig.from_model(webhook)
+            by_id[config.id] = config
+            for event in config.events:
+                by_event.setdefault(event, []).append(config)
+
+        self._by_event = {event: tuple(configs) for event, configs in by_event.items()}
+        self._by_id = by_id
+        self._version = version
+        self._dirty = False
+        self._last_check = time.monotonic()
+        logger.info("Webhook subscription index rebuilt: %d active webhooks", len(by_id))
+
+    def _rebuild_with(self, session_factory: Callable[[], Session], version: Any) -> None:
+        db = session_factory()
+        try:
+            self.rebuild(db, version)
+        finally:
+            db.close()
+
+    async def _refresh_if_stale(self, session_factory: Callable[[], Session]) -> None:
+        if not self._dirty and time.monotonic() - self._last_check < self.check_interval:
+            return
+
+        self._last_check = time.monotonic()
+        version = await cache.get(SUBSCRIPTIONS_VERSION_KEY, tier=CacheTier.REDIS)
+        if self._dirty or version != self._version:
+            await asyncio.to_thread(self._rebuild_with, session_factory, version)
+
+    async def subscribers(
+        self, session_factory: Callable[[], Session], event: str
+    ) -> Tuple[WebhookConfig, ...]:
+        """
+        Get active webhooks subscribed to an event
+
+        Args:
+            session_factory: Opens a session only if the index has to be rebuilt
+            event: Event name
+
+        Returns:
+            Webhook snapshots
+        """
+        await self._refresh_if_stale(session_factory)
+        return self._by_event.get(event, ())
+
+    async def get(
+        self, session_factory: Callable[[], Session], webhook_id: UUID
+    ) -> Optional[WebhookConfig]:
+        """Get an active webhook by ID, or None if it is inactive or deleted"""
+        await self._refresh_if_stale(session_factory)
+        return self._by_id.get(webhook_id)
+
+    async def invalidate(self) -> None:
+        """Mark the index stale here and in every other worker"""
+        self._dirty = True
+        await cache.incr(SUBSCRIPTIONS_VERSION_KEY)
+
+
+# Global index instance
+webhook_subscriptions = WebhookSubscriptionIndex()
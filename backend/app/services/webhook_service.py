@@ -1,161 +1,629 @@
 """
 Webhook service for triggering external integrations
 """
-import httpx
+import asyncio
 import hmac
 import hashlib
-import json
 import logging
-from typing import Dict, Any, List
-from datetime import datetime, timezone
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Optional, Union
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
 
-from app.models.webhook import Webhook, WebhookLog, WebhookEvent
+from app.core import tracing
+from app.core.circuit_breaker import webhook_circuits
+from app.core.config import settings
+from app.core.http_client import webhook_http_client
+from app.core.metrics import WEBHOOK_DEAD_LETTERS, record_webhook_delivery
+from app.core.serialization import decompress, dumps_bytes, loads
+from app.services.webhook_batcher import webhook_batcher
+from app.services.webhook_log_writer import webhook_log_writer
+from app.services.webhook_registry import WebhookConfig, webhook_subscriptions
+from app.models.webhook import (
+    LATENCY_BUCKETS_MS,
+    Webhook,
+    WebhookLog,
+    WebhookPayload,
+    WebhookStatsHourly,
+    WebhookEvent,
+    WebhookOutbox,
+    WebhookDelivery,
+    WebhookDeadLetter,
+)
 
 logger = logging.getLogger(__name__)
 
+# Session.info flag telling the dispatcher that a commit carried outbox rows
+OUTBOX_PENDING_KEY = "webhook_outbox_pending"
 
+CIRCUIT_OPEN_ERROR = "Circuit open"
+
+
+@dataclass
+class DeliveryResult:
+    """Outcome of a single webhook HTTP delivery"""
+    success: bool
+    response_status: Optional[int] = None
+    response_body: Optional[str] = None
+    error_message: Optional[str] = None
+    duration_ms: float = 0.0
+    short_circuited: bool = False  # Not attempted: the receiver's circuit is open
+    retry_after: float = 0.0  # Seconds until a short-circuited receiver accepts a probe
+
+
+@tracing.trace_methods
 class WebhookService:
     """Service for managing and triggering webhooks"""
     
     @staticmethod
-    async def trigger_event(
+    def enqueue_event(
         db: Session,
         event: WebhookEvent,
         payload: Dict[str, Any]
-    ) -> None:
+    ) -> WebhookOutbox:
+        """
+        Stage an event in the outbox as part of the caller's transaction
+        
+        The row becomes visible to the dispatcher only when the caller
+        commits, so an event is published if and only if the change that
+        produced it is persisted. The current trace context is stored with
+        it, so the delivery continues the producing request's trace.
+        
+        Args:
+            db: Database session (not committed here)
+            event: Event type
+            payload: JSON-serializable event data
+            
+        Returns:
+            Pending outbox entry
+        """
+        entry = WebhookOutbox(
+            event=event.value,
+            payload=payload,
+            trace_context=tracing.current_traceparent(),
+        )
+        db.add(entry)
+        db.info[OUTBOX_PENDING_KEY] = True
+        return entry
+    
+    @staticmethod
+    async def trigger_event(
+        session_factory: Callable[[], Session],
+        event: WebhookEvent,
+        payload: Dict[str, Any],
+        event_id: Optional[int] = None
+    ) -> List[asyncio.Future]:
         """
         Trigger all webhooks subscribed to an event
         
+        Subscribers come from the in-process subscription index, so no query
+        is needed to find them. Deliveries run concurrently through the shared
+        HTTP client; their outcomes are written back in a single commit from
+        a worker thread, so the event loop never waits on the database.
+        Webhooks in batch mode get the event through the batcher instead.
+        
         Args:
-            db: Database session
+            session_factory: Opens the sessions used off the event loop
             event: Event type
             payload: Event data
+            event_id: Outbox sequence number, sent as the envelope `id`
+            
+        Returns:
+            Futures resolved when the batches holding the event are handled
         """
-        # Get all active webhooks subscribed to this event
-        webhooks = db.query(Webhook).filter(
-            Webhook.is_active == True,
-            Webhook.events.contains([event.value])
-        ).all()
+        webhooks = await webhook_subscriptions.subscribers(session_factory, event.value)
         
-        logger.info(f"Triggering {len(webhooks)} webhooks for event: {event.value}")
+        logger.info("Triggering %d webhooks for event: %s", len(webhooks), event.value)
+        if not webhooks:
+            return []
         
-        for webhook in webhooks:
-            await WebhookService._send_webhook(db, webhook, event.value, payload)
+        webhook_payload = {
+            "event": event.value,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "data": payload
+        }
+        if event_id is not None:
+            webhook_payload["id"] = event_id
+        
+        # Serialized once; every subscriber is sent (and signs) these bytes
+        body = dumps_bytes(webhook_payload)
+        
+        pending = [
+            webhook_batcher.add(webhook, webhook_payload, body)
+            for webhook in webhooks if webhook.batch_enabled
+        ]
+        webhooks = [webhook for webhook in webhooks if not webhook.batch_enabled]
+        if not webhooks:
+            return pending
+        
+        results = await asyncio.gather(*(
+            WebhookService._send_webhook(webhook, event.value, body)
+            for webhook in webhooks
+        ))
+        
+        await asyncio.to_thread(
+            WebhookService._apply_first_attempts,
+            session_factory, event.value, webhook_payload, list(zip(webhooks, results)), body
+        )
+        return pending
     
     @staticmethod
-    async def _send_webhook(
-        db: Session,
-        webhook: Webhook,
+    def _apply_first_attempts(
+        session_factory: Callable[[], Session],
         event: str,
-        payload: Dict[str, Any]
+        webhook_payload: Dict[str, Any],
+        outcomes: List,
+        body: bytes
     ) -> None:
+        """Record the outcomes of an event's first deliveries in one commit"""
+        db = session_factory()
+        try:
+            for webhook, result in outcomes:
+                WebhookService._apply_first_attempt(
+                    db, webhook, event, webhook_payload, result, body
+                )
+            db.commit()
+        finally:
+            db.close()
+    
+    @staticmethod
+    async def _send_webhook(
+        webhook: WebhookConfig,
+        event: str,
+        body: bytes
+    ) -> DeliveryResult:
         """
         Send webhook HTTP request
         
+        The signatures cover exactly the bytes that go on the wire.
+        `X-Webhook-Signature` is the HMAC of the body; `X-Webhook-Signature-256`
+        is `t=<unix time>,v1=<HMAC of "<t>." + body>` so receivers can also
+        reject stale or replayed requests. A `traceparent` header carries the
+        trace context to receivers that trace too.
+        
         Args:
-            db: Database session
             webhook: Webhook configuration
             event: Event name
-            payload: Event data
+            body: Serialized event envelope
+            
+        Returns:
+            Delivery outcome (short-circuited while the receiver's circuit is open)
         """
-        # Prepare payload
-        webhook_payload = {
-            "event": event,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "data": payload
-        }
+        if not await webhook_circuits.allow(webhook.url):
+            record_webhook_delivery("short_circuited")
+            return DeliveryResult(
+                success=False,
+                error_message=CIRCUIT_OPEN_ERROR,
+                short_circuited=True,
+                retry_after=await webhook_circuits.retry_after(webhook.url),
+            )
         
-        # Create HMAC signature
-        signature = WebhookService._create_signature(
-            webhook.secret,
-            json.dumps(webhook_payload)
-        )
+        timestamp = int(time.time())
         
         headers = {
             "Content-Type": "application/json",
-            "X-Webhook-Signature": signature,
+            "X-Webhook-Signature": WebhookService._create_signature(webhook.secret, body),
+            "X-Webhook-Signature-256": WebhookService._create_timestamped_signature(
+                webhook.secret, body, timestamp
+            ),
             "X-Webhook-Event": event,
         }
         
-        success = False
-        response_status = None
-        response_body = None
-        error_message = None
-        
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
+        with tracing.span(
+            "webhook.deliver",
+            kind="client",
+            **{"http.method": "POST", "http.url": webhook.url, "webhook.event": event},
+        ) as delivery_span:
+            tracing.inject(headers)
+            started = time.perf_counter()
+            try:
+                response = await webhook_http_client.post(
                     webhook.url,
-                    json=webhook_payload,
+                    content=body,
                     headers=headers
                 )
-                
-                response_status = response.status_code
-                response_body = response.text[:1000]  # Limit to 1000 chars
-                
-                if 200 <= response.status_code < 300:
-                    success = True
-                    webhook.failure_count = 0
-                    logger.info(f"Webhook {webhook.id} triggered successfully")
-                else:
-                    webhook.failure_count += 1
-                    error_message = f"HTTP {response.status_code}"
-                    logger.warning(f"Webhook {webhook.id} failed with status {response.status_code}")
-        
-        except Exception as e:
-            webhook.failure_count += 1
-            error_message = str(e)[:500]
-            logger.error(f"Webhook {webhook.id} error: {str(e)}")
+            except Exception as e:
+                logger.error("Webhook %s error: %s", webhook.id, e)
+                delivery_span.record_exception(e)
+                await webhook_circuits.record_failure(webhook.url)
+                duration = time.perf_counter() - started
+                record_webhook_delivery("network_error", duration)
+                return DeliveryResult(
+                    success=False,
+                    error_message=str(e)[:500],
+                    duration_ms=duration * 1000,
+                )
+            delivery_span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 400:
+                delivery_span.set_error(f"HTTP {response.status_code}")
+        
+        duration = time.perf_counter() - started
+        duration_ms = duration * 1000
+        success = 200 <= response.status_code < 300
+        record_webhook_delivery("success" if success else "http_error", duration)
         
+        # Only server-side trouble trips the breaker; a 4xx means the receiver is up
+        if response.status_code >= 500 or response.status_code == 429:
+            await webhook_circuits.record_failure(webhook.url)
+        else:
+            await webhook_circuits.record_success(webhook.url)
+        if success:
+            logger.debug("Webhook %s triggered successfully", webhook.id)
+        else:
+            logger.warning("Webhook %s failed with status %s", webhook.id, response.status_code)
+        
+        return DeliveryResult(
+            success=success,
+            response_status=response.status_code,
+            response_body=response.text[:1000],  # Limit to 1000 chars
+            error_message=None if success else f"HTTP {response.status_code}",
+            duration_ms=duration_ms,
+        )
+    
+    @staticmethod
+    def _record_delivery(
+        db: Session,
+        webhook: WebhookConfig,
+        event: str,
+        webhook_payload: Dict[str, Any],
+        result: DeliveryResult,
+        body: Optional[bytes] = None
+    ) -> None:
+        """
+        Apply a delivery outcome to the webhook and its log (not committed)
+        
+        Args:
+            db: Database session
+            webhook: Webhook configuration
+            event: Event name
+            webhook_payload: Event envelope that was sent
+            result: Delivery outcome
+            body: Bytes that were sent, stored once per distinct body
+        """
         # Update webhook
-        webhook.last_triggered_at = datetime.now(timezone.utc)
+        db.query(Webhook).filter(Webhook.id == webhook.id).update(
+            {
+                Webhook.failure_count: 0 if result.success else Webhook.failure_count + 1,
+                Webhook.last_triggered_at: datetime.now(timezone.utc),
+            },
+            synchronize_session=False,
+        )
+        
+        # Log webhook execution (bulk-inserted by the log writer)
+        webhook_log_writer.add(db, {
+            "webhook_id": webhook.id,
+            "event": event,
+            "response_status": result.response_status,
+            "response_body": result.response_body,
+            "success": result.success,
+            "error_message": result.error_message,
+            "latency_ms": result.duration_ms,
+        }, body if body is not None else dumps_bytes(webhook_payload))
+    
+    @staticmethod
+    def _apply_first_attempt(
+        db: Session,
+        webhook: WebhookConfig,
+        event: str,
+        webhook_payload: Dict[str, Any],
+        result: DeliveryResult,
+        body: Optional[bytes] = None
+    ) -> None:
+        """
+        Record a first delivery attempt and schedule a retry if it failed
+        
+        Short-circuited deliveries skip the log and go straight to the retry
+        queue, due when the circuit accepts a probe again.
+        """
+        if result.short_circuited:
+            WebhookService._schedule_retry(
+                db, webhook, event, webhook_payload, result.error_message,
+                attempts=0, delay=WebhookService._circuit_delay(result)
+            )
+            return
+        
+        WebhookService._record_delivery(db, webhook, event, webhook_payload, result, body)
+        if not result.success:
+            WebhookService._schedule_retry(
+                db, webhook, event, webhook_payload, result.error_message
+            )
+    
+    @staticmethod
+    def _circuit_delay(result: DeliveryResult) -> float:
+        """Delay until the receiver's circuit reopens, jittered to spread the backlog"""
+        return result.retry_after + random.uniform(
+            0, settings.WEBHOOK_RETRY_BASE_SECONDS
+        )
+    
+    @staticmethod
+    def compute_backoff(attempts: int) -> float:
+        """
+        Delay before the next attempt: exponential with jitter
         
-        # Disable webhook if too many failures
-        if webhook.failure_count >= 10:
-            webhook.is_active = False
-            logger.warning(f"Webhook {webhook.id} disabled due to {webhook.failure_count} failures")
+        The delay doubles per attempt up to WEBHOOK_RETRY_MAX_SECONDS; half of
+        it is randomized so retries from one outage do not arrive in lockstep.
         
-        # Log webhook execution
-        log = WebhookLog(
+        Args:
+            attempts: Attempts made so far (>= 1)
+            
+        Returns:
+            Delay in seconds
+        """
+        delay = min(
+            settings.WEBHOOK_RETRY_MAX_SECONDS,
+            settings.WEBHOOK_RETRY_BASE_SECONDS * (2 ** (attempts - 1)),
+        )
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    @staticmethod
+    def _schedule_retry(
+        db: Session,
+        webhook: WebhookConfig,
+        event: str,
+        webhook_payload: Dict[str, Any],
+        error_message: Optional[str],
+        attempts: int = 1,
+        delay: Optional[float] = None
+    ) -> WebhookDelivery:
+        """Create retry state for a failed first attempt (not committed)"""
+        if delay is None:
+            delay = WebhookService.compute_backoff(attempts)
+        delivery = WebhookDelivery(
             webhook_id=webhook.id,
             event=event,
             payload=webhook_payload,
-            response_status=response_status,
-            response_body=response_body,
-            success=success,
-            error_message=error_message
+            attempts=attempts,
+            last_error=error_message,
+            next_attempt_at=datetime.now(timezone.utc) + timedelta(seconds=delay),
         )
+        db.add(delivery)
+        return delivery
+    
+    @staticmethod
+    def _reschedule_or_dead_letter(
+        db: Session,
+        delivery: WebhookDelivery,
+        error_message: Optional[str]
+    ) -> None:
+        """Record another failed attempt, dead-lettering once attempts run out"""
+        delivery.attempts += 1
+        delivery.last_error = error_message
+        
+        if delivery.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            WebhookService._dead_letter(db, delivery, error_message)
+            return
+        
+        delivery.next_attempt_at = datetime.now(timezone.utc) + timedelta(
+            seconds=WebhookService.compute_backoff(delivery.attempts)
+        )
+    
+    @staticmethod
+    def _defer_for_circuit(delivery: WebhookDelivery, result: DeliveryResult) -> None:
+        """Push a short-circuited retry past the cooldown without using an attempt"""
+        delivery.next_attempt_at = datetime.now(timezone.utc) + timedelta(
+            seconds=WebhookService._circuit_delay(result)
+        )
+    
+    @staticmethod
+    def _dead_letter(
+        db: Session,
+        delivery: WebhookDelivery,
+        error_message: Optional[str]
+    ) -> WebhookDeadLetter:
+        """Move a delivery to the dead-letter table (not committed)"""
+        dead_letter = WebhookDeadLetter(
+            webhook_id=delivery.webhook_id,
+            event=delivery.event,
+            payload=delivery.payload,
+            attempts=delivery.attempts,
+            last_error=error_message,
+            first_attempt_at=delivery.created_at,
+        )
+        db.add(dead_letter)
+        db.delete(delivery)
+        WEBHOOK_DEAD_LETTERS.inc()
+        logger.warning(
+            "Webhook %s delivery of %s dead-lettered after %d attempts",
+            delivery.webhook_id, delivery.event, delivery.attempts
+        )
+        return dead_letter
+    
+    @staticmethod
+    def replay_dead_letters(
+        db: Session,
+        webhook_id=None,
+        event: Optional[str] = None,
+        limit: int = 1000,
+        batch_size: int = 50,
+        batch_interval_seconds: float = 10.0
+    ) -> Dict[str, int]:
+        """
+        Requeue dead-lettered deliveries in throttled batches
+        
+        Each batch of `batch_size` entries becomes due `batch_interval_seconds`
+        after the previous one, so a recovered receiver is not flooded.
+        
+        Args:
+            db: Database session
+            webhook_id: Only replay entries of this webhook
+            event: Only replay entries of this event
+            limit: Maximum entries to replay
+            batch_size: Entries per batch
+            batch_interval_seconds: Delay between batches
+            
+        Returns:
+            Counts of replayed entries and batches
+        """
+        query = db.query(WebhookDeadLetter).filter(WebhookDeadLetter.replayed_at.is_(None))
+        if webhook_id:
+            query = query.filter(WebhookDeadLetter.webhook_id == webhook_id)
+        if event:
+            query = query.filter(WebhookDeadLetter.event == event)
+        
+        dead_letters = query.order_by(WebhookDeadLetter.dead_at).limit(limit).all()
+        
+        now = datetime.now(timezone.utc)
+        for index, dead_letter in enumerate(dead_letters):
+            batch = index // batch_size
+            db.add(WebhookDelivery(
+                webhook_id=dead_letter.webhook_id,
+                event=dead_letter.event,
+                payload=dead_letter.payload,
+                attempts=0,
+                next_attempt_at=now + timedelta(seconds=batch * batch_interval_seconds),
+            ))
+            dead_letter.replayed_at = now
         
-        db.add(log)
         db.commit()
+        
+        batches = (len(dead_letters) + batch_size - 1) // batch_size
+        logger.info("Replaying %d dead-lettered deliveries in %d batches", len(dead_letters), batches)
+        return {"replayed": len(dead_letters), "batches": batches}
     
     @staticmethod
-    def _create_signature(secret: str, payload: str) -> str:
+    def get_stats(db: Session, webhook_id, hours: int = 24) -> Dict[str, Any]:
+        """
+        Delivery stats of a webhook from the pre-aggregated hourly table
+        
+        Latency percentiles are interpolated within the histogram buckets.
+        
+        Args:
+            db: Database session
+            webhook_id: Webhook ID
+            hours: Window size in hours, counting the current hour
+            
+        Returns:
+            Totals, success rate, latency percentiles and hourly buckets
+        """
+        since = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(
+            hours=hours - 1
+        )
+        buckets = (
+            db.query(WebhookStatsHourly)
+            .filter(
+                WebhookStatsHourly.webhook_id == webhook_id,
+                WebhookStatsHourly.bucket_start >= since,
+            )
+            .order_by(WebhookStatsHourly.bucket_start)
+            .all()
+        )
+        
+        columns = WebhookStatsHourly.histogram_columns()
+        histogram = [sum(getattr(bucket, column) for bucket in buckets) for column in columns]
+        deliveries = sum(bucket.deliveries for bucket in buckets)
+        successes = sum(bucket.successes for bucket in buckets)
+        latency_total = sum(bucket.latency_total_ms for bucket in buckets)
+        timed = sum(histogram)
+        
+        return {
+            "webhook_id": webhook_id,
+            "window_hours": hours,
+            "deliveries": deliveries,
+            "successes": successes,
+            "success_rate": successes / deliveries if deliveries else None,
+            "latency_avg_ms": latency_total / timed if timed else None,
+            "latency_p50_ms": WebhookService._histogram_percentile(histogram, 0.50),
+            "latency_p95_ms": WebhookService._histogram_percentile(histogram, 0.95),
+            "hourly": [
+                {
+                    "bucket_start": bucket.bucket_start,
+                    "deliveries": bucket.deliveries,
+                    "successes": bucket.successes,
+                }
+                for bucket in buckets
+            ],
+        }
+    
+    @staticmethod
+    def get_log_payloads(db: Session, logs: List[WebhookLog]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Envelopes recorded for log entries, with their stored payloads loaded in one query
+        
+        Args:
+            db: Database session
+            logs: Webhook logs
+            
+        Returns:
+            Decoded envelope of each log, None where its payload has been purged
+        """
+        hashes = {log.payload_hash for log in logs if log.payload_hash is not None}
+        envelopes: Dict[str, Dict[str, Any]] = {}
+        if hashes:
+            for stored in db.query(WebhookPayload).filter(WebhookPayload.hash.in_(hashes)):
+                envelopes[stored.hash] = loads(decompress(stored.encoding, stored.data))
+        
+        return [
+            log.payload if log.payload_hash is None else envelopes.get(log.payload_hash)
+            for log in logs
+        ]
+    
+    @staticmethod
+    def _histogram_percentile(counts: List[int], quantile: float) -> Optional[float]:
+        """Estimate a percentile from LATENCY_BUCKETS_MS bucket counts"""
+        total = sum(counts)
+        if not total:
+            return None
+        
+        rank = quantile * total
+        cumulative = 0
+        lower = 0.0
+        for index, count in enumerate(counts):
+            if index == len(LATENCY_BUCKETS_MS):
+                # Overflow bucket has no upper bound
+                return float(lower)
+            upper = float(LATENCY_BUCKETS_MS[index])
+            if count and cumulative + count >= rank:
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = upper
+        return float(lower)
+    
+    @staticmethod
+    def _create_signature(secret: str, payload: Union[str, bytes]) -> str:
         """
         Create HMAC signature for webhook
         
         Args:
             secret: Webhook secret
-            payload: JSON payload string
+            payload: JSON payload (bytes as sent, or string)
             
         Returns:
             HMAC signature
         """
+        if isinstance(payload, str):
+            payload = payload.encode()
         return hmac.new(
             secret.encode(),
-            payload.encode(),
+            payload,
             hashlib.sha256
         ).hexdigest()
     
     @staticmethod
-    def verify_signature(secret: str, payload: str, signature: str) -> bool:
+    def _create_timestamped_signature(secret: str, body: bytes, timestamp: int) -> str:
+        """
+        Create the `t=...,v1=...` signature header value
+        
+        Args:
+            secret: Webhook secret
+            body: Request body as sent
+            timestamp: Unix time of the request
+            
+        Returns:
+            Signature header value
+        """
+        digest = WebhookService._create_signature(secret, b"%d." % timestamp + body)
+        return f"t={timestamp},v1={digest}"
+    
+    @staticmethod
+    def verify_signature(secret: str, payload: Union[str, bytes], signature: str) -> bool:
         """
         Verify webhook signature
         
         Args:
             secret: Webhook secret
-            payload: JSON payload string
+            payload: JSON payload (bytes as received, or string)
             signature: Provided signature
             
         Returns:
@@ -164,6 +632,44 @@ class WebhookService:
         expected_signature = WebhookService._create_signature(secret, payload)
         return hmac.compare_digest(expected_signature, signature)
     
+    @staticmethod
+    def verify_timestamped_signature(
+        secret: str,
+        body: bytes,
+        header: str,
+        tolerance_seconds: Optional[int] = None,
+        now: Optional[float] = None
+    ) -> bool:
+        """
+        Verify an `X-Webhook-Signature-256` header
+        
+        Args:
+            secret: Webhook secret
+            body: Request body as received
+            header: Header value (`t=<unix time>,v1=<hex digest>`)
+            tolerance_seconds: Maximum accepted age of the signature
+            now: Current unix time (defaults to the clock)
+            
+        Returns:
+            True if the signature matches and is recent enough
+        """
+        if tolerance_seconds is None:
+            tolerance_seconds = settings.WEBHOOK_SIGNATURE_TOLERANCE_SECONDS
+        
+        try:
+            parts = dict(item.split("=", 1) for item in header.split(","))
+            timestamp = int(parts["t"])
+            signature = parts["v1"]
+        except (KeyError, ValueError):
+            return False
+        
+        current = time.time() if now is None else now
+        if abs(current - timestamp) > tolerance_seconds:
+            return False
+        
+        expected = WebhookService._create_timestamped_signature(secret, body, timestamp)
+        return hmac.compare_digest(expected, f"t={timestamp},v1={signature}")
+    
     @staticmethod
     def create_webhook(
         db: Session,
@@ -171,7 +677,11 @@ class WebhookService:
         url: str,
         events: List[str],
         created_by: str,
-        secret: str = None
+        secret: str = None,
+        batch_enabled: bool = False,
+        batch_max_events: int = 100,
+        batch_max_bytes: int = 262144,
+        batch_linger_ms: int = 1000
     ) -> Webhook:
         """
         Create a new webhook
@@ -183,9 +693,13 @@ class WebhookService:
             events: List of event types
             created_by: User ID who created it
             secret: Optional secret (will be generated if not provided)
+            batch_enabled: Aggregate events into batched POSTs
+            batch_max_events: Flush a batch at this many events
+            batch_max_bytes: Flush a batch at this serialized size
+            batch_linger_ms: Flush a batch once its oldest event is this old
             
         Returns:
-            Created webhook
+            Created webhook (callers await `webhook_subscriptions.invalidate()`)
         """
         import secrets
         
@@ -197,13 +711,17 @@ class WebhookService:
             url=url,
             secret=secret,
             events=events,
-            created_by=created_by
+            created_by=created_by,
+            batch_enabled=batch_enabled,
+            batch_max_events=batch_max_events,
+            batch_max_bytes=batch_max_bytes,
+            batch_linger_ms=batch_linger_ms
         )
         
         db.add(webhook)
         db.commit()
         db.refresh(webhook)
         
-        logger.info(f"Webhook created: {webhook.id} - {name}")
+        logger.info("Webhook created: %s - %s", webhook.id, name)
         
         return webhook
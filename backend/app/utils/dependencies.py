@@ -4,11 +4,13 @@ from sqlalchemy.orm import Session
 
 from app.core.security import decode_token
 from app.core.database import get_db
+from app.core.tracing import traced
 from app.services.user_service import UserService
 
 security = HTTPBearer()
 
 
+@traced("auth.get_current_user")
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -0,0 +1 @@
+"""Micro-benchmarks, run as modules from the backend directory (python -m benchmarks.<name>)"""
@@ -0,0 +1,82 @@
+"""
+Cache codec benchmark
+
+Compares the plain JSON codec (the original format; types are lost) with
+the typed codec on a cached access history page, with and without
+compression, reporting frame size and encode/decode time.
+
+Usage:
+    python -m benchmarks.cache_codec --rows 100 --rounds 2000
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.core import cache_codec
+from app.core.config import settings
+from app.models.access_record import AccessType
+from app.schemas.device import DeviceResponse
+
+
+def _history(rows: int) -> list:
+    now = datetime(2026, 1, 1, 8, 0, tzinfo=timezone.utc)
+    device = DeviceResponse(
+        id=uuid.uuid4(),
+        user_id=uuid.uuid4(),
+        name="MacBook Pro",
+        device_type="laptop",
+        serial_number="C02AB123DE45",
+        qr_data=str(uuid.uuid4()),
+        created_at=now,
+        updated_at=now,
+    )
+    return [
+        {
+            "id": uuid.uuid4(),
+            "device": device,
+            "access_type": AccessType.SALIDA if i % 2 else AccessType.ENTRADA,
+            "location": "Puerta Norte",
+            "timestamp": now + timedelta(minutes=i),
+        }
+        for i in range(rows)
+    ]
+
+
+def _timed(rounds: int, operation) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        operation()
+    return (time.perf_counter() - started) / rounds
+
+
+def run(rows: int, rounds: int) -> None:
+    value = _history(rows)
+    default_threshold = settings.CACHE_COMPRESS_THRESHOLD
+
+    print(f"{rows} history rows, {rounds} rounds")
+    for codec in ("json", "typed"):
+        for label, threshold in (("plain", 1 << 30), ("compressed", default_threshold)):
+            settings.CACHE_COMPRESS_THRESHOLD = threshold
+            frame = cache_codec.encode(value, codec)
+            encode = _timed(rounds, lambda: cache_codec.encode(value, codec))
+            decode = _timed(rounds, lambda: cache_codec.decode(frame))
+            exact = cache_codec.decode(frame) == value
+            print(
+                f"  {codec:<6} {label:<11} {len(frame):8d} bytes"
+                f"  encode {encode * 1e6:8.1f} us  decode {decode * 1e6:8.1f} us"
+                f"  types kept: {'yes' if exact else 'no'}"
+            )
+    settings.CACHE_COMPRESS_THRESHOLD = default_threshold
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.rows, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Email template render benchmark
+
+Compares rendering a notification through a Jinja environment created per
+email (templates parsed and compiled every time), through a default
+environment (compiled once, but its loader stats the files on every
+lookup) and through the precompiled EmailTemplates registry.
+
+Usage:
+    python -m benchmarks.email_templates --renders 2000 --scans 20
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+from app.core.email_templates import EmailTemplates, _Catalog
+
+CONTEXTS = {
+    "password_reset": lambda scans: {
+        "full_name": "Ana Mora",
+        "reset_link": "http://localhost:8081/reset-password?token=abc123",
+        "expire_minutes": 30,
+    },
+    "access_alert": lambda scans: {
+        "full_name": "Ana Mora",
+        "scans": [
+            {
+                "device_name": f"Laptop {i}",
+                "access_type": "salida" if i % 2 else "entrada",
+                "location": "Puerta Norte",
+                "timestamp": datetime(2026, 1, 1, 8, i % 60, tzinfo=timezone.utc),
+            }
+            for i in range(scans)
+        ],
+    },
+}
+
+
+def _render_parts(environment, name: str, context: dict) -> None:
+    for part in ("subject.txt", "html", "txt"):
+        environment.get_template(f"{name}.{part}").render(context, locale="es", year=2026)
+
+
+def _timed(renders: int, render) -> float:
+    started = time.perf_counter()
+    for _ in range(renders):
+        render()
+    return time.perf_counter() - started
+
+
+def run(renders: int, scans: int) -> None:
+    registry = EmailTemplates()
+    registry.load()
+
+    for name, build_context in CONTEXTS.items():
+        context = build_context(scans)
+
+        def per_email():
+            _render_parts(registry._environment(_Catalog()), name, context)
+
+        shared = registry._environment(_Catalog())
+        shared.auto_reload = True
+
+        def default_environment():
+            _render_parts(shared, name, context)
+
+        def precompiled():
+            registry.render(name, "es", **context)
+
+        per_email_renders = max(1, renders // 20)
+        timings = [
+            ("environment per email", per_email_renders, _timed(per_email_renders, per_email)),
+            ("default environment", renders, _timed(renders, default_environment)),
+            ("precompiled registry", renders, _timed(renders, precompiled)),
+        ]
+        print(f"{name}:")
+        for label, count, elapsed in timings:
+            print(f"  {label:<22} {count / elapsed:10.1f} emails/s  {elapsed / count * 1e6:8.1f} us/email")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--renders", type=int, default=2000)
+    parser.add_argument("--scans", type=int, default=20, help="rows in the access_alert digest")
+    args = parser.parse_args()
+    run(args.renders, args.scans)
+
+
+if __name__ == "__main__":
+    main()
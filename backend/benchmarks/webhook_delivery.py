@@ -0,0 +1,99 @@
+"""
+Webhook delivery throughput benchmark
+
+Compares the old delivery strategy (a fresh httpx.AsyncClient per delivery,
+subscribers awaited one after another) with the pooled, concurrent client.
+Both run against a local keep-alive HTTP stub, optionally with simulated
+receiver latency.
+
+Usage:
+    python -m benchmarks.webhook_delivery --events 50 --subscribers 10 --latency-ms 5
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+
+from app.core.http_client import webhook_http_client
+from app.core.serialization import dumps_bytes
+from app.models.webhook import Webhook
+from app.services.webhook_service import WebhookService
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, latency: float):
+    """Minimal HTTP/1.1 keep-alive handler answering 200 to every request"""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            if latency:
+                await asyncio.sleep(latency)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: keep-alive\r\n\r\nok")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _legacy_deliver(webhook: Webhook, webhook_payload: dict) -> None:
+    """Delivery as it worked before the shared client"""
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        await client.post(webhook.url, json=webhook_payload)
+
+
+async def run(events: int, subscribers: int, latency_ms: float) -> None:
+    server = await asyncio.start_server(
+        lambda r, w: _handle(r, w, latency_ms / 1000), "127.0.0.1", 0
+    )
+    port = server.sockets[0].getsockname()[1]
+    webhooks = [
+        Webhook(id=uuid.uuid4(), url=f"http://127.0.0.1:{port}/hook/{i}", secret="bench-secret")
+        for i in range(subscribers)
+    ]
+    envelope = {"event": "access.recorded", "timestamp": "2026-01-01T00:00:00+00:00",
+                "data": {"device_id": str(uuid.uuid4()), "location": "Puerta Entrada"}}
+    body = dumps_bytes(envelope)
+    total = events * subscribers
+
+    async with server:
+        started = time.perf_counter()
+        for _ in range(events):
+            for webhook in webhooks:
+                await _legacy_deliver(webhook, envelope)
+        legacy = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(events):
+            await asyncio.gather(*(
+                WebhookService._send_webhook(webhook, "access.recorded", body)
+                for webhook in webhooks
+            ))
+        pooled = time.perf_counter() - started
+        await webhook_http_client.close()
+
+    print(f"payload bytes: {len(json.dumps(envelope))}, deliveries: {total}")
+    print(f"legacy (client per delivery, sequential): {total / legacy:8.1f} deliveries/s")
+    print(f"pooled (shared client, concurrent):       {total / pooled:8.1f} deliveries/s")
+    print(f"speedup: {legacy / pooled:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--subscribers", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.events, args.subscribers, args.latency_ms))
+
+
+if __name__ == "__main__":
+    main()
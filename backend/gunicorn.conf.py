@@ -0,0 +1,26 @@
+"""
+Gunicorn settings (read automatically when gunicorn starts in backend/)
+
+Each worker keeps its own Prometheus values, so workers write them to files
+in PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them. The directory is
+emptied when the master starts, and an exited worker's live gauges are
+dropped so they do not linger in the totals.
+"""
+import glob
+import os
+
+from prometheus_client import multiprocess
+
+# Must be set before workers import the app
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+
+
+def on_starting(server):
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,15 +1,27 @@
 """
 Pytest configuration and fixtures
 """
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
 from app.core.database import Base, get_db
 from app.core.config import settings
+from app.core.query_tracker import QueryStats
+from app.core.redis_cache import cache
+
+# Background workers talk to the real database; tests drive them explicitly
+settings.WEBHOOK_DISPATCHER_ENABLED = False
+settings.EMAIL_QUEUE_ENABLED = False
+settings.NOTIFICATIONS_ENABLED = False
+
+# A request repeating one statement shape (an N+1 loop) fails the test
+settings.SQL_REPEAT_MODE = "raise"
 
 # Test database setup (in-memory SQLite)
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -23,6 +35,14 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Start every test without cached values (the in-process fallback outlives tests)"""
+    cache.fallback.clear()
+    cache.local.clear()
+    yield
+
+
 @pytest.fixture(scope="function")
 def db():
     """Create a fresh database for each test"""
@@ -35,6 +55,12 @@ def db():
         Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture
+def session_factory(db):
+    """Session factory bound to the test database, for background workers"""
+    return TestingSessionLocal
+
+
 @pytest.fixture(scope="function")
 def client(db):
     """Create a test client with database override"""
@@ -52,6 +78,35 @@ def client(db):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def query_budget(db):
+    """
+    Fail when a block runs more statements than allowed
+
+        with query_budget(2):
+            client.get("/api/access/history")
+    """
+    engine = db.get_bind()
+
+    @contextmanager
+    def budget(max_queries: int):
+        stats = QueryStats()
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            stats.record(statement, 0.0)
+
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            yield stats
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+        assert stats.count <= max_queries, (
+            f"Query budget of {max_queries} exceeded: {stats.describe()}"
+        )
+
+    return budget
+
+
 @pytest.fixture
 def test_user_data():
     """Sample user data for testing"""
@@ -93,3 +148,22 @@ def authenticated_client(client, test_user_data):
     client.headers = {"Authorization": f"Bearer {token}"}
     
     return client
+
+
+@pytest.fixture
+def admin_client(client):
+    """Create a client authenticated as an admin user"""
+    admin_data = {
+        "email": "admin@example.com",
+        "password": "Admin123!@#",
+        "full_name": "Admin User",
+        "student_id": "ADMIN001",
+        "role": "admin"
+    }
+    response = client.post("/api/auth/register", json=admin_data)
+    assert response.status_code == 201
+
+    token = response.json()["access_token"]
+    client.headers = {"Authorization": f"Bearer {token}"}
+
+    return client
@@ -0,0 +1,772 @@
+"""
+Unit tests for the Redis cache layer
+"""
+import asyncio
+import enum
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+import redis
+from fastapi import status
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.core import cache_codec
+from app.core.cache_invalidation import invalidate_on_commit
+from app.core.config import settings
+from app.core.redis_cache import CacheTier, RedisCache, SyncRedisCache, cache, cached, sync_cache
+from app.core.security import hash_password
+from app.main import app
+from app.models.access_record import AccessType
+from app.models.device import Device
+from app.models.user import User
+from app.schemas.device import DeviceResponse
+from app.services.access_service import AccessService
+from app.utils.dependencies import get_current_user
+
+
+@pytest.fixture
+def redis_cache(monkeypatch):
+    """Global async cache backed by an in-memory fake Redis"""
+    client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())
+    monkeypatch.setattr(cache, "redis_client", client)
+    monkeypatch.setattr(cache, "enabled", True)
+    return cache
+
+
+class Shade(enum.Enum):
+    """Enum defined outside the app package"""
+    DARK = "dark"
+
+
+class FailingClient:
+    """Client whose every command times out"""
+
+    def __getattr__(self, name):
+        async def command(*args, **kwargs):
+            raise redis.exceptions.TimeoutError("Timeout reading from socket")
+        return command
+
+
+class TestRedisCache:
+    """Test the async cache client"""
+
+    async def test_set_and_get(self, redis_cache):
+        """Values round-trip through JSON"""
+        assert await redis_cache.set("user:1", {"name": "Ana", "devices": 2}, ttl=60)
+
+        assert await redis_cache.get("user:1") == {"name": "Ana", "devices": 2}
+        assert await redis_cache.redis_client.ttl("user:1") == 60
+
+    async def test_many_keys_in_one_round_trip(self, redis_cache):
+        """set_many pipelines and get_many leaves misses out"""
+        assert await redis_cache.set_many({"a": 1, "b": [2]}, ttl=30)
+
+        assert await redis_cache.get_many(["a", "missing", "b"]) == {"a": 1, "b": [2]}
+        assert await redis_cache.redis_client.ttl("b") == 30
+
+    async def test_delete_several_keys(self, redis_cache):
+        """delete accepts several keys"""
+        await redis_cache.set_many({"a": 1, "b": 2, "c": 3})
+
+        await redis_cache.delete("a", "b")
+
+        assert await redis_cache.get_many(["a", "b", "c"]) == {"c": 3}
+
+    async def test_timeouts_degrade_to_misses(self, monkeypatch):
+        """A slow Redis behaves like an empty cache"""
+        monkeypatch.setattr(settings, "CACHE_FAILOVER_ERRORS", 100)
+        monkeypatch.setattr(cache, "redis_client", FailingClient())
+        monkeypatch.setattr(cache, "enabled", True)
+
+        assert await cache.get("key") is None
+        assert await cache.get_many(["key"]) == {}
+        assert not await cache.set("key", 1)
+        assert not await cache.set_many({"key": 1})
+        assert not await cache.ping()
+        assert cache.backend == "redis"
+
+    async def test_connect_failure_disables_cache(self, monkeypatch):
+        """An unreachable server leaves the cache disabled"""
+        monkeypatch.setattr(settings, "REDIS_URL", "redis://127.0.0.1:1/0")
+        unreachable = RedisCache()
+
+        await unreachable.connect()
+
+        assert not unreachable.enabled
+        assert unreachable.backend == "memory"
+        assert await unreachable.get("key") is None
+        assert unreachable.pool.max_connections == settings.REDIS_MAX_CONNECTIONS
+        assert unreachable.pool.connection_kwargs["socket_timeout"] == settings.REDIS_SOCKET_TIMEOUT
+        await unreachable.disconnect()
+
+
+class TestCachedDecorator:
+    """Test the cached decorator"""
+
+    async def test_result_is_cached(self, redis_cache):
+        """The wrapped function runs once per key"""
+        calls = []
+
+        @cached(ttl=60, key_builder=lambda user_id: f"devices:user:{user_id}")
+        async def list_devices(user_id):
+            calls.append(user_id)
+            return [{"id": str(uuid.uuid4())}]
+
+        first = await list_devices("u1")
+        second = await list_devices("u1")
+
+        assert first == second
+        assert calls == ["u1"]
+        assert (await redis_cache.get("devices:user:u1"))["value"] == first
+
+    async def test_disabled_cache_uses_fallback(self, monkeypatch):
+        """Without Redis results are cached in process"""
+        monkeypatch.setattr(cache, "enabled", False)
+        calls = []
+
+        @cached(ttl=60, key_prefix="test:")
+        def compute(value):
+            calls.append(value)
+            return value * 2
+
+        assert await compute(2) == 4
+        assert await compute(2) == 4
+        assert calls == [2]
+
+
+    async def test_concurrent_misses_compute_once(self, redis_cache):
+        """Callers missing the same key share one load"""
+        calls = []
+
+        @cached(ttl=60, key_prefix="test:")
+        async def history(device_id):
+            calls.append(device_id)
+            await asyncio.sleep(0.05)
+            return [device_id]
+
+        results = await asyncio.gather(*(history("d1") for _ in range(10)))
+
+        assert calls == ["d1"]
+        assert results == [["d1"]] * 10
+
+    async def test_waits_for_other_process_lock(self, redis_cache):
+        """A miss while another process holds the fill lock reuses its result"""
+        calls = []
+
+        @cached(ttl=60, key_builder=lambda: "report", beta=0)
+        async def report():
+            calls.append(1)
+            return "computed here"
+
+        token = await redis_cache.acquire_lock("report", 5)
+
+        async def other_process_fills():
+            await asyncio.sleep(0.1)
+            await redis_cache.set("report", {
+                "__cached__": 1, "value": "computed there", "delta": 0.1, "expires": time.time() + 60
+            })
+            await redis_cache.release_lock("report", token)
+
+        filler = asyncio.create_task(other_process_fills())
+        assert await report() == "computed there"
+        await filler
+        assert calls == []
+
+    async def test_stale_value_served_while_refreshing(self, redis_cache):
+        """Expired entries within stale_ttl are returned and refreshed behind the caller"""
+        version = iter(["v1", "v2"])
+
+        @cached(ttl=60, stale_ttl=60, key_builder=lambda: "dashboard", beta=0)
+        async def dashboard():
+            return next(version)
+
+        assert await dashboard() == "v1"
+        entry = await redis_cache.get("dashboard")
+        await redis_cache.set("dashboard", {**entry, "expires": time.time() - 1})
+
+        assert await dashboard() == "v1"
+        await asyncio.sleep(0.05)
+        assert await dashboard() == "v2"
+
+    async def test_loads_use_own_session_in_a_thread(self, redis_cache, session_factory):
+        """Loads and refreshes never use the caller's session, even once it is closed"""
+        loads = []
+
+        @cached(ttl=60, stale_ttl=60, key_builder=lambda db: "count", beta=0)
+        def count(db):
+            loads.append((db, threading.get_ident()))
+            return db.execute(text("SELECT 1")).scalar() + len(loads)
+
+        request_db = session_factory()
+        assert await count(request_db) == 2
+        request_db.close()
+
+        entry = await redis_cache.get("count")
+        await redis_cache.set("count", {**entry, "expires": time.time() - 1})
+        assert await count(request_db) == 2
+        await asyncio.sleep(0.05)
+        assert await count(request_db) == 3
+
+        assert not request_db.in_transaction()
+        for load_db, thread in loads:
+            assert load_db is not request_db
+            assert load_db.get_bind() is request_db.get_bind()
+            assert not load_db.in_transaction()
+            assert thread != threading.get_ident()
+
+    async def test_early_refresh(self, redis_cache):
+        """A high beta refreshes fresh entries ahead of expiry"""
+        calls = []
+
+        @cached(ttl=60, key_builder=lambda: "hot", beta=1e9)
+        async def hot():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        assert await hot() == 1
+        assert await hot() == 1
+        await asyncio.sleep(0.05)
+        assert len(calls) == 2
+
+    async def test_negative_results_cached(self, redis_cache):
+        """None is cached only when negative_ttl is set"""
+        calls = []
+
+        @cached(ttl=60, key_prefix="test:", negative_ttl=30)
+        async def find(serial):
+            calls.append(serial)
+            return None
+
+        @cached(ttl=60, key_prefix="test:")
+        async def find_uncached(serial):
+            calls.append(serial)
+            return None
+
+        assert await find("missing") is None
+        assert await find("missing") is None
+        assert await find_uncached("gone") is None
+        assert await find_uncached("gone") is None
+
+        assert calls == ["missing", "gone", "gone"]
+        assert await redis_cache.redis_client.ttl("test:find:missing:") == 30
+
+    async def test_lock_release_needs_token(self, redis_cache):
+        """Only the holder releases a fill lock"""
+        token = await redis_cache.acquire_lock("key", 5)
+
+        assert await redis_cache.acquire_lock("key", 5) is None
+        await redis_cache.release_lock("key", "someone-else")
+        assert await redis_cache.acquire_lock("key", 5) is None
+        await redis_cache.release_lock("key", token)
+        assert await redis_cache.acquire_lock("key", 5)
+
+
+class TestFallbackBackend:
+    """Test serving from process memory while Redis is down"""
+
+    async def test_repeated_errors_fail_over(self, monkeypatch):
+        """Consecutive errors switch to the fallback, which serves writes"""
+        monkeypatch.setattr(settings, "CACHE_RECONNECT_INTERVAL", 60)
+        degraded = RedisCache()
+        degraded.redis_client = FailingClient()
+        degraded.enabled = True
+
+        for _ in range(settings.CACHE_FAILOVER_ERRORS):
+            assert await degraded.get("key") is None
+
+        assert degraded.backend == "memory"
+        assert degraded.stats()["failovers"] == 1
+        assert await degraded.set("key", {"a": 1})
+        assert await degraded.get("key") == {"a": 1}
+        degraded._reconnect.cancel()
+
+    async def test_fallback_tags_are_precise(self, monkeypatch):
+        """Tag invalidation only drops tagged fallback entries"""
+        offline = RedisCache()
+
+        await offline.set("devices:user:1", [1], tags=["user:1"])
+        await offline.set("devices:user:2", [2], tags=["user:2"])
+
+        assert await offline.invalidate_tags("user:1") == 1
+        assert await offline.get_many(["devices:user:1", "devices:user:2"]) == {"devices:user:2": [2]}
+        assert await offline.incr("counter") == 1
+        assert await offline.incr("counter") == 2
+
+    async def test_fallback_entries_short_lived(self, monkeypatch):
+        """Fallback entries expire after CACHE_FALLBACK_TTL at most"""
+        offline = RedisCache()
+        offline.fallback.max_ttl = 0.05
+
+        await offline.set("key", 1, ttl=300)
+        await asyncio.sleep(0.06)
+
+        assert await offline.get("key") is None
+
+    async def test_reconnect_replays_missed_writes(self, monkeypatch):
+        """Recovery drops Redis entries changed during the outage, then switches back"""
+        monkeypatch.setattr(settings, "CACHE_RECONNECT_INTERVAL", 0.01)
+        recovering = RedisCache()
+        recovering.redis_client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())
+        recovering.enabled = True
+        await recovering.set("devices:user:1", ["old"], tags=["user:1"])
+        await recovering.set("device:2", "old")
+        await recovering.set("untouched", "kept")
+        recovering._fail_over(ConnectionError("down"))
+
+        await recovering.invalidate_tags("user:1")
+        await recovering.set("device:2", "new")
+        await asyncio.sleep(0.1)
+
+        assert recovering.backend == "redis"
+        assert await recovering.get_many(["devices:user:1", "device:2", "untouched"]) == {"untouched": "kept"}
+        assert len(recovering.fallback) == 0
+        await recovering.disconnect()
+
+    def test_sync_invalidation_reaches_fallback(self, db, student):
+        """Commit-time invalidation evicts fallback entries when Redis is down"""
+        cache.fallback.set_many({"devices:user:x": b"cached"}, 60)
+        cache.fallback.tag(["devices:user:x"], [f"devices:user:{student.id}"])
+
+        invalidate_on_commit(db, f"devices:user:{student.id}")
+        db.commit()
+
+        assert cache.fallback.get("devices:user:x") is None
+
+    def test_health_reports_backend(self, client):
+        """/health shows which backend serves the cache"""
+        body = client.get("/health").json()
+
+        assert body["checks"]["cache"] == "fallback"
+        assert body["cache_stats"]["backend"] == "memory"
+
+
+class TestCacheCodec:
+    """Test the typed, compressed value frames"""
+
+    def test_types_round_trip(self):
+        """UUIDs, datetimes, enums and models come back with their types"""
+        now = datetime.now(timezone.utc)
+        device = DeviceResponse(
+            id=uuid.uuid4(), user_id=uuid.uuid4(), name="Laptop", device_type="laptop",
+            serial_number="SN-1", qr_data="qr", created_at=now, updated_at=now,
+        )
+        value = {
+            "device": device,
+            "owner": uuid.uuid4(),
+            "last_access": (AccessType.SALIDA, now),
+            "amount": Decimal("1.10"),
+            "ids": {1, 2},
+            5: "int key",
+            "__type__": "not a tag",
+        }
+
+        decoded = cache_codec.decode(cache_codec.encode(value))
+
+        assert decoded == value
+        assert isinstance(decoded["device"], DeviceResponse)
+        assert decoded["last_access"][0] is AccessType.SALIDA
+
+    def test_only_app_classes_rebuilt(self):
+        """Class paths outside the app package are never imported from cached data"""
+        with pytest.raises(ValueError, match="not allowed"):
+            cache_codec.TypedCodec().decode(
+                b'{"__type__": "enum", "class": "subprocess:Popen", "value": 1}'
+            )
+
+        with pytest.raises(TypeError, match="register_class"):
+            cache_codec.encode(Shade.DARK)
+        cache_codec.register_class(Shade)
+        assert cache_codec.decode(cache_codec.encode(Shade.DARK)) is Shade.DARK
+
+    def test_codec_interface_is_abstract(self):
+        """Codecs must implement encode and decode"""
+        class Incomplete(cache_codec.CacheCodec):
+            def encode(self, value):
+                return b""
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    def test_json_codec_keeps_old_behaviour(self):
+        """The json codec stringifies what JSON cannot hold"""
+        owner = uuid.uuid4()
+
+        assert cache_codec.decode(cache_codec.encode({"owner": owner}, "json")) == {"owner": str(owner)}
+
+    def test_large_values_compressed(self, monkeypatch):
+        """Payloads above the threshold are compressed"""
+        monkeypatch.setattr(settings, "CACHE_COMPRESS_THRESHOLD", 100)
+        history = [{"location": "Puerta Norte", "access_type": "entrada"}] * 50
+
+        frame = cache_codec.encode(history)
+
+        assert frame[1] != 0
+        assert len(frame) < len(cache_codec.TypedCodec().encode(history)) / 10
+        assert cache_codec.decode(frame) == history
+
+    def test_legacy_values_readable(self):
+        """Unframed JSON written before codecs (and raw counters) still decode"""
+        assert cache_codec.decode(b'{"a": 1}') == {"a": 1}
+        assert cache_codec.decode(b"7") == 7
+
+    async def test_cache_returns_typed_values(self, redis_cache):
+        """Values read from Redis keep their types"""
+        owner = uuid.uuid4()
+        await redis_cache.set("owner", {"id": owner})
+
+        assert await redis_cache.get("owner") == {"id": owner}
+
+
+class TestSyncRedisCache:
+    """Test the blocking facade used by scripts and worker threads"""
+
+    def test_sync_facade(self):
+        """The facade offers the same get/set/incr semantics"""
+        sync = SyncRedisCache()
+        sync.redis_client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        sync.enabled = True
+
+        assert sync.set("key", {"a": 1})
+        assert sync.get("key") == {"a": 1}
+        assert sync.incr("counter") == 1
+        assert sync.delete("key", "counter")
+        assert sync.get("key") is None
+
+
+async def _coherent_cache(server):
+    """Cache following invalidations on a shared fake server"""
+    instance = RedisCache()
+    instance.redis_client = fakeredis.aioredis.FakeRedis(server=server)
+    instance.enabled = True
+    instance.start_invalidation_listener()
+    for _ in range(100):
+        if instance._subscribed:
+            break
+        await asyncio.sleep(0.01)
+    return instance
+
+
+async def _settle():
+    """Give listeners time to apply published invalidations"""
+    await asyncio.sleep(0.1)
+
+
+@pytest.fixture
+async def two_workers():
+    """Two processes' caches sharing one Redis"""
+    server = fakeredis.FakeServer()
+    first = await _coherent_cache(server)
+    second = await _coherent_cache(server)
+    yield first, second
+    await first.disconnect()
+    await second.disconnect()
+
+
+class TestTwoTierCache:
+    """Test the in-process tier and its invalidation"""
+
+    async def test_hot_keys_served_from_l1(self, two_workers):
+        """Repeated reads skip Redis once a key is local"""
+        first, _ = two_workers
+        await first.set("device:1", {"name": "Laptop"})
+
+        for _ in range(3):
+            assert await first.get("device:1") == {"name": "Laptop"}
+
+        stats = first.stats()
+        assert stats["l1"]["hits"] == 3
+        assert stats["l1"]["coherent"]
+        assert stats["l2"]["hits"] == 0
+
+    async def test_l1_returns_copies(self, two_workers):
+        """Mutating a returned value does not change the cache"""
+        first, _ = two_workers
+        await first.set("devices", [1, 2])
+
+        (await first.get("devices")).append(3)
+
+        assert await first.get("devices") == [1, 2]
+
+    async def test_write_evicts_other_workers(self, two_workers):
+        """A write in one process drops the stale L1 copy in another"""
+        first, second = two_workers
+        await first.set("device:1", "old")
+        await _settle()
+        assert await second.get("device:1") == "old"
+
+        await first.set("device:1", "new")
+        await _settle()
+
+        assert await second.get("device:1") == "new"
+
+    async def test_delete_evicts_other_workers(self, two_workers):
+        """Deletes and pattern deletes reach every process"""
+        first, second = two_workers
+        await first.set_many({"user:1": 1, "user:2": 2, "other": 3})
+        await _settle()
+        await second.get_many(["user:1", "user:2", "other"])
+
+        await first.delete("user:1")
+        await first.delete_pattern("user:*")
+        await _settle()
+
+        assert len(second.local) == 1
+        assert await second.get_many(["user:1", "user:2", "other"]) == {"other": 3}
+
+    async def test_local_tier_without_redis(self):
+        """LOCAL entries work with Redis down and stay bounded"""
+        offline = RedisCache()
+        offline.local.max_entries = 2
+
+        for key in ("a", "b", "c"):
+            assert await offline.set(key, key, tier=CacheTier.LOCAL)
+
+        assert await offline.get("a", CacheTier.LOCAL) is None
+        assert await offline.get("c", CacheTier.LOCAL) == "c"
+        assert await offline.get("c") is None
+
+    async def test_l1_off_while_not_subscribed(self, redis_cache):
+        """Without the invalidation channel BOTH falls back to Redis only"""
+        await redis_cache.set("key", "value")
+
+        assert len(redis_cache.local) == 0
+        assert await redis_cache.get("key") == "value"
+
+
+class TestTagInvalidation:
+    """Test tag sets and pattern purges"""
+
+    async def test_tag_drops_every_member(self, redis_cache):
+        """Invalidating a tag deletes all entries registered under it"""
+        await redis_cache.set("devices:list:7", [1], tags=["user:7"])
+        await redis_cache.set("device:1", {"id": 1}, tags=["user:7", "device:1"])
+        await redis_cache.set("device:2", {"id": 2}, tags=["user:8"])
+
+        assert await redis_cache.invalidate_tags("user:7") == 2
+
+        assert await redis_cache.get_many(["devices:list:7", "device:1", "device:2"]) == {
+            "device:2": {"id": 2}
+        }
+        assert not await redis_cache.redis_client.exists("tag:user:7")
+
+    async def test_tag_outlives_its_members(self, redis_cache):
+        """A tag set keeps the TTL of its longest-lived member"""
+        await redis_cache.set("long", 1, ttl=600, tags=["user:1"])
+        await redis_cache.set("short", 2, ttl=60, tags=["user:1"])
+
+        assert await redis_cache.redis_client.ttl("tag:user:1") == 600
+
+    async def test_tag_reaches_other_workers(self, two_workers):
+        """Other processes drop their L1 copies of invalidated members"""
+        first, second = two_workers
+        await first.set("device:1", "cached", tags=["device:1"])
+        await _settle()
+        assert await second.get("device:1") == "cached"
+
+        await first.invalidate_tags("device:1")
+        await _settle()
+
+        assert await second.get("device:1") is None
+
+    async def test_decorator_registers_tags(self, redis_cache):
+        """@cached builds tags from the call's arguments"""
+        @cached(ttl=60, key_prefix="test:", tags=lambda user_id: [f"user:{user_id}"])
+        async def list_devices(user_id):
+            return [user_id]
+
+        await list_devices(5)
+
+        assert await redis_cache.redis_client.smembers("tag:user:5") == {b"test:list_devices:5:"}
+
+    async def test_store_refused_after_invalidation(self, redis_cache):
+        """A value computed before its tag was invalidated is not stored"""
+        since = await redis_cache.generation()
+        await redis_cache.invalidate_tags("device:1")
+
+        assert not await redis_cache.set("device:1", "old", tags=["device:1"], since=since)
+        assert await redis_cache.set("device:2", "kept", tags=["device:2"], since=since)
+
+        assert await redis_cache.get_many(["device:1", "device:2"]) == {"device:2": "kept"}
+        assert not await redis_cache.redis_client.sismember("tag:device:1", "device:1")
+
+    @pytest.mark.parametrize("backend", ["redis", "memory"])
+    async def test_load_racing_a_write_is_not_stored(self, request, backend, db, student):
+        """A read that started before a write commits never caches the old rows"""
+        if backend == "redis":
+            request.getfixturevalue("shared_redis")
+        reads = []
+
+        @cached(
+            ttl=60,
+            key_builder=lambda db, user_id: f"names:{user_id}",
+            tags=lambda db, user_id: [f"devices:user:{user_id}"],
+            beta=0,
+        )
+        def device_names(db, user_id):
+            names = [device.name for device in db.query(Device).filter(Device.user_id == user_id)]
+            if not reads:
+                # A rename commits after this read, before the result is stored
+                writer = Session(bind=db.get_bind())
+                writer.query(Device).filter(Device.user_id == user_id).update({"name": "Renamed"})
+                invalidate_on_commit(writer, f"devices:user:{user_id}")
+                writer.commit()
+                writer.close()
+            reads.append(names)
+            return names
+
+        assert await device_names(db, student.id) == ["Laptop"]
+        assert await cache.get(f"names:{student.id}") is None
+
+        assert await device_names(db, student.id) == ["Renamed"]
+        assert await device_names(db, student.id) == ["Renamed"]
+        assert reads == [["Laptop"], ["Renamed"]]
+
+    async def test_pattern_purge_uses_scan(self, redis_cache, monkeypatch):
+        """delete_pattern never calls KEYS"""
+        monkeypatch.setattr(settings, "CACHE_SCAN_BATCH_SIZE", 3)
+        await redis_cache.set_many({f"device:{i}": i for i in range(7)})
+        await redis_cache.set("user:1", 1)
+
+        async def forbidden(*args, **kwargs):
+            raise AssertionError("KEYS blocks Redis")
+        monkeypatch.setattr(redis_cache.redis_client, "keys", forbidden)
+
+        assert await redis_cache.delete_pattern("device:*") == 7
+        assert await redis_cache.get("user:1") == 1
+
+
+@pytest.fixture
+def shared_redis(monkeypatch):
+    """Async and sync caches on one fake server, as in a deployed worker"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(cache, "redis_client", fakeredis.aioredis.FakeRedis(server=server))
+    monkeypatch.setattr(cache, "enabled", True)
+    monkeypatch.setattr(sync_cache, "redis_client", fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(sync_cache, "enabled", True)
+    return sync_cache.redis_client
+
+
+@pytest.fixture
+def student(db):
+    """Student owning one device, signed in for API calls"""
+    user = User(
+        email="cached@example.com",
+        password_hash=hash_password("Test123!@#"),
+        full_name="Cached Student",
+        student_id="2024200",
+    )
+    db.add(user)
+    db.flush()
+    db.add(Device(
+        user_id=user.id,
+        name="Laptop",
+        device_type="laptop",
+        serial_number="SN-CACHED-1",
+        qr_data=str(uuid.uuid4()),
+    ))
+    db.commit()
+    app.dependency_overrides[get_current_user] = lambda: db.get(User, user.id)
+    yield user
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+@pytest.fixture
+def count_queries(db):
+    """Number of SELECTs run against the test database"""
+    counter = {"selects": 0}
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            counter["selects"] += 1
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_execute)
+    yield counter
+    event.remove(engine, "before_cursor_execute", before_execute)
+
+
+class TestCachedEndpoints:
+    """Test cached reads and their invalidation on writes"""
+
+    def test_device_list_served_from_cache(self, client, shared_redis, student, count_queries):
+        """A repeated GET /devices/ runs no query"""
+        first = client.get("/api/devices/")
+        selects = count_queries["selects"]
+        second = client.get("/api/devices/")
+
+        assert first.status_code == status.HTTP_200_OK
+        assert second.json() == first.json()
+        assert count_queries["selects"] == selects
+
+    def test_device_writes_invalidate_list(self, client, shared_redis, student):
+        """Creating, renaming and deleting devices are visible at once"""
+        assert len(client.get("/api/devices/").json()) == 1
+
+        created = client.post("/api/devices/", json={
+            "name": "Tablet", "device_type": "tablet", "serial_number": "SN-CACHED-2"
+        })
+        assert created.status_code == status.HTTP_201_CREATED
+        device_id = created.json()["device"]["id"]
+        assert len(client.get("/api/devices/").json()) == 2
+
+        client.put(f"/api/devices/{device_id}", json={"name": "iPad"})
+        assert "iPad" in [device["name"] for device in client.get("/api/devices/").json()]
+
+        client.delete(f"/api/devices/{device_id}")
+        assert len(client.get("/api/devices/").json()) == 1
+
+    def test_scan_invalidates_history(self, client, db, shared_redis, student):
+        """A new access record shows up in the cached history immediately"""
+        assert client.get("/api/access/history").json() == []
+        device = db.query(Device).filter(Device.user_id == student.id).one()
+
+        AccessService.record_access(db, device.qr_data, "entrada", "Puerta Norte", student)
+
+        history = client.get("/api/access/history").json()
+        assert [record["access_type"] for record in history] == ["entrada"]
+
+    def test_rename_invalidates_history(self, client, db, shared_redis, student):
+        """Profile and device renames reach history pages showing them"""
+        device = db.query(Device).filter(Device.user_id == student.id).one()
+        AccessService.record_access(db, device.qr_data, "entrada", "Puerta Norte", student)
+        assert client.get("/api/access/history").json()[0]["user_name"] == "Cached Student"
+
+        client.put("/api/users/me", json={"full_name": "Renamed Student"})
+        client.put(f"/api/devices/{device.id}", json={"name": "Work Laptop"})
+
+        record = client.get("/api/access/history").json()[0]
+        assert record["user_name"] == "Renamed Student"
+        assert record["device_name"] == "Work Laptop"
+
+    def test_request_commits_invalidate_off_thread(self, client, shared_redis, student, monkeypatch):
+        """Commits in a request hand the invalidation to the event loop and the response waits for it"""
+        def blocking(*tags):
+            raise AssertionError("request thread blocked on Redis")
+        monkeypatch.setattr(sync_cache, "invalidate_tags", blocking)
+        assert len(client.get("/api/devices/").json()) == 1
+
+        created = client.post("/api/devices/", json={
+            "name": "Tablet", "device_type": "tablet", "serial_number": "SN-CACHED-3"
+        })
+
+        assert created.status_code == status.HTTP_201_CREATED
+        assert len(client.get("/api/devices/").json()) == 2
+
+    def test_rollback_keeps_cache(self, db, shared_redis, student):
+        """Tags staged by a rolled back write are not invalidated"""
+        sync_cache.set("devices:user:kept", [1])
+        shared_redis.sadd(f"tag:devices:user:{student.id}", "devices:user:kept")
+
+        invalidate_on_commit(db, f"devices:user:{student.id}")
+        db.rollback()
+        db.commit()
+
+        assert sync_cache.get("devices:user:kept") == [1]
@@ -0,0 +1,274 @@
+"""
+Unit tests for the outbound email queue and SMTP connection pool
+"""
+import asyncio
+import smtplib
+import socket
+from datetime import datetime, timezone
+
+import pytest
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+from app.core.config import settings
+from app.core.email_templates import EmailTemplates
+from app.core.security import hash_password
+from app.core.smtp_pool import SMTPConnectionPool, is_permanent_smtp_error
+from app.models.user import User
+from app.services.email_queue import EmailQueue, email_queue
+from app.services.email_service import EmailService
+
+
+class RecordingHandler:
+    """aiosmtpd handler that records connections and messages"""
+
+    def __init__(self):
+        self.connections = 0
+        self.messages = []
+        # Replies used for the next DATA commands, then 250
+        self.replies = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.replies:
+            return self.replies.pop(0)
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """Local SMTP server standing in for the real relay"""
+    handler = RecordingHandler()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    controller = Controller(
+        handler,
+        hostname="127.0.0.1",
+        port=port,
+        authenticator=lambda *args: AuthResult(success=True),
+        auth_require_tls=False,
+    )
+    controller.start()
+
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", port)
+    monkeypatch.setattr(settings, "SMTP_USER", "mailer")
+    monkeypatch.setattr(settings, "SMTP_PASSWORD", "secret")
+    monkeypatch.setattr(settings, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(settings, "EMAIL_RETRY_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "EMAIL_RETRY_MAX_SECONDS", 0.01)
+
+    yield handler
+    controller.stop()
+
+
+def _message(to_email: str):
+    return EmailService.build_message(to_email, "Hola", "<p>Hola</p>", "Hola")
+
+
+async def _drain(queue: EmailQueue, rounds: int = 50) -> None:
+    """Run the queue until nothing is left or the rounds run out"""
+    for _ in range(rounds):
+        if not len(queue):
+            return
+        await queue.run_once()
+        await asyncio.sleep(0.01)
+
+
+class TestEmailQueue:
+    """Test queued delivery through the pool"""
+
+    async def test_messages_reuse_one_connection(self, smtp_server):
+        """Sequential messages go over a single logged-in connection"""
+        pool = SMTPConnectionPool(max_connections=1)
+        queue = EmailQueue(sender=pool.send, concurrency=1)
+        for index in range(3):
+            queue.enqueue(_message(f"user{index}@example.com"))
+
+        await _drain(queue)
+        pool.close()
+
+        assert len(smtp_server.messages) == 3
+        assert smtp_server.connections == 1
+        assert [envelope.rcpt_tos for envelope in smtp_server.messages] == [
+            ["user0@example.com"], ["user1@example.com"], ["user2@example.com"]
+        ]
+
+    async def test_transient_failure_is_retried(self, smtp_server):
+        """A 4xx answer requeues the message and the connection stays pooled"""
+        smtp_server.replies = ["451 Try again later"]
+        pool = SMTPConnectionPool(max_connections=1)
+        queue = EmailQueue(sender=pool.send, concurrency=1)
+        queue.enqueue(_message("user@example.com"))
+
+        await _drain(queue)
+        pool.close()
+
+        assert len(smtp_server.messages) == 1
+        assert smtp_server.connections == 1
+        assert len(queue) == 0
+
+    async def test_permanent_failure_is_dropped(self, smtp_server):
+        """A 5xx answer is not retried"""
+        smtp_server.replies = ["550 Mailbox unavailable"]
+        pool = SMTPConnectionPool(max_connections=1)
+        queue = EmailQueue(sender=pool.send, concurrency=1)
+        queue.enqueue(_message("user@example.com"))
+
+        await _drain(queue)
+        pool.close()
+
+        assert smtp_server.messages == []
+        assert len(queue) == 0
+
+    async def test_gives_up_after_max_attempts(self, smtp_server, monkeypatch):
+        """Transient failures stop once EMAIL_MAX_ATTEMPTS is reached"""
+        monkeypatch.setattr(settings, "EMAIL_MAX_ATTEMPTS", 2)
+        smtp_server.replies = ["451 Busy", "451 Busy", "451 Busy"]
+        pool = SMTPConnectionPool(max_connections=1)
+        queue = EmailQueue(sender=pool.send, concurrency=1)
+        queue.enqueue(_message("user@example.com"))
+
+        await _drain(queue)
+        pool.close()
+
+        assert smtp_server.messages == []
+        assert smtp_server.replies == ["451 Busy"]
+
+    def test_permanent_error_classification(self):
+        """Only 5xx answers count as permanent"""
+        assert is_permanent_smtp_error(smtplib.SMTPDataError(550, b"no"))
+        assert not is_permanent_smtp_error(smtplib.SMTPDataError(451, b"later"))
+        assert not is_permanent_smtp_error(smtplib.SMTPServerDisconnected())
+
+
+class TestEmailTemplates:
+    """Test precompiled, localized templates"""
+
+    @pytest.fixture
+    def templates(self):
+        registry = EmailTemplates(default_locale="es")
+        registry.load()
+        return registry
+
+    @staticmethod
+    def _scans(count: int):
+        return [
+            {
+                "device_name": f"Laptop <{index}>",
+                "access_type": "salida",
+                "location": "Puerta Norte",
+                "timestamp": datetime(2026, 1, 1, 8, index, tzinfo=timezone.utc),
+            }
+            for index in range(count)
+        ]
+
+    def test_load_compiles_every_locale(self, templates):
+        """Each notification is compiled once per locale"""
+        assert templates.locales == ["en", "es"]
+        assert ("es", "password_reset") in templates._templates
+        assert ("en", "access_alert") in templates._templates
+        assert not any(name.startswith("_") for _, name in templates._templates)
+
+    def test_render_password_reset(self, templates):
+        """Subject, HTML and text are rendered in the default locale"""
+        rendered = templates.render(
+            "password_reset",
+            full_name="Ana",
+            reset_link="http://localhost/reset?token=a&b",
+            expire_minutes=30,
+        )
+
+        assert rendered.subject == "Restablece tu contraseña - ECCI Control"
+        assert "Hola, Ana" in rendered.html
+        assert 'href="http://localhost/reset?token=a&amp;b"' in rendered.html
+        assert "http://localhost/reset?token=a&b" in rendered.text
+        assert "30 minutos" in rendered.text
+
+    def test_render_translated(self, templates):
+        """Catalog translations and plural forms are applied"""
+        rendered = templates.render("access_alert", "en-US", full_name="Ana", scans=self._scans(3))
+
+        assert rendered.subject == "3 access records for your devices"
+        assert "Your devices were scanned 3 times:" in rendered.text
+        assert "Exit" in rendered.text
+        assert '<html lang="en">' in rendered.html
+
+        single = templates.render("access_alert", "en", full_name="Ana", scans=self._scans(1))
+        assert single.subject == "New access record for your device"
+
+    def test_html_is_escaped(self, templates):
+        """Template values are escaped in HTML but not in text"""
+        rendered = templates.render("access_alert", full_name="Ana", scans=self._scans(1))
+
+        assert "Laptop &lt;0&gt;" in rendered.html
+        assert "Laptop <0>" in rendered.text
+
+    def test_unknown_locale_falls_back(self, templates):
+        """Unsupported locales use the default one"""
+        assert templates.resolve_locale("fr") == "es"
+        assert templates.negotiate_locale("fr-FR,en;q=0.8,es;q=0.5") == "en"
+        assert templates.negotiate_locale("de, *;q=0.1") == "es"
+        assert templates.negotiate_locale(None) == "es"
+
+    def test_unknown_template(self, templates):
+        """Rendering a missing notification raises KeyError"""
+        with pytest.raises(KeyError):
+            templates.render("missing")
+
+
+class TestPasswordResetEmail:
+    """Test that requests only enqueue mail"""
+
+    def test_reset_request_enqueues(self, client, db, monkeypatch):
+        """The endpoint queues the message instead of talking to SMTP"""
+        monkeypatch.setattr(settings, "SMTP_USER", "mailer")
+        monkeypatch.setattr(settings, "SMTP_PASSWORD", "secret")
+        queued = []
+        monkeypatch.setattr(email_queue, "enqueue", queued.append)
+
+        user = User(
+            email="reset@example.com",
+            password_hash=hash_password("Test123!@#"),
+            full_name="Reset User",
+            student_id="2024099",
+        )
+        db.add(user)
+        db.commit()
+
+        response = client.post(
+            "/api/users/password/reset-request", json={"email": "reset@example.com"}
+        )
+
+        assert response.status_code == 200
+        assert len(queued) == 1
+        assert queued[0]["To"] == "reset@example.com"
+
+    def test_reset_request_uses_accept_language(self, client, db, monkeypatch):
+        """The reset email follows the client's preferred language"""
+        monkeypatch.setattr(settings, "SMTP_USER", "mailer")
+        monkeypatch.setattr(settings, "SMTP_PASSWORD", "secret")
+        queued = []
+        monkeypatch.setattr(email_queue, "enqueue", queued.append)
+
+        db.add(User(
+            email="reset@example.com",
+            password_hash=hash_password("Test123!@#"),
+            full_name="Reset User",
+            student_id="2024099",
+        ))
+        db.commit()
+
+        client.post(
+            "/api/users/password/reset-request",
+            json={"email": "reset@example.com"},
+            headers={"Accept-Language": "en-US,en;q=0.9"},
+        )
+
+        assert queued[0]["Subject"] == "Reset your password - ECCI Control"
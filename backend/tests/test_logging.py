@@ -0,0 +1,148 @@
+"""
+Unit tests for the structured logging pipeline
+"""
+import json
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueListener
+
+import pytest
+
+from app.core import logging as app_logging
+from app.core.config import settings
+from app.core.logging import (
+    JsonFormatter,
+    RequestContextFilter,
+    log_sampled_var,
+    new_request_id,
+    request_id_var,
+    sample_request,
+)
+
+
+def _record(level=logging.INFO, msg="Scan at %s", args=("Puerta Norte",), **extra):
+    record = logging.LogRecord("app.test", level, __file__, 10, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class _Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = []
+
+    def emit(self, record):
+        self.records.append(record)
+        self.threads.append(threading.current_thread().name)
+
+
+class TestJsonFormatter:
+    """Test JSON log lines"""
+
+    def test_fields_and_extras(self):
+        """Test the message is interpolated and extras become keys"""
+        line = JsonFormatter().format(
+            _record(request_id="abc123", status=201, route="/api/access/scan")
+        )
+
+        entry = json.loads(line)
+        assert entry["message"] == "Scan at Puerta Norte"
+        assert entry["level"] == "INFO"
+        assert entry["request_id"] == "abc123"
+        assert entry["status"] == 201
+        assert entry["route"] == "/api/access/scan"
+
+    def test_exception_included(self):
+        """Test tracebacks are kept in the entry"""
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord(
+                "app.test", logging.ERROR, __file__, 10, "Failed", (), sys.exc_info()
+            )
+
+        entry = json.loads(JsonFormatter().format(record))
+        assert "ValueError: boom" in entry["exception"]
+
+
+class TestRequestContext:
+    """Test request ids and sampling"""
+
+    def test_filter_tags_request_id(self):
+        """Test records carry the id of the request that logged them"""
+        token = request_id_var.set("req-1")
+        try:
+            record = _record()
+            assert RequestContextFilter().filter(record) is True
+        finally:
+            request_id_var.reset(token)
+        assert record.request_id == "req-1"
+
+    def test_unsampled_requests_keep_warnings_only(self):
+        """Test INFO lines of an unsampled request are dropped, warnings kept"""
+        token = log_sampled_var.set(False)
+        try:
+            assert RequestContextFilter().filter(_record(logging.INFO)) is False
+            assert RequestContextFilter().filter(_record(logging.WARNING)) is True
+        finally:
+            log_sampled_var.reset(token)
+
+    def test_sample_rates(self, monkeypatch):
+        """Test configured paths are sampled at their rate and others always"""
+        monkeypatch.setattr(settings, "LOG_SAMPLE_RATES", "/api/access/scan=0, /api/devices/*=1")
+
+        assert sample_request("/api/access/scan") is False
+        assert sample_request("/api/devices/123") is True
+        assert sample_request("/health") is True
+
+    @pytest.mark.parametrize("incoming, kept", [
+        ("3f2a-11", True),
+        ("bad id\nwith newline", False),
+        ("x" * 65, False),
+        (None, False),
+    ])
+    def test_incoming_request_ids(self, incoming, kept):
+        """Test only well-formed ids from clients are reused"""
+        assert (new_request_id(incoming) == incoming) is kept
+
+    def test_response_carries_request_id(self, client, caplog):
+        """Test the id is echoed back and attached to the request's log lines"""
+        with caplog.at_level(logging.INFO):
+            response = client.get("/", headers={"X-Request-ID": "trace-42"})
+
+        assert response.headers["X-Request-ID"] == "trace-42"
+        responses = [r for r in caplog.records if r.getMessage().startswith("Response: GET /")]
+        assert responses and responses[-1].request_id == "trace-42"
+        assert responses[-1].status == 200
+
+
+class TestQueuePipeline:
+    """Test records are written by the listener thread"""
+
+    def test_records_written_off_thread(self):
+        """Test the caller only queues; the listener formats and writes"""
+        log_queue = queue.SimpleQueue()
+        handler = app_logging._ContextQueueHandler(log_queue)
+        handler.addFilter(RequestContextFilter())
+        collect = _Collect()
+        listener = QueueListener(log_queue, collect)
+        listener.start()
+        try:
+            try:
+                raise RuntimeError("boom")
+            except RuntimeError:
+                record = _record(logging.ERROR, msg="Failed for %s", args=({"id": 1},))
+                record.exc_info = sys.exc_info()
+                handler.handle(record)
+        finally:
+            listener.stop()
+
+        queued = collect.records[0]
+        assert collect.threads[0] != threading.current_thread().name
+        assert queued.getMessage() == "Failed for {'id': 1}"
+        assert "RuntimeError: boom" in queued.exc_text
+        # The caller's record is left intact for other handlers
+        assert record.exc_info is not None and record.args == {"id": 1}
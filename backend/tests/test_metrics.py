@@ -0,0 +1,140 @@
+"""
+Unit tests for Prometheus metrics
+"""
+import uuid
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+from app.core import metrics
+from app.core.http_client import webhook_http_client
+from app.core.local_cache import LocalCache
+from app.core.security import hash_password
+from app.models.device import Device
+from app.models.user import User
+from app.models.webhook import Webhook
+from app.services.access_service import AccessService
+from app.services.webhook_service import WebhookService
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestRequestMetrics:
+    """Test per-route request counters and histograms"""
+
+    def test_metrics_endpoint_exposes_text_format(self, client):
+        """Test /metrics answers in the Prometheus exposition format"""
+        client.get("/health")
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "http_request_duration_seconds_bucket" in response.text
+
+    def test_requests_labelled_by_route_template(self, client):
+        """Test two different ids land in the same route series"""
+        labels = {"method": "GET", "route": "/api/devices/{device_id}"}
+        status = str(client.get(f"/api/devices/{uuid.uuid4()}").status_code)
+        before = _sample("http_requests_total", status=status, **labels)
+
+        client.get(f"/api/devices/{uuid.uuid4()}")
+
+        assert _sample("http_requests_total", status=status, **labels) == before + 1
+        assert _sample("http_request_duration_seconds_count", status=status, **labels) >= 2
+
+    def test_unmatched_paths_share_one_series(self, client):
+        """Test unknown paths do not create a series each"""
+        labels = {"method": "GET", "route": metrics.UNMATCHED_ROUTE, "status": "404"}
+        before = _sample("http_requests_total", **labels)
+
+        client.get("/wp-login.php")
+        client.get("/.env")
+
+        assert _sample("http_requests_total", **labels) == before + 2
+
+
+class TestComponentMetrics:
+    """Test cache, scan, webhook and database metrics"""
+
+    def test_cache_lookups_counted_by_tier(self):
+        """Test local cache hits and misses feed cache_lookups_total"""
+        local = LocalCache(10, tier="test")
+        local.set("key", b"value")
+
+        local.get("key")
+        local.get("missing")
+        local.get("missing")
+
+        assert _sample("cache_lookups_total", tier="test", result="hit") == 1
+        assert _sample("cache_lookups_total", tier="test", result="miss") == 2
+        assert local.stats.hits == 1 and local.stats.misses == 2
+
+    def test_scans_counted_by_location(self, db):
+        """Test a recorded scan increments its location and direction"""
+        owner = User(
+            email="metrics@example.com",
+            password_hash=hash_password("Test123!@#"),
+            full_name="Metrics Owner",
+            student_id="2024300",
+        )
+        db.add(owner)
+        db.flush()
+        device = Device(
+            user_id=owner.id,
+            name="Laptop",
+            device_type="laptop",
+            serial_number="SN-METRICS-1",
+            qr_data=str(uuid.uuid4()),
+        )
+        db.add(device)
+        db.commit()
+        labels = {"location": "Puerta Metricas", "access_type": "entrada"}
+        before = _sample("access_scans_total", **labels)
+
+        guard = SimpleNamespace(id=uuid.uuid4(), role="security")
+        AccessService.record_access(db, device.qr_data, "entrada", "Puerta Metricas", guard)
+
+        assert _sample("access_scans_total", **labels) == before + 1
+
+    @pytest.mark.parametrize(
+        "answer, outcome",
+        [(204, "success"), (503, "http_error"), (None, "network_error")],
+    )
+    async def test_webhook_outcomes(self, monkeypatch, answer, outcome):
+        """Test each delivery attempt is counted under its outcome"""
+        async def fake_post(url, content, headers):
+            if answer is None:
+                raise httpx.ConnectError("refused")
+            return httpx.Response(answer)
+
+        monkeypatch.setattr(webhook_http_client, "post", fake_post)
+        webhook = Webhook(
+            id=uuid.uuid4(), url=f"https://{uuid.uuid4().hex}.test/hook", secret="s3cret"
+        )
+        before = _sample("webhook_deliveries_total", outcome=outcome)
+
+        await WebhookService._send_webhook(webhook, "device.created", b"{}")
+
+        assert _sample("webhook_deliveries_total", outcome=outcome) == before + 1
+
+    def test_db_connections_tracked(self):
+        """Test checkouts raise the gauge until the connection is returned"""
+        engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=3)
+        metrics.instrument_engine(engine)
+        checked_out = _sample("db_pool_connections_checked_out")
+        opened = _sample("db_connections_opened_total")
+
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            assert _sample("db_pool_connections_checked_out") == checked_out + 1
+
+        assert _sample("db_pool_connections_checked_out") == checked_out
+        assert _sample("db_connections_opened_total") == opened + 1
+        assert _sample("db_pool_size") == 3
+        engine.dispose()
@@ -0,0 +1,174 @@
+"""
+Unit tests for owner access notifications
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import status
+
+from app.core.config import settings
+from app.core.security import hash_password
+from app.main import app
+from app.models.device import Device
+from app.models.notification import AccessNotification, NotificationFrequency
+from app.models.user import User
+from app.services.access_service import AccessService
+from app.services.email_queue import email_queue
+from app.services.email_service import EmailService
+from app.services.notification_service import NotificationAggregator, NotificationService
+from app.utils.dependencies import get_current_user
+
+
+@pytest.fixture
+def owner(db):
+    """Student owning one device, with hourly digests"""
+    user = User(
+        email="owner@example.com",
+        password_hash=hash_password("Test123!@#"),
+        full_name="Device Owner",
+        student_id="2024100",
+        notification_frequency=NotificationFrequency.HOURLY,
+    )
+    db.add(user)
+    db.flush()
+    db.add(Device(
+        user_id=user.id,
+        name="Laptop",
+        device_type="laptop",
+        serial_number="SN-NOTIFY-1",
+        qr_data=str(uuid.uuid4()),
+    ))
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def guard():
+    """Security guard performing scans"""
+    return SimpleNamespace(id=uuid.uuid4(), role="security")
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Digests handed to the email path"""
+    digests = []
+    monkeypatch.setattr(
+        EmailService,
+        "send_access_alert_email",
+        lambda to_email, full_name, scans, locale=None: digests.append((to_email, scans)),
+    )
+    return digests
+
+
+def _scan(db, owner, guard, access_type="salida"):
+    device = db.query(Device).filter(Device.user_id == owner.id).one()
+    return AccessService.record_access(db, device.qr_data, access_type, "Puerta Norte", guard)
+
+
+class TestNotificationPreferences:
+    """Test how preferences shape staged notifications"""
+
+    def test_scan_stages_notification(self, db, owner, guard):
+        """A scan writes a pending notification due at the end of the hour"""
+        record = _scan(db, owner, guard)
+
+        notification = db.query(AccessNotification).one()
+        assert notification.access_record_id == record.id
+        assert notification.user_id == owner.id
+        assert notification.due_at.replace(tzinfo=None) == (
+            record.timestamp.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+            + timedelta(hours=1)
+        )
+
+    def test_off_stages_nothing(self, db, owner, guard):
+        """Owners with notifications off get no rows"""
+        owner.notification_frequency = NotificationFrequency.OFF
+        db.commit()
+
+        _scan(db, owner, guard)
+
+        assert db.query(AccessNotification).count() == 0
+
+    def test_immediate_is_due_now(self):
+        """Immediate notifications are due at scan time"""
+        now = datetime(2026, 3, 1, 10, 42, tzinfo=timezone.utc)
+
+        assert NotificationService.window_due_at(NotificationFrequency.IMMEDIATE, now) == now
+        assert NotificationService.window_due_at(NotificationFrequency.HOURLY, now) == datetime(
+            2026, 3, 1, 11, 0, tzinfo=timezone.utc
+        )
+
+    def test_profile_update_sets_frequency(self, client, db, owner):
+        """Users choose their frequency through PUT /users/me"""
+        app.dependency_overrides[get_current_user] = lambda: db.get(User, owner.id)
+        response = client.put("/api/users/me", json={"notification_frequency": "immediate"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["notification_frequency"] == "immediate"
+        db.refresh(owner)
+        assert owner.notification_frequency == NotificationFrequency.IMMEDIATE
+
+
+class TestNotificationAggregator:
+    """Test collapsing scans into digests"""
+
+    def test_scans_collapse_into_one_digest(self, db, owner, guard, session_factory, sent):
+        """All due scans of a user become one email"""
+        for access_type in ("entrada", "salida", "entrada"):
+            _scan(db, owner, guard, access_type)
+        db.query(AccessNotification).update({"due_at": datetime.now(timezone.utc)})
+        db.commit()
+
+        processed = NotificationAggregator(session_factory=session_factory).send_due()
+
+        assert processed == 1
+        assert len(sent) == 1
+        email, scans = sent[0]
+        assert email == "owner@example.com"
+        assert [scan["access_type"] for scan in scans] == ["entrada", "salida", "entrada"]
+        assert scans[0]["device_name"] == "Laptop"
+        db.expire_all()
+        assert db.query(AccessNotification).count() == 0
+
+    def test_pending_window_is_not_sent(self, db, owner, guard, session_factory, sent):
+        """Hourly scans wait for the end of their window"""
+        _scan(db, owner, guard)
+
+        processed = NotificationAggregator(session_factory=session_factory).send_due()
+
+        assert processed == 0
+        assert sent == []
+        assert db.query(AccessNotification).count() == 1
+
+    def test_opted_out_after_scan(self, db, owner, guard, session_factory, sent):
+        """Users who switch off before the digest get nothing"""
+        _scan(db, owner, guard)
+        db.query(AccessNotification).update({"due_at": datetime.now(timezone.utc)})
+        owner.notification_frequency = NotificationFrequency.OFF
+        db.commit()
+
+        NotificationAggregator(session_factory=session_factory).send_due()
+
+        assert sent == []
+        db.expire_all()
+        assert db.query(AccessNotification).count() == 0
+
+    def test_digest_reaches_email_queue(self, db, owner, guard, session_factory, monkeypatch):
+        """Digests are rendered and queued, not sent inline"""
+        monkeypatch.setattr(settings, "SMTP_USER", "mailer")
+        monkeypatch.setattr(settings, "SMTP_PASSWORD", "secret")
+        queued = []
+        monkeypatch.setattr(email_queue, "enqueue", queued.append)
+
+        _scan(db, owner, guard)
+        _scan(db, owner, guard, "entrada")
+        db.query(AccessNotification).update({"due_at": datetime.now(timezone.utc)})
+        db.commit()
+
+        NotificationAggregator(session_factory=session_factory).send_due()
+
+        assert len(queued) == 1
+        assert queued[0]["To"] == "owner@example.com"
+        assert queued[0]["Subject"] == "2 registros de acceso de tus dispositivos"
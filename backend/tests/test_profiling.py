@@ -0,0 +1,129 @@
+"""
+Unit tests for on-demand request profiling
+"""
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import status
+
+from app.core.profiling import (
+    PROFILE_HEADER,
+    PROFILE_ID_HEADER,
+    ProfileStore,
+    create_profile_token,
+    profile_store,
+    verify_profile_token,
+)
+from app.core.security import create_access_token
+from app.main import app
+from app.models.role import UserRole
+from app.utils.dependencies import get_current_user
+
+
+@pytest.fixture
+def profiles_dir(tmp_path, monkeypatch):
+    """Keep the global store's profiles in a temporary directory"""
+    monkeypatch.setattr(profile_store, "_directory", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def signed_in():
+    """Sign a user with the given role in for API calls"""
+    def sign_in(role):
+        user = SimpleNamespace(id=uuid.uuid4(), role=role)
+        app.dependency_overrides[get_current_user] = lambda: user
+        return user
+    yield sign_in
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+class TestProfileTokens:
+    """Test who and what a profile token authorizes"""
+
+    def test_round_trip(self):
+        """Test a fresh token names the admin who asked for it"""
+        admin_id = uuid.uuid4()
+        token, _ = create_profile_token(admin_id)
+        assert verify_profile_token(token) == str(admin_id)
+
+    def test_access_tokens_do_not_profile(self):
+        """Test a login token is not a profile token"""
+        assert verify_profile_token(create_access_token({"sub": str(uuid.uuid4())})) is None
+        assert verify_profile_token("not-a-token") is None
+
+    def test_profile_tokens_do_not_authenticate(self, client):
+        """Test a profile token cannot be used as a bearer token"""
+        token, _ = create_profile_token(uuid.uuid4())
+        response = client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_token_endpoint_requires_admin(self, client, signed_in):
+        """Test only admins can get a token"""
+        signed_in(UserRole.SECURITY)
+        response = client.post("/api/admin/profile/token", json={})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestProfileStore:
+    """Test the on-disk ring buffer"""
+
+    def test_keeps_newest_profiles(self, tmp_path):
+        """Test the oldest profiles and their files are deleted past the limit"""
+        store = ProfileStore(str(tmp_path), max_profiles=3)
+        ids = [
+            store.save({"speedscope": "{}", "html": "<html></html>"}, {"path": f"/{index}"})
+            for index in range(5)
+        ]
+
+        assert [profile["path"] for profile in store.list()] == ["/4", "/3", "/2"]
+        assert store.path(ids[0], "speedscope") is None
+        assert store.path(ids[4], "html").read_text() == "<html></html>"
+        assert len(list(tmp_path.iterdir())) == 3 * 3
+
+    def test_rejects_unknown_ids(self, tmp_path):
+        """Test ids are validated before touching the filesystem"""
+        store = ProfileStore(str(tmp_path), max_profiles=3)
+        assert store.path("../../etc/passwd", "html") is None
+        assert store.path("20260101T000000000000-deadbeef", "pstats") is None
+
+
+class TestProfiledRequests:
+    """Test profiling a request end to end"""
+
+    def test_profile_request_and_download(self, client, signed_in, profiles_dir):
+        """Test a request with a token is profiled, listed and downloadable"""
+        signed_in(UserRole.ADMIN)
+        token = client.post("/api/admin/profile/token", json={"ttl_seconds": 60}).json()
+
+        response = client.get("/", headers={token["header"]: token["token"]})
+
+        assert response.status_code == status.HTTP_200_OK
+        profile_id = response.headers[PROFILE_ID_HEADER]
+        listed = client.get("/api/admin/profiles").json()
+        assert listed[0]["id"] == profile_id
+        assert listed[0]["path"] == "/" and listed[0]["status"] == 200
+
+        speedscope = client.get(f"/api/admin/profiles/{profile_id}")
+        assert speedscope.status_code == status.HTTP_200_OK
+        assert "speedscope" in json.loads(speedscope.content)["$schema"]
+        html = client.get(f"/api/admin/profiles/{profile_id}", params={"format": "html"})
+        assert html.headers["content-type"].startswith("text/html")
+
+    def test_requests_without_valid_token_not_profiled(self, client, profiles_dir):
+        """Test plain requests and forged tokens leave no profile"""
+        plain = client.get("/")
+        forged = client.get("/", headers={PROFILE_HEADER: "forged"})
+
+        assert PROFILE_ID_HEADER not in plain.headers
+        assert forged.status_code == status.HTTP_200_OK
+        assert PROFILE_ID_HEADER not in forged.headers
+        assert list(profiles_dir.iterdir()) == []
+
+    def test_missing_profile(self, client, signed_in, profiles_dir):
+        """Test downloading an evicted profile is a 404"""
+        signed_in(UserRole.ADMIN)
+        response = client.get("/api/admin/profiles/20260101T000000000000-deadbeef")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
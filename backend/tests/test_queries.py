@@ -0,0 +1,201 @@
+"""
+Unit tests for per-request SQL tracking and query budgets
+"""
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import status
+from sqlalchemy import text
+
+from app.core import query_tracker
+from app.core.config import settings
+from app.core.query_tracker import RepeatedStatementError, statement_shape, track_queries
+from app.core.security import hash_password
+from app.main import app
+from app.models.access_record import AccessRecord, AccessType
+from app.models.device import Device
+from app.models.user import User
+from app.utils.dependencies import get_current_user
+
+
+def _user(db, index, role="student"):
+    user = User(
+        email=f"history{index}@example.com",
+        password_hash=hash_password("Test123!@#"),
+        full_name=f"History User {index}",
+        student_id=f"20245{index:02d}",
+        role=role,
+    )
+    db.add(user)
+    db.flush()
+    return user
+
+
+@pytest.fixture
+def history(db):
+    """Five owners with a device each, scanned four times by different guards"""
+    guards = [_user(db, 90 + index, role="security") for index in range(2)]
+    now = datetime.now(timezone.utc)
+    devices = []
+    for index in range(5):
+        owner = _user(db, index)
+        device = Device(
+            user_id=owner.id,
+            name=f"Laptop {index}",
+            device_type="laptop",
+            serial_number=f"SN-HISTORY-{index}",
+            qr_data=str(uuid.uuid4()),
+        )
+        db.add(device)
+        db.flush()
+        devices.append(device)
+        for scan in range(4):
+            db.add(AccessRecord(
+                device_id=device.id,
+                user_id=owner.id,
+                scanned_by_id=guards[scan % 2].id,
+                access_type=AccessType.ENTRADA if scan % 2 == 0 else AccessType.SALIDA,
+                location="Puerta Norte",
+                timestamp=now - timedelta(minutes=index * 10 + scan),
+            ))
+    db.commit()
+    return {"guard": guards[0], "devices": devices}
+
+
+@pytest.fixture
+def signed_in(db):
+    """Sign a user in for API calls, loading them per request like the token check"""
+    def sign_in(user):
+        user_id = user.id
+        app.dependency_overrides[get_current_user] = (
+            lambda: db.query(User).filter(User.id == user_id).one()
+        )
+    yield sign_in
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+class TestStatementShape:
+    """Test statements differing only in values share a shape"""
+
+    def test_values_and_in_lists_collapse(self):
+        """Test literals, parameters and IN lists of any length normalize"""
+        assert statement_shape(
+            "SELECT * FROM users WHERE id IN (%(id_1_1)s, %(id_1_2)s) AND name = 'Ana'  LIMIT 10"
+        ) == statement_shape(
+            "SELECT * FROM users WHERE id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s) AND name = 'Bo' LIMIT 5"
+        ) == "SELECT * FROM users WHERE id IN (?) AND name = ? LIMIT ?"
+
+    def test_different_tables_differ(self):
+        """Test different statements keep different shapes"""
+        assert statement_shape("SELECT * FROM users WHERE id = ?") != statement_shape(
+            "SELECT * FROM devices WHERE id = ?"
+        )
+
+
+class TestRepeatDetection:
+    """Test the N+1 detector modes"""
+
+    def test_raise_mode_fails_at_threshold(self, db, monkeypatch):
+        """Test the statement crossing the threshold raises"""
+        monkeypatch.setattr(settings, "SQL_REPEAT_THRESHOLD", 3)
+        monkeypatch.setattr(settings, "SQL_REPEAT_MODE", "raise")
+
+        with track_queries() as queries:
+            for value in range(3):
+                db.execute(text("SELECT :value"), {"value": value})
+            with pytest.raises(RepeatedStatementError):
+                db.execute(text("SELECT :value"), {"value": 3})
+
+        assert queries.count == 4
+
+    def test_warn_mode_logs_repeats(self, db, monkeypatch, caplog):
+        """Test warn mode lets the request finish and logs the shape"""
+        monkeypatch.setattr(settings, "SQL_REPEAT_THRESHOLD", 2)
+        monkeypatch.setattr(settings, "SQL_REPEAT_MODE", "warn")
+
+        with track_queries() as queries:
+            for value in range(4):
+                db.execute(text("SELECT :value"), {"value": value})
+
+        with caplog.at_level(logging.WARNING, logger="app.core.query_tracker"):
+            repeats = query_tracker.report_repeats(queries, "/test")
+
+        assert repeats == [("SELECT ?", 4)]
+        assert "Possible N+1 on /test" in caplog.text
+
+    def test_untracked_statements_ignored(self, db):
+        """Test statements outside a request are not recorded"""
+        db.execute(text("SELECT 1"))
+        assert query_tracker.current_stats() is None
+
+
+class TestServerTiming:
+    """Test the Server-Timing header"""
+
+    def test_header_reports_queries(self, client, history, signed_in):
+        """Test responses carry DB time, query count and total time"""
+        signed_in(history["guard"])
+
+        response = client.get("/api/access/history")
+
+        timing = response.headers["Server-Timing"]
+        assert timing.startswith("db;dur=")
+        assert 'desc="2 queries"' in timing
+        assert "total;dur=" in timing
+
+
+class TestQueryBudgets:
+    """Test hot endpoints run a fixed number of statements"""
+
+    def test_access_history_is_one_query(self, client, history, signed_in, query_budget):
+        """Test history joins devices and users instead of a lookup per row"""
+        signed_in(history["guard"])
+
+        # The user lookup plus the history query
+        with query_budget(2):
+            response = client.get("/api/access/history")
+
+        records = response.json()
+        assert len(records) == 20
+        assert {record["scanned_by_name"] for record in records} == {
+            "History User 90", "History User 91"
+        }
+        assert records[0]["device_name"] == "Laptop 0"
+
+    def test_device_history(self, client, history, signed_in, query_budget):
+        """Test a device's history costs the device lookup and one query"""
+        signed_in(history["guard"])
+        url = f"/api/access/device/{history['devices'][2].id}/history"
+
+        with query_budget(3):
+            response = client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [record["device_name"] for record in response.json()] == ["Laptop 2"] * 4
+
+    def test_device_list(self, client, db, history, signed_in, query_budget):
+        """Test listing devices costs the user lookup and one query"""
+        signed_in(db.get(User, history["devices"][0].user_id))
+
+        with query_budget(2):
+            response = client.get("/api/devices/")
+
+        assert [device["name"] for device in response.json()] == ["Laptop 0"]
+
+    def test_scan(self, client, history, signed_in, query_budget):
+        """Test a scan's writes do not grow with history size"""
+        signed_in(history["guard"])
+        scan = {
+            "qr_data": history["devices"][0].qr_data,
+            "access_type": "entrada",
+            "location": "Puerta Norte",
+        }
+
+        # User and device lookups, the record, two outbox rows, the owner's
+        # notification preference and the refresh for the response
+        with query_budget(7):
+            response = client.post("/api/access/scan", json=scan)
+
+        assert response.status_code == status.HTTP_201_CREATED
@@ -0,0 +1,80 @@
+"""
+Unit tests for admin search endpoints
+"""
+from fastapi import status
+
+
+class TestSearchEndpoints:
+    """Test device and user search"""
+
+    def test_search_devices_by_partial_serial(self, admin_client):
+        """Test finding a device by a fragment of its serial number"""
+        admin_client.post("/api/devices/", json={
+            "name": "Office Laptop",
+            "device_type": "laptop",
+            "serial_number": "ABC-987-XYZ"
+        })
+        admin_client.post("/api/devices/", json={
+            "name": "Phone",
+            "device_type": "phone",
+            "serial_number": "QQQ-111-RRR"
+        })
+
+        response = admin_client.get("/api/devices/search", params={"q": "987"})
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [d["serial_number"] for d in data["items"]] == ["ABC-987-XYZ"]
+        assert data["next_cursor"] is None
+
+    def test_search_devices_pagination(self, admin_client):
+        """Test keyset pagination returns every match exactly once"""
+        for i in range(5):
+            admin_client.post("/api/devices/", json={
+                "name": f"Lab Device {i}",
+                "device_type": "laptop",
+                "serial_number": f"LAB-SN-{i:04d}"
+            })
+
+        seen = []
+        cursor = None
+        while True:
+            params = {"q": "LAB-SN", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            data = admin_client.get("/api/devices/search", params=params).json()
+            seen.extend(d["serial_number"] for d in data["items"])
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+
+        assert sorted(seen) == [f"LAB-SN-{i:04d}" for i in range(5)]
+
+    def test_search_devices_invalid_cursor(self, admin_client):
+        """Test a malformed cursor is rejected"""
+        response = admin_client.get("/api/devices/search", params={"q": "x", "cursor": "%%%"})
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_search_blank_query_rejected(self, admin_client):
+        """Test a whitespace-only query is rejected instead of matching everything"""
+        for url in ("/api/devices/search", "/api/users/search"):
+            response = admin_client.get(url, params={"q": "   "})
+
+            assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_search_users_by_partial_name(self, admin_client, test_user_data):
+        """Test finding a user by a fragment of their name"""
+        admin_client.post("/api/auth/register", json=test_user_data)
+
+        response = admin_client.get("/api/users/search", params={"q": "est Us"})
+
+        assert response.status_code == status.HTTP_200_OK
+        emails = [u["email"] for u in response.json()["items"]]
+        assert emails == [test_user_data["email"]]
+
+    def test_search_requires_admin(self, authenticated_client):
+        """Test non-admin users cannot search"""
+        response = authenticated_client.get("/api/users/search", params={"q": "test"})
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
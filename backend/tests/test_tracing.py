@@ -0,0 +1,239 @@
+"""
+Unit tests for request tracing and trace context propagation
+"""
+import json
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import text
+
+from app.core import tracing
+from app.core.config import settings
+from app.core.http_client import webhook_http_client
+from app.core.tracing import (
+    NON_RECORDING_SPAN,
+    BatchSpanProcessor,
+    FileSpanExporter,
+    OTLPSpanExporter,
+    Span,
+    parse_traceparent,
+    start_trace,
+)
+from app.models.webhook import Webhook, WebhookEvent, WebhookOutbox
+from app.services.webhook_dispatcher import WebhookDispatcher
+from app.services.webhook_registry import webhook_subscriptions
+from app.services.webhook_service import WebhookService
+
+INCOMING = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    """Trace everything to a file; call the fixture to read the spans written"""
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "TRACE_EXPORT_INTERVAL", 0.01)
+    path = tmp_path / "traces.jsonl"
+    processor = tracing.setup_tracing(FileSpanExporter(str(path)))
+
+    def read():
+        processor.flush()
+        if not path.exists():
+            return []
+        return [json.loads(line) for line in path.read_text().splitlines()]
+
+    yield read
+    tracing.stop_tracing()
+
+
+class TestTraceparent:
+    """Test W3C traceparent parsing"""
+
+    def test_valid_header(self):
+        """Test ids and the sampled flag are read"""
+        assert parse_traceparent(INCOMING) == (
+            "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True
+        )
+
+    @pytest.mark.parametrize("value", [
+        None,
+        "garbage",
+        "01-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01",
+        "00-00000000000000000000000000000000-00f067aa0ba902b7-01",
+        "00-4bf92f3577b34da6a3ce929d0e0e4736-0000000000000000-01",
+    ])
+    def test_malformed_headers_ignored(self, value):
+        """Test unknown versions, bad ids and invalid all-zero ids are rejected"""
+        assert parse_traceparent(value) is None
+
+
+class TestSpans:
+    """Test span recording and sampling"""
+
+    def test_off_without_exporter(self):
+        """Test no trace is started while tracing is off"""
+        with start_trace("GET /") as root:
+            assert root is NON_RECORDING_SPAN
+            assert tracing.current_span() is None
+
+    def test_children_and_statements_nest(self, exported, db):
+        """Test spans and SQL statements are recorded under their parents"""
+        with start_trace("job") as root:
+            with tracing.span("step", item=3):
+                db.execute(text("SELECT 1"))
+
+        spans = {span["name"]: span for span in exported()}
+        assert spans["job"]["parent_id"] is None
+        assert spans["step"]["parent_id"] == spans["job"]["span_id"]
+        assert spans["step"]["attributes"] == {"item": 3}
+        assert spans["db.query"]["parent_id"] == spans["step"]["span_id"]
+        assert spans["db.query"]["attributes"]["db.statement"] == "SELECT ?"
+        assert {span["trace_id"] for span in spans.values()} == {root.trace_id}
+
+    def test_errors_recorded(self, exported):
+        """Test an exception leaving a span marks it failed"""
+        with pytest.raises(ValueError):
+            with start_trace("job"):
+                raise ValueError("boom")
+
+        [span] = exported()
+        assert span["status"] == "error"
+        assert span["status_message"] == "boom"
+
+    def test_unsampled_traces_propagate_without_spans(self, exported, monkeypatch):
+        """Test an unsampled trace records nothing but still has a context"""
+        monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 0.0)
+
+        with start_trace("job"):
+            with tracing.span("step") as step:
+                assert step is NON_RECORDING_SPAN
+                traceparent = tracing.current_traceparent()
+
+        assert traceparent.endswith("-00")
+        assert exported() == []
+
+    def test_incoming_decision_kept(self, exported, monkeypatch):
+        """Test a sampled caller's trace is continued even at rate 0"""
+        monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 0.0)
+
+        with start_trace("GET /", traceparent=INCOMING):
+            pass
+
+        [span] = exported()
+        assert span["trace_id"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+        assert span["parent_id"] == "00f067aa0ba902b7"
+
+    def test_full_queue_drops_spans(self):
+        """Test spans beyond the queue size are dropped, not waited on"""
+        processor = BatchSpanProcessor(FileSpanExporter("unused"), max_queue=1)
+        for _ in range(3):
+            processor.submit(Span("job", "a" * 32, "b" * 16))
+        assert processor.dropped == 2
+
+
+class TestRequestTracing:
+    """Test spans recorded for an API request"""
+
+    def test_request_continues_callers_trace(self, authenticated_client, exported):
+        """Test the request, auth, service and SQL spans join the incoming trace"""
+        response = authenticated_client.get("/api/devices/", headers={"traceparent": INCOMING})
+        assert response.status_code == 200
+
+        spans = [
+            span for span in exported()
+            if span["trace_id"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+        ]
+        by_name = {span["name"]: span for span in spans}
+        root = by_name["GET /api/devices/"]
+        assert root["kind"] == "server"
+        assert root["parent_id"] == "00f067aa0ba902b7"
+        assert root["attributes"]["http.status_code"] == 200
+        assert by_name["auth.get_current_user"]["parent_id"] == root["span_id"]
+        assert "DeviceService.get_user_devices" in by_name
+        assert "db.query" in by_name
+
+
+class TestWebhookPropagation:
+    """Test trace context reaching webhook receivers"""
+
+    @pytest.fixture
+    async def stored_webhook(self, db):
+        webhook = Webhook(
+            name="SIEM",
+            url="https://receiver.test/hook",
+            secret="s3cret",
+            events=["access.recorded"],
+            created_by=uuid.uuid4()
+        )
+        db.add(webhook)
+        db.commit()
+        await webhook_subscriptions.invalidate()
+        return webhook
+
+    async def test_delivery_continues_producing_trace(
+        self, db, session_factory, stored_webhook, exported, monkeypatch
+    ):
+        """Test the outbox keeps the request's context and the receiver gets it"""
+        sent = []
+
+        async def fake_post(url, content, headers):
+            sent.append(headers)
+            return httpx.Response(200)
+
+        monkeypatch.setattr(webhook_http_client, "post", fake_post)
+
+        with start_trace("POST /api/access/scan") as request_span:
+            WebhookService.enqueue_event(db, WebhookEvent.ACCESS_RECORDED, {"device_id": "1"})
+            db.commit()
+
+        entry = db.query(WebhookOutbox).one()
+        assert parse_traceparent(entry.trace_context)[0] == request_span.trace_id
+
+        await WebhookDispatcher(session_factory=session_factory).drain_once()
+
+        trace_id, parent_id, sampled = parse_traceparent(sent[0]["traceparent"])
+        spans = {span["span_id"]: span for span in exported()}
+        assert trace_id == request_span.trace_id and sampled
+        assert spans[parent_id]["name"] == "webhook.deliver"
+        assert spans[parent_id]["attributes"]["http.status_code"] == 200
+        dispatch = spans[spans[parent_id]["parent_id"]]
+        while dispatch["name"] != "webhook.dispatch":
+            dispatch = spans[dispatch["parent_id"]]
+        enqueue = spans[dispatch["parent_id"]]
+        assert enqueue["name"] == "WebhookService.enqueue_event"
+        assert enqueue["parent_id"] == request_span.span_id
+
+
+class TestOTLPExporter:
+    """Test the OTLP/HTTP JSON export"""
+
+    def test_posts_trace_request(self):
+        """Test spans are posted in the OTLP JSON mapping"""
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200)
+
+        exporter = OTLPSpanExporter(
+            "http://collector.test/v1/traces",
+            client=httpx.Client(transport=httpx.MockTransport(handler)),
+        )
+        span = Span("GET /", "a" * 32, "b" * 16, "c" * 16, kind="server",
+                    attributes={"http.status_code": 500, "http.route": "/"},
+                    status="error", status_message="HTTP 500")
+        span.end_time = span.start_time + 1000
+        exporter.export([span])
+
+        body = json.loads(requests[0].content)
+        resource_spans = body["resourceSpans"][0]
+        assert resource_spans["resource"]["attributes"][0]["value"] == {
+            "stringValue": settings.TRACE_SERVICE_NAME
+        }
+        [exported_span] = resource_spans["scopeSpans"][0]["spans"]
+        assert exported_span["traceId"] == "a" * 32
+        assert exported_span["parentSpanId"] == "c" * 16
+        assert exported_span["kind"] == 2
+        assert exported_span["endTimeUnixNano"] == str(span.start_time + 1000)
+        assert {"key": "http.status_code", "value": {"intValue": "500"}} in exported_span["attributes"]
+        assert exported_span["status"] == {"code": 2, "message": "HTTP 500"}
@@ -0,0 +1,988 @@
+"""
+Unit tests for webhook publishing and delivery
+"""
+import asyncio
+import hashlib
+import json
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import fakeredis
+import httpx
+import pytest
+from fastapi import status
+from sqlalchemy import event
+
+from app.core.circuit_breaker import CircuitBreaker, CircuitState, _LocalCircuitStore, webhook_circuits
+from app.core.config import settings
+from app.core.serialization import compress, decompress
+from app.core.http_client import webhook_http_client
+from app.core.redis_cache import cache
+from app.models.webhook import (
+    Webhook,
+    WebhookEvent,
+    WebhookLog,
+    WebhookOutbox,
+    WebhookDelivery,
+    WebhookDeadLetter,
+    WebhookStatsHourly,
+    WebhookPayload,
+)
+from app.services.webhook_batcher import WebhookBatcher, webhook_batcher
+from app.services.webhook_registry import (
+    SUBSCRIPTIONS_VERSION_KEY,
+    WebhookConfig,
+    WebhookSubscriptionIndex,
+    webhook_subscriptions,
+)
+from app.services.webhook_dispatcher import WebhookDispatcher, WebhookRetryScheduler
+from app.services.webhook_log_writer import WebhookLogWriter
+from app.services import webhook_service as webhook_service_module
+from app.services.webhook_service import WebhookService
+
+
+@pytest.fixture(autouse=True)
+def fresh_circuits(monkeypatch):
+    """Start every test with closed circuits"""
+    monkeypatch.setattr(webhook_circuits, "_local", _LocalCircuitStore())
+
+
+class TestWebhookOutbox:
+    """Test that domain changes publish events through the outbox"""
+
+    def test_device_creation_writes_outbox(self, authenticated_client, db, test_device_data):
+        """Test creating a device stages a device.created event"""
+        response = authenticated_client.post("/api/devices/", json=test_device_data)
+        device_id = response.json()["device"]["id"]
+
+        entries = db.query(WebhookOutbox).filter(WebhookOutbox.event == "device.created").all()
+
+        assert len(entries) == 1
+        assert entries[0].payload["device_id"] == device_id
+        assert entries[0].dispatched_at is None
+
+    def test_scan_writes_access_events(self, authenticated_client, db, test_device_data):
+        """Test a scan stages access.recorded plus the entry/exit event"""
+        create_response = authenticated_client.post("/api/devices/", json=test_device_data)
+        qr_data = create_response.json()["device"]["qr_data"]
+
+        response = authenticated_client.post("/api/access/scan", json={
+            "qr_data": qr_data,
+            "access_type": "salida"
+        })
+        assert response.status_code == status.HTTP_201_CREATED
+
+        events = [e.event for e in db.query(WebhookOutbox).order_by(WebhookOutbox.id)]
+        assert events[-2:] == ["access.recorded", "access.exit"]
+
+    def test_failed_change_writes_no_event(self, authenticated_client, db, test_device_data):
+        """Test a rejected change leaves nothing in the outbox"""
+        authenticated_client.post("/api/devices/", json=test_device_data)
+        authenticated_client.post("/api/devices/", json=test_device_data)
+
+        count = db.query(WebhookOutbox).filter(WebhookOutbox.event == "device.created").count()
+        assert count == 1
+
+
+class TestWebhookDispatcher:
+    """Test draining the outbox"""
+
+    async def test_drain_delivers_and_marks_dispatched(self, db, session_factory, monkeypatch):
+        """Test each pending entry is delivered once and marked dispatched"""
+        delivered = []
+
+        async def fake_trigger(session, event, payload, event_id=None):
+            delivered.append((event.value, payload))
+
+        monkeypatch.setattr(WebhookService, "trigger_event", staticmethod(fake_trigger))
+
+        db.add(WebhookOutbox(event="device.created", payload={"device_id": "1"}))
+        db.commit()
+
+        dispatcher = WebhookDispatcher(session_factory=session_factory)
+        assert await dispatcher.drain_once() == 1
+        assert await dispatcher.drain_once() == 0
+
+        db.expire_all()
+        entry = db.query(WebhookOutbox).one()
+        assert delivered == [("device.created", {"device_id": "1"})]
+        assert entry.dispatched_at is not None
+
+    async def test_drain_keeps_entry_on_failure(self, db, session_factory, monkeypatch):
+        """Test an entry whose delivery raised stays pending for redelivery"""
+        async def failing_trigger(session, event, payload, event_id=None):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(WebhookService, "trigger_event", staticmethod(failing_trigger))
+
+        db.add(WebhookOutbox(event="access.recorded", payload={}))
+        db.commit()
+
+        dispatcher = WebhookDispatcher(session_factory=session_factory)
+        await dispatcher.drain_once()
+
+        db.expire_all()
+        entry = db.query(WebhookOutbox).one()
+        assert entry.dispatched_at is None
+        assert entry.attempts == 1
+
+    async def test_slow_receiver_does_not_stall_other_devices(self, db, session_factory, monkeypatch):
+        """Test entries for other devices are delivered while one is still in flight"""
+        release = asyncio.Event()
+        delivered = []
+
+        async def fake_trigger(session, event, payload, event_id=None):
+            if payload["device_id"] == "slow":
+                await release.wait()
+            delivered.append(payload["device_id"])
+
+        monkeypatch.setattr(WebhookService, "trigger_event", staticmethod(fake_trigger))
+
+        for device_id in ("slow", "1", "2"):
+            db.add(WebhookOutbox(event="access.recorded", payload={"device_id": device_id}))
+        db.commit()
+
+        drain = asyncio.create_task(WebhookDispatcher(session_factory=session_factory).drain_once())
+        for _ in range(50):
+            if len(delivered) == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert delivered == ["1", "2"]
+
+        release.set()
+        assert await drain == 3
+        assert delivered == ["1", "2", "slow"]
+
+        db.expire_all()
+        assert all(entry.dispatched_at for entry in db.query(WebhookOutbox))
+
+    async def test_same_device_entries_keep_order(self, db, session_factory, monkeypatch):
+        """Test events about one device are delivered one at a time, in outbox order"""
+        delivered = []
+
+        async def fake_trigger(session, event, payload, event_id=None):
+            # Later entries would overtake earlier ones if they ran concurrently
+            await asyncio.sleep(0.01 * (3 - len(delivered)))
+            delivered.append(event_id)
+
+        monkeypatch.setattr(WebhookService, "trigger_event", staticmethod(fake_trigger))
+
+        for _ in range(3):
+            db.add(WebhookOutbox(event="access.recorded", payload={"device_id": "1"}))
+        db.commit()
+
+        await WebhookDispatcher(session_factory=session_factory).drain_once()
+
+        ids = [entry.id for entry in db.query(WebhookOutbox).order_by(WebhookOutbox.id)]
+        assert delivered == ids
+
+    async def test_failed_entry_holds_its_chain(self, db, session_factory, monkeypatch):
+        """Test entries after a failed one for the same device wait and are redelivered in order"""
+        delivered = []
+        failures = ["boom"]
+
+        async def fake_trigger(session, event, payload, event_id=None):
+            if payload["device_id"] == "1" and failures:
+                raise RuntimeError(failures.pop())
+            delivered.append(event_id)
+
+        monkeypatch.setattr(WebhookService, "trigger_event", staticmethod(fake_trigger))
+
+        for device_id in ("1", "1", "2", "1"):
+            db.add(WebhookOutbox(event="access.recorded", payload={"device_id": device_id}))
+        db.commit()
+        first, second, other, third = [entry.id for entry in db.query(WebhookOutbox).order_by(WebhookOutbox.id)]
+
+        dispatcher = WebhookDispatcher(session_factory=session_factory)
+        await dispatcher.drain_once()
+
+        assert delivered == [other]
+        db.expire_all()
+        held = db.query(WebhookOutbox).filter(WebhookOutbox.dispatched_at.is_(None))
+        assert [entry.id for entry in held.order_by(WebhookOutbox.id)] == [first, second, third]
+
+        # Once the lease expires the chain is reclaimed and delivered in order
+        held.update({WebhookOutbox.locked_until: datetime.now(timezone.utc) - timedelta(seconds=1)})
+        db.commit()
+        await dispatcher.drain_once()
+
+        assert delivered == [other, first, second, third]
+
+
+class TestWebhookDelivery:
+    """Test individual deliveries through the shared client"""
+
+    @pytest.fixture
+    def webhook(self):
+        return Webhook(id=uuid.uuid4(), url="https://receiver.test/hook", secret="s3cret")
+
+    async def test_send_webhook_success(self, webhook, monkeypatch):
+        """Test a 2xx answer is reported as a success with the signed body"""
+        sent = {}
+
+        async def fake_post(url, content, headers):
+            sent.update(url=url, content=content, headers=headers)
+            return httpx.Response(204)
+
+        monkeypatch.setattr(webhook_http_client, "post", fake_post)
+
+        body = b'{"event":"device.created"}'
+        result = await WebhookService._send_webhook(webhook, "device.created", body)
+
+        assert result.success is True
+        assert result.response_status == 204
+        assert sent["content"] is body
+        assert WebhookService.verify_signature(
+            "s3cret", body, sent["headers"]["X-Webhook-Signature"]
+        )
+        assert WebhookService.verify_timestamped_signature(
+            "s3cret", body, sent["headers"]["X-Webhook-Signature-256"]
+        )
+
+    async def test_send_webhook_transport_error(self, webhook, monkeypatch):
+        """Test a connection failure is captured instead of raised"""
+        async def failing_post(url, content, headers):
+            raise httpx.ConnectError("refused")
+
+        monkeypatch.setattr(webhook_http_client, "post", failing_post)
+
+        result = await WebhookService._send_webhook(webhook, "device.created", b"{}")
+
+        assert result.success is False
+        assert "refused" in result.error_message
+
+    def test_timestamped_signature_rejects_stale_or_tampered(self):
+        """Test the t=/v1= header only verifies for the same recent body"""
+        body = b'{"event":"access.recorded"}'
+        header = WebhookService._create_timestamped_signature("s3cret", body, 1_000_000)
+
+        assert WebhookService.verify_timestamped_signature("s3cret", body, header, now=1_000_100)
+        assert not WebhookService.verify_timestamped_signature("s3cret", body, header, now=1_001_000)
+        assert not WebhookService.verify_timestamped_signature("s3cret", body + b" ", header, now=1_000_100)
+        assert not WebhookService.verify_timestamped_signature("other", body, header, now=1_000_100)
+        assert not WebhookService.verify_timestamped_signature("s3cret", body, "garbage")
+
+
+@pytest.fixture
+async def stored_webhook(db):
+    """Persisted active webhook subscribed to access events"""
+    webhook = Webhook(
+        name="SIEM",
+        url="https://receiver.test/hook",
+        secret="s3cret",
+        events=["access.recorded"],
+        created_by=uuid.uuid4()
+    )
+    db.add(webhook)
+    db.commit()
+    await webhook_subscriptions.invalidate()
+    return webhook
+
+
+class TestWebhookRetries:
+    """Test retry scheduling and the dead-letter queue"""
+
+    def test_backoff_grows_and_is_capped(self):
+        """Test backoff doubles per attempt, stays jittered and capped"""
+        base = settings.WEBHOOK_RETRY_BASE_SECONDS
+        for attempts in range(1, 6):
+            delay = WebhookService.compute_backoff(attempts)
+            expected = base * 2 ** (attempts - 1)
+            assert expected / 2 <= delay <= expected
+
+        assert WebhookService.compute_backoff(50) <= settings.WEBHOOK_RETRY_MAX_SECONDS
+
+    async def test_failed_retry_is_rescheduled(self, db, session_factory, stored_webhook, monkeypatch):
+        """Test a failing retry bumps attempts and pushes next_attempt_at out"""
+        async def failing_post(url, content, headers):
+            return httpx.Response(503)
+
+        monkeypatch.setattr(webhook_http_client, "post", failing_post)
+
+        db.add(WebhookDelivery(
+            webhook_id=stored_webhook.id,
+            event="access.recorded",
+            payload={"event": "access.recorded", "data": {}},
+            attempts=1,
+            next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1),
+        ))
+        db.commit()
+
+        scheduler = WebhookRetryScheduler(session_factory=session_factory)
+        assert await scheduler.run_once() == 1
+        assert await scheduler.run_once() == 0
+
+        db.expire_all()
+        delivery = db.query(WebhookDelivery).one()
+        assert delivery.attempts == 2
+        assert delivery.last_error == "HTTP 503"
+
+    async def test_exhausted_retry_is_dead_lettered(self, db, session_factory, stored_webhook, monkeypatch):
+        """Test the last failed attempt moves the delivery to the dead-letter table"""
+        async def failing_post(url, content, headers):
+            raise httpx.ConnectError("refused")
+
+        monkeypatch.setattr(webhook_http_client, "post", failing_post)
+
+        db.add(WebhookDelivery(
+            webhook_id=stored_webhook.id,
+            event="access.recorded",
+            payload={"event": "access.recorded", "data": {}},
+            attempts=settings.WEBHOOK_MAX_ATTEMPTS - 1,
+            next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1),
+        ))
+        db.commit()
+
+        await WebhookRetryScheduler(session_factory=session_factory).run_once()
+
+        db.expire_all()
+        assert db.query(WebhookDelivery).count() == 0
+        dead_letter = db.query(WebhookDeadLetter).one()
+        assert dead_letter.attempts == settings.WEBHOOK_MAX_ATTEMPTS
+        assert "refused" in dead_letter.last_error
+
+    def test_replay_dead_letters_in_batches(self, admin_client, db, stored_webhook):
+        """Test replay requeues dead letters with staggered due times"""
+        for _ in range(3):
+            db.add(WebhookDeadLetter(
+                webhook_id=stored_webhook.id,
+                event="access.recorded",
+                payload={"event": "access.recorded", "data": {}},
+                attempts=settings.WEBHOOK_MAX_ATTEMPTS,
+                first_attempt_at=datetime.now(timezone.utc),
+            ))
+        db.commit()
+
+        response = admin_client.post("/api/webhooks/dead-letters/replay", json={
+            "batch_size": 2,
+            "batch_interval_seconds": 60
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"replayed": 3, "batches": 2}
+
+        due_times = sorted(d.next_attempt_at for d in db.query(WebhookDelivery).all())
+        assert due_times[2] - due_times[0] >= timedelta(seconds=60)
+
+        listing = admin_client.get("/api/webhooks/dead-letters")
+        assert listing.json() == []
+
+    @pytest.mark.parametrize("limit", [0, 501])
+    def test_dead_letter_listing_limit_bounded(self, admin_client, limit):
+        """Test the listing rejects page sizes outside 1-500"""
+        response = admin_client.get("/api/webhooks/dead-letters", params={"limit": limit})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestSubscriptionIndex:
+    """Test the in-process event to subscriber index"""
+
+    def _add_webhook(self, db, events, is_active=True):
+        webhook = Webhook(
+            name="Hook",
+            url="https://receiver.test/hook",
+            secret="s3cret",
+            events=events,
+            is_active=is_active,
+            created_by=uuid.uuid4()
+        )
+        db.add(webhook)
+        db.commit()
+        return webhook
+
+    async def test_lookup_needs_no_query_once_built(self, db, session_factory):
+        """Test only active subscribers are returned and lookups hit memory"""
+        subscribed = self._add_webhook(db, ["access.recorded", "device.created"])
+        self._add_webhook(db, ["access.recorded"], is_active=False)
+        self._add_webhook(db, ["device.deleted"])
+
+        index = WebhookSubscriptionIndex(check_interval=3600)
+        index.rebuild(db)
+
+        statements = []
+
+        def listener(*args):
+            statements.append(args[2])
+
+        event.listen(db.get_bind(), "before_cursor_execute", listener)
+        try:
+            configs = await index.subscribers(session_factory, "access.recorded")
+            await index.subscribers(session_factory, "device.created")
+        finally:
+            event.remove(db.get_bind(), "before_cursor_execute", listener)
+
+        assert [c.id for c in configs] == [subscribed.id]
+        assert statements == []
+
+    async def test_invalidate_rebuilds(self, db, session_factory):
+        """Test a new webhook becomes visible after invalidation"""
+        index = WebhookSubscriptionIndex(check_interval=3600)
+        assert await index.subscribers(session_factory, "device.created") == ()
+
+        webhook = self._add_webhook(db, ["device.created"])
+        assert await index.subscribers(session_factory, "device.created") == ()
+
+        await index.invalidate()
+        assert [c.id for c in await index.subscribers(session_factory, "device.created")] == [webhook.id]
+
+    async def test_version_change_elsewhere_rebuilds(self, db, session_factory):
+        """Test a version bump by another worker is picked up at the next check"""
+        index = WebhookSubscriptionIndex(check_interval=0)
+        assert await index.subscribers(session_factory, "device.created") == ()
+
+        webhook = self._add_webhook(db, ["device.created"])
+        await cache.incr(SUBSCRIPTIONS_VERSION_KEY)
+
+        assert [c.id for c in await index.subscribers(session_factory, "device.created")] == [webhook.id]
+
+    async def test_trigger_event_logs_and_schedules_retry(self, db, session_factory, stored_webhook, monkeypatch):
+        """Test a failed fan-out delivery is logged and queued for retry"""
+        async def failing_post(url, content, headers):
+            return httpx.Response(500)
+
+        monkeypatch.setattr(webhook_http_client, "post", failing_post)
+
+        await WebhookService.trigger_event(session_factory, WebhookEvent.ACCESS_RECORDED, {"device_id": "1"})
+
+        db.expire_all()
+        log = db.query(WebhookLog).one()
+        assert log.success is False
+        assert log.response_status == 500
+        assert db.query(WebhookDelivery).one().attempts == 1
+        assert db.get(Webhook, stored_webhook.id).failure_count == 1
+
+    async def test_trigger_event_serializes_once(self, db, session_factory, stored_webhook, monkeypatch):
+        """Test every subscriber receives the same bytes from a single encoding"""
+        db.add(Webhook(
+            name="Audit",
+            url="https://audit.test/hook",
+            secret="other",
+            events=["access.recorded"],
+            created_by=uuid.uuid4()
+        ))
+        db.commit()
+        await webhook_subscriptions.invalidate()
+
+        encodings = []
+        original = webhook_service_module.dumps_bytes
+
+        def counting_dumps(obj):
+            encodings.append(obj)
+            return original(obj)
+
+        sent = []
+
+        async def fake_post(url, content, headers):
+            sent.append((content, headers))
+            return httpx.Response(200)
+
+        monkeypatch.setattr(webhook_service_module, "dumps_bytes", counting_dumps)
+        monkeypatch.setattr(webhook_http_client, "post", fake_post)
+
+        await WebhookService.trigger_event(session_factory, WebhookEvent.ACCESS_RECORDED, {"device_id": "1"})
+
+        assert len(encodings) == 1
+        assert len(sent) == 2
+        assert sent[0][0] is sent[1][0]
+        secrets = {"s3cret", "other"}
+        for content, headers in sent:
+            assert any(
+                WebhookService.verify_timestamped_signature(secret, content, headers["X-Webhook-Signature-256"])
+                for secret in secrets
+            )
+
+
+class TestWebhookBatching:
+    """Test batched delivery for high-volume subscribers"""
+
+    @pytest.fixture
+    def sent(self, monkeypatch):
+        requests = []
+
+        async def fake_post(url, content, headers):
+            requests.append((content, headers))
+            return httpx.Response(200)
+
+        monkeypatch.setattr(webhook_http_client, "post", fake_post)
+        return requests
+
+    @staticmethod
+    def _config(webhook_id, **batch):
+        return WebhookConfig(
+            id=webhook_id,
+            url="https://receiver.test/hook",
+            secret="s3cret",
+            events=("access.recorded",),
+            batch_enabled=True,
+            **batch
+        )
+
+    async def test_flush_on_count_signs_one_body(self, session_factory, stored_webhook, sent):
+        """Test reaching batch_max_events sends one signed POST in order"""
+        batcher = WebhookBatcher(session_factory=session_factory)
+        config = self._config(stored_webhook.id, batch_max_events=3, batch_linger_ms=30000)
+
+        waiters = [batcher.add(config, {"id": i, "data": {"device_id": "d1"}}) for i in range(3)]
+        await asyncio.wait_for(asyncio.gather(*waiters), timeout=2)
+
+        assert len(sent) == 1
+        content, headers = sent[0]
+        body = json.loads(content)
+        assert headers["X-Webhook-Event"] == "batch"
+        assert body["count"] == 3
+        assert [e["id"] for e in body["events"]] == [0, 1, 2]
+        assert WebhookService.verify_signature(
+            "s3cret", content.decode(), headers["X-Webhook-Signature"]
+        )
+
+    async def test_flush_after_linger(self, session_factory, stored_webhook, sent):
+        """Test a partial batch is sent once it has lingered long enough"""
+        batcher = WebhookBatcher(session_factory=session_factory)
+        config = self._config(stored_webhook.id, batch_max_events=100, batch_linger_ms=20)
+
+        waiters = [batcher.add(config, {"id": i}) for i in range(2)]
+        assert not sent
+        await asyncio.wait_for(asyncio.gather(*waiters), timeout=2)
+
+        assert len(sent) == 1
+        assert json.loads(sent[0][0])["count"] == 2
+
+    async def test_flush_on_bytes(self, session_factory, stored_webhook, sent):
+        """Test a batch is sent as soon as it exceeds batch_max_bytes"""
+        batcher = WebhookBatcher(session_factory=session_factory)
+        config = self._config(stored_webhook.id, batch_max_bytes=1024, batch_linger_ms=30000)
+
+        waiter = batcher.add(config, {"id": 1, "data": "x" * 2048})
+        await asyncio.wait_for(waiter, timeout=2)
+
+        assert len(sent) == 1
+
+    async def test_failed_batch_is_scheduled_for_retry(self, db, session_factory, stored_webhook, monkeypatch):
+        """Test a rejected batch is queued as one retry carrying every event"""
+        async def failing_post(url, content, headers):
+            return httpx.Response(503)
+
+        monkeypatch.setattr(webhook_http_client, "post", failing_post)
+
+        batcher = WebhookBatcher(session_factory=session_factory)
+        config = self._config(stored_webhook.id, batch_max_events=2)
+        await asyncio.gather(*(batcher.add(config, {"id": i}) for i in range(2)))
+
+        db.expire_all()
+        delivery = db.query(WebhookDelivery).one()
+        assert delivery.event == "batch"
+        assert [e["id"] for e in delivery.payload["events"]] == [0, 1]
+
+    async def test_batches_stay_in_order_behind_a_retry(self, db, session_factory, stored_webhook, monkeypatch):
+        """Test a batch after a failed one waits for it instead of overtaking it"""
+        statuses = [503]
+        sent = []
+
+        async def fake_post(url, content, headers):
+            sent.append([e["id"] for e in json.loads(content)["events"]])
+            return httpx.Response(statuses.pop(0) if statuses else 200)
+
+        monkeypatch.setattr(webhook_http_client, "post", fake_post)
+
+        batcher = WebhookBatcher(session_factory=session_factory)
+        config = self._config(stored_webhook.id, batch_max_events=1)
+        await batcher.add(config, {"id": 1})
+        await batcher.add(config, {"id": 2})
+
+        # The second batch would have succeeded but was queued, not sent
+        assert sent == [[1]]
+        db.expire_all()
+        first, second = db.query(WebhookDelivery).order_by(WebhookDelivery.created_at).all()
+        assert [e["id"] for e in second.payload["events"]] == [2]
+        assert second.attempts == 0
+
+        first.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+        db.commit()
+
+        scheduler = WebhookRetryScheduler(session_factory=session_factory)
+        assert await scheduler.run_once() == 1
+        assert await scheduler.run_once() == 1
+        assert await scheduler.run_once() == 0
+
+        assert sent == [[1], [1], [2]]
+        db.expire_all()
+        assert db.query(WebhookDelivery).count() == 0
+
+    async def test_dispatcher_marks_entries_after_flush(self, db, session_factory, stored_webhook, sent, monkeypatch):
+        """Test batched outbox entries are marked dispatched once their batch went out"""
+        stored_webhook.batch_enabled = True
+        stored_webhook.batch_linger_ms = 10
+        db.add_all([
+            WebhookOutbox(event="access.recorded", payload={"device_id": "d1", "seq": i})
+            for i in range(2)
+        ])
+        db.commit()
+        await webhook_subscriptions.invalidate()
+        monkeypatch.setattr(webhook_batcher, "session_factory", session_factory)
+
+        dispatcher = WebhookDispatcher(session_factory=session_factory)
+        assert await dispatcher.drain_once() == 2
+        await asyncio.wait_for(asyncio.gather(*dispatcher._batch_waits), timeout=2)
+
+        db.expire_all()
+        entries = db.query(WebhookOutbox).order_by(WebhookOutbox.id).all()
+        assert all(entry.dispatched_at is not None for entry in entries)
+        assert len(sent) == 1
+        events = json.loads(sent[0][0])["events"]
+        assert [e["id"] for e in events] == [entry.id for entry in entries]
+        assert [e["data"]["seq"] for e in events] == [0, 1]
+
+
+class TestCircuitBreaker:
+    """Test the per-receiver circuit breaker"""
+
+    @staticmethod
+    async def _trip(breaker, name):
+        for _ in range(breaker.failure_threshold):
+            await breaker.record_failure(name)
+
+    async def test_opens_at_threshold_and_probes_after_cooldown(self):
+        """Test closed -> open -> half-open (one probe) -> closed"""
+        breaker = CircuitBreaker(prefix="test:", failure_threshold=2, cooldown_seconds=0.05)
+        url = "https://receiver.test/hook"
+
+        await breaker.record_failure(url)
+        assert await breaker.allow(url)
+        await breaker.record_failure(url)
+        assert await breaker.state(url) == CircuitState.OPEN
+        assert not await breaker.allow(url)
+
+        await asyncio.sleep(0.06)
+        assert await breaker.state(url) == CircuitState.HALF_OPEN
+        assert await breaker.allow(url)
+        assert not await breaker.allow(url)
+
+        await breaker.record_success(url)
+        assert await breaker.state(url) == CircuitState.CLOSED
+        assert await breaker.allow(url)
+
+    async def test_failed_probe_reopens(self):
+        """Test a failing half-open probe starts a new cooldown"""
+        breaker = CircuitBreaker(prefix="test:", failure_threshold=1, cooldown_seconds=0.05)
+        url = "https://receiver.test/hook"
+
+        await breaker.record_failure(url)
+        await asyncio.sleep(0.06)
+        assert await breaker.allow(url)
+
+        await breaker.record_failure(url)
+        assert await breaker.state(url) == CircuitState.OPEN
+        assert not await breaker.allow(url)
+        assert await breaker.retry_after(url) > 0
+
+    @pytest.fixture
+    def redis_circuits(self, monkeypatch):
+        """Keep circuit state in a fake Redis reached through the async client"""
+        monkeypatch.setattr(cache, "redis_client", fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer()))
+        monkeypatch.setattr(cache, "enabled", True)
+
+    async def test_state_shared_through_redis(self, redis_circuits):
+        """Test circuits read back from the binary Redis pool"""
+        breaker = CircuitBreaker(prefix="test:", failure_threshold=1, cooldown_seconds=60)
+        url = "https://receiver.test/hook"
+
+        await breaker.record_failure(url)
+
+        assert await breaker.state(url) == CircuitState.OPEN
+        assert not await CircuitBreaker(prefix="test:", failure_threshold=1, cooldown_seconds=60).allow(url)
+        assert await breaker.states([url, "https://other.test/hook"]) == {
+            url: CircuitState.OPEN,
+            "https://other.test/hook": CircuitState.CLOSED,
+        }
+
+    @pytest.mark.parametrize("shared", [False, True])
+    async def test_late_success_does_not_close_open_circuit(self, request, shared):
+        """Test a call that started before the circuit opened cannot close it"""
+        if shared:
+            request.getfixturevalue("redis_circuits")
+        breaker = CircuitBreaker(prefix="test:", failure_threshold=2, cooldown_seconds=60)
+        url = "https://receiver.test/hook"
+
+        await asyncio.gather(*(breaker.record_failure(url) for _ in range(2)))
+        await breaker.record_success(url)
+
+        assert await breaker.state(url) == CircuitState.OPEN
+        assert not await breaker.allow(url)
+
+    async def test_single_probe_across_workers(self, redis_circuits):
+        """Test concurrent callers on a cooled-down circuit let exactly one probe through"""
+        url = "https://receiver.test/hook"
+        breakers = [
+            CircuitBreaker(prefix="test:", failure_threshold=1, cooldown_seconds=0.01)
+            for _ in range(5)
+        ]
+        await breakers[0].record_failure(url)
+        await asyncio.sleep(0.02)
+
+        allowed = await asyncio.gather(*(breaker.allow(url) for breaker in breakers))
+        assert sum(allowed) == 1
+
+    async def test_open_circuit_skips_request_and_schedules_retry(self, db, session_factory, stored_webhook, monkeypatch):
+        """Test deliveries to an open circuit go straight to the retry queue"""
+        async def unexpected_post(url, content, headers):
+            raise AssertionError("request sent through an open circuit")
+
+        monkeypatch.setattr(webhook_http_client, "post", unexpected_post)
+        await self._trip(webhook_circuits, stored_webhook.url)
+
+        await WebhookService.trigger_event(session_factory, WebhookEvent.ACCESS_RECORDED, {"device_id": "1"})
+
+        db.expire_all()
+        delivery = db.query(WebhookDelivery).one()
+        assert delivery.attempts == 0
+        assert delivery.last_error == "Circuit open"
+        assert db.query(WebhookLog).count() == 0
+        assert db.get(Webhook, stored_webhook.id).failure_count == 0
+
+    async def test_open_circuit_defers_retry_without_using_attempt(self, db, session_factory, stored_webhook, monkeypatch):
+        """Test the retry scheduler postpones deliveries while the circuit is open"""
+        async def unexpected_post(url, content, headers):
+            raise AssertionError("request sent through an open circuit")
+
+        monkeypatch.setattr(webhook_http_client, "post", unexpected_post)
+        await self._trip(webhook_circuits, stored_webhook.url)
+
+        db.add(WebhookDelivery(
+            webhook_id=stored_webhook.id,
+            event="access.recorded",
+            payload={"event": "access.recorded", "data": {}},
+            attempts=2,
+            next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1),
+        ))
+        db.commit()
+
+        scheduler = WebhookRetryScheduler(session_factory=session_factory)
+        assert await scheduler.run_once() == 1
+
+        db.expire_all()
+        delivery = db.query(WebhookDelivery).one()
+        assert delivery.attempts == 2
+        next_attempt_at = delivery.next_attempt_at.replace(tzinfo=timezone.utc)
+        assert next_attempt_at > datetime.now(timezone.utc) + timedelta(
+            seconds=settings.WEBHOOK_CIRCUIT_COOLDOWN_SECONDS / 2
+        )
+
+    async def test_server_errors_trip_the_circuit(self, db, stored_webhook, monkeypatch):
+        """Test repeated 5xx answers open the circuit and 4xx answers do not"""
+        statuses = []
+
+        async def fake_post(url, content, headers):
+            return httpx.Response(statuses.pop(0))
+
+        monkeypatch.setattr(webhook_http_client, "post", fake_post)
+        config = WebhookConfig.from_model(stored_webhook)
+
+        statuses.extend([400] * webhook_circuits.failure_threshold)
+        for _ in range(webhook_circuits.failure_threshold):
+            await WebhookService._send_webhook(config, "access.recorded", b"{}")
+        assert await webhook_circuits.state(config.url) == CircuitState.CLOSED
+
+        statuses.extend([503] * webhook_circuits.failure_threshold)
+        for _ in range(webhook_circuits.failure_threshold):
+            await WebhookService._send_webhook(config, "access.recorded", b"{}")
+        assert await webhook_circuits.state(config.url) == CircuitState.OPEN
+
+    def test_circuit_state_in_response(self, admin_client, stored_webhook):
+        """Test the webhook API reports the receiver's circuit state"""
+        response = admin_client.get(f"/api/webhooks/{stored_webhook.id}")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["circuit_state"] == "closed"
+
+        asyncio.run(self._trip(webhook_circuits, stored_webhook.url))
+
+        response = admin_client.get(f"/api/webhooks/{stored_webhook.id}")
+        assert response.json()["circuit_state"] == "open"
+        listing = admin_client.get("/api/webhooks/")
+        assert [w["circuit_state"] for w in listing.json()] == ["open"]
+
+
+class TestWebhookLogWriter:
+    """Test buffered log writes, hourly stats and retention"""
+
+    BODY = b'{"event":"access.recorded"}'
+
+    @staticmethod
+    def _row(webhook_id, success=True, latency_ms=80.0, created_at=None):
+        return {
+            "webhook_id": webhook_id,
+            "event": "access.recorded",
+            "response_status": 200 if success else 500,
+            "response_body": None,
+            "success": success,
+            "error_message": None if success else "HTTP 500",
+            "latency_ms": latency_ms,
+            "created_at": created_at or datetime.now(timezone.utc),
+        }
+
+    def _payloads(self, rows):
+        digest = hashlib.sha256(self.BODY).hexdigest()
+        for row in rows:
+            row["payload_hash"] = digest
+        return {digest: self.BODY}
+
+    async def test_rows_are_buffered_and_bulk_inserted(self, db, session_factory, stored_webhook):
+        """Test a full buffer is written with a single INSERT statement"""
+        inserts = []
+
+        def count_inserts(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO webhook_logs"):
+                inserts.append(statement)
+
+        engine = db.get_bind()
+        event.listen(engine, "before_cursor_execute", count_inserts)
+        writer = WebhookLogWriter(session_factory=session_factory, buffer_size=3, flush_interval=60)
+        await writer.start()
+        try:
+            for _ in range(3):
+                writer.add(db, self._row(stored_webhook.id), self.BODY)
+            assert db.query(WebhookLog).count() == 0
+
+            for _ in range(50):
+                await asyncio.sleep(0.01)
+                if db.query(WebhookLog).count():
+                    break
+        finally:
+            await writer.stop()
+            event.remove(engine, "before_cursor_execute", count_inserts)
+
+        assert db.query(WebhookLog).count() == 3
+        assert len(inserts) == 1
+        assert db.query(WebhookStatsHourly).one().deliveries == 3
+        assert db.query(WebhookPayload).count() == 1
+
+    async def test_rows_added_from_threads_keep_their_payloads(self, db, session_factory, stored_webhook):
+        """Test rows added by worker threads during flushes are all written with their payloads"""
+        writer = WebhookLogWriter(session_factory=session_factory, buffer_size=7, flush_interval=0.01)
+        await writer.start()
+
+        def add_rows(thread):
+            for i in range(25):
+                writer.add(db, self._row(stored_webhook.id), f"{thread}:{i}".encode())
+
+        try:
+            await asyncio.gather(*(asyncio.to_thread(add_rows, thread) for thread in range(4)))
+        finally:
+            await writer.stop()
+
+        db.expire_all()
+        hashes = {log.payload_hash for log in db.query(WebhookLog).all()}
+        assert db.query(WebhookLog).count() == 100
+        assert hashes <= {payload.hash for payload in db.query(WebhookPayload).all()}
+
+    def test_stats_endpoint_reports_rate_and_percentiles(self, admin_client, db, stored_webhook):
+        """Test success rate and latency percentiles come from the hourly table"""
+        rows = [self._row(stored_webhook.id, latency_ms=80.0) for _ in range(18)]
+        rows += [self._row(stored_webhook.id, success=False, latency_ms=3000.0) for _ in range(2)]
+        WebhookLogWriter.write(db, rows, self._payloads(rows))
+        db.commit()
+
+        response = admin_client.get(f"/api/webhooks/{stored_webhook.id}/stats")
+
+        assert response.status_code == status.HTTP_200_OK
+        stats = response.json()
+        assert stats["deliveries"] == 20
+        assert stats["success_rate"] == pytest.approx(0.9)
+        assert 50 <= stats["latency_p50_ms"] <= 100
+        assert 2500 <= stats["latency_p95_ms"] <= 5000
+        assert len(stats["hourly"]) == 1
+
+    def test_stats_for_unknown_webhook(self, admin_client):
+        """Test stats of a missing webhook return 404"""
+        response = admin_client.get(f"/api/webhooks/{uuid.uuid4()}/stats")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_purge_deletes_expired_logs_in_chunks(self, db, session_factory, stored_webhook, monkeypatch):
+        """Test retention removes only rows past the window, chunk by chunk"""
+        monkeypatch.setattr(settings, "WEBHOOK_RETENTION_CHUNK_SIZE", 2)
+        old = datetime.now(timezone.utc) - timedelta(days=settings.WEBHOOK_LOG_RETENTION_DAYS + 1)
+        rows = [self._row(stored_webhook.id, created_at=old) for _ in range(5)]
+        rows.append(self._row(stored_webhook.id))
+        WebhookLogWriter.write(db, rows, self._payloads(rows))
+        db.commit()
+
+        writer = WebhookLogWriter(session_factory=session_factory)
+        assert writer.purge_expired() == 5
+
+        db.expire_all()
+        assert db.query(WebhookLog).count() == 1
+
+    def test_purge_drops_unused_payloads(self, db, session_factory, stored_webhook):
+        """Test payloads not referenced within the window are removed"""
+        old = datetime.now(timezone.utc) - timedelta(days=settings.WEBHOOK_LOG_RETENTION_DAYS + 1)
+        db.add(WebhookPayload(hash="0" * 64, encoding="zlib", data=zlib.compress(b"{}"), size=2, last_used_at=old))
+        WebhookLogWriter.write(db, [self._row(stored_webhook.id)], self._payloads([self._row(stored_webhook.id)]))
+        db.commit()
+
+        WebhookLogWriter(session_factory=session_factory).purge_expired()
+
+        db.expire_all()
+        assert [p.hash for p in db.query(WebhookPayload).all()] == [hashlib.sha256(self.BODY).hexdigest()]
+
+
+class TestPayloadStorage:
+    """Test content-addressed, compressed payload storage"""
+
+    async def test_fan_out_stores_payload_once(self, db, session_factory, stored_webhook, monkeypatch):
+        """Test N subscribers of one event share a single compressed payload"""
+        for name in ("Audit", "Metrics"):
+            db.add(Webhook(
+                name=name,
+                url=f"https://{name.lower()}.test/hook",
+                secret="other",
+                events=["access.recorded"],
+                created_by=uuid.uuid4()
+            ))
+        db.commit()
+        await webhook_subscriptions.invalidate()
+
+        async def fake_post(url, content, headers):
+            return httpx.Response(200)
+
+        monkeypatch.setattr(webhook_http_client, "post", fake_post)
+
+        await WebhookService.trigger_event(
+            session_factory, WebhookEvent.ACCESS_RECORDED, {"device_id": "1", "notes": "x" * 2000}
+        )
+
+        db.expire_all()
+        logs = db.query(WebhookLog).all()
+        stored = db.query(WebhookPayload).one()
+        assert len(logs) == 3
+        assert {log.payload_hash for log in logs} == {stored.hash}
+        assert all(log.payload is None for log in logs)
+        assert len(stored.data) < stored.size
+
+        envelopes = WebhookService.get_log_payloads(db, logs)
+        assert all(envelope["event"] == "access.recorded" for envelope in envelopes)
+        assert envelopes[0]["data"] == {"device_id": "1", "notes": "x" * 2000}
+
+    def test_logs_endpoint_returns_payloads(self, admin_client, db, stored_webhook):
+        """Test logs show the body that was sent, and None once it was purged"""
+        body = b'{"event":"access.recorded","data":{"device_id":"1"}}'
+        row = TestWebhookLogWriter._row(stored_webhook.id)
+        row["payload_hash"] = hashlib.sha256(body).hexdigest()
+        purged = TestWebhookLogWriter._row(stored_webhook.id, created_at=row["created_at"] - timedelta(minutes=1))
+        purged["payload_hash"] = "0" * 64
+        WebhookLogWriter.write(db, [row, purged], {row["payload_hash"]: body})
+        db.commit()
+
+        response = admin_client.get(f"/api/webhooks/{stored_webhook.id}/logs")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [log["payload"] for log in response.json()] == [
+            {"event": "access.recorded", "data": {"device_id": "1"}}, None
+        ]
+
+    def test_compression_round_trip(self):
+        """Test both zstd and zlib encodings decode back to the original bytes"""
+        data = b'{"event":"access.recorded","data":{}}' * 20
+        encoding, compressed = compress(data)
+        assert encoding in ("zstd", "zlib")
+        assert decompress(encoding, compressed) == data
+        assert decompress("zlib", zlib.compress(data)) == data